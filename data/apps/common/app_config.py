@@ -0,0 +1,218 @@
+import os
+import threading
+
+# Typed, load-once application settings with hot reload.
+#
+# An app declares its DS_* settings once:
+#
+#   SETTINGS = [
+#       Setting("DS_MQTT_TOPIC", str, "deepstream/detections", reload=True),
+#       Setting("DS_MQTT_QOS", int, 0, choices=(0, 1, 2)),
+#       Setting("DS_SNAPSHOT_DIR", str, "/data/ds/datasets/autocap"),
+#   ]
+#   store = ConfigStore(SETTINGS, path=os.getenv("DS_CONFIG_FILE"))
+#   cfg = store.current            # immutable Config; cfg.mqtt_topic, cfg.mqtt_qos
+#
+# Values come from the defaults, then the environment, then the overlay
+# file (KEY=VALUE lines, "#" comments, optional "export " and quotes - the
+# docker --env-file format). Everything is parsed and validated up front;
+# ConfigError lists every bad setting at once.
+#
+# reload() (SIGHUP, or watch() noticing the file changed) re-reads the
+# overlay. Settings marked reload=True take effect; any other change is kept
+# back and reported in pending_restart. A bad overlay leaves the current
+# config in place. The new Config is published by rebinding store.current,
+# so a hot-path reader that does `cfg = store.current` once per call always
+# sees one consistent snapshot without taking a lock. Subscribers get
+# (old, new, changed_names) after each swap.
+
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off", "")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class Setting:
+    def __init__(self, env, kind=str, default=None, reload=False, choices=None, min=None, max=None):
+        self.env = env
+        self.name = (env[3:] if env.startswith("DS_") else env).lower()
+        self.kind = kind
+        self.default = default
+        self.reload = reload
+        self.choices = tuple(choices) if choices is not None else None
+        self.min = min
+        self.max = max
+
+    def parse(self, raw):
+        if raw is None:
+            return self.default
+        text = raw.strip()
+        if self.kind is bool:
+            low = text.lower()
+            if low in _TRUE:
+                return True
+            if low in _FALSE:
+                return False
+            raise ConfigError("%s: expected 0/1, got %r" % (self.env, raw))
+        if self.kind in (int, float):
+            if text == "":
+                return self.default
+            try:
+                value = self.kind(text)
+            except ValueError:
+                raise ConfigError("%s: expected %s, got %r" % (self.env, self.kind.__name__, raw))
+            if self.min is not None and value < self.min:
+                raise ConfigError("%s: %s is below the minimum %s" % (self.env, value, self.min))
+            if self.max is not None and value > self.max:
+                raise ConfigError("%s: %s is above the maximum %s" % (self.env, value, self.max))
+        else:
+            value = text
+        if self.choices is not None and value not in self.choices:
+            raise ConfigError("%s: %r is not one of %s" % (self.env, raw, ", ".join(map(str, self.choices))))
+        return value
+
+
+class Config:
+    __slots__ = ("_values", "_raw", "version")
+
+    def __init__(self, values, raw, version):
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_raw", raw)
+        object.__setattr__(self, "version", version)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError("no setting %r" % name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config is immutable")
+
+    def raw(self, env, default=None):
+        # For keys that are not declared settings (e.g. DS_CAM<i>_CAPS).
+        v = self._raw.get(env)
+        return default if v is None else v
+
+    def as_dict(self):
+        return dict(self._values)
+
+
+def parse_overlay(path):
+    out = {}
+    with open(path, "r") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("export "):
+                line = line[7:].lstrip()
+            key, sep, value = line.partition("=")
+            key = key.strip()
+            if not sep or not key:
+                raise ConfigError("%s:%d: expected KEY=VALUE" % (path, n))
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            out[key] = value
+    return out
+
+
+class ConfigStore:
+    def __init__(self, settings, env=None, path=None):
+        self.settings = list(settings)
+        self._env = os.environ if env is None else env
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.pending_restart = []
+        self.current = self._build(self._read(), 1)
+
+    def _read(self):
+        raw = {k: v for k, v in self._env.items() if k.startswith("DS_")}
+        if self.path:
+            self._stamp = self._file_stamp()
+            try:
+                raw.update(parse_overlay(self.path))
+            except OSError as e:
+                raise ConfigError("%s: %s" % (self.path, e.strerror or e))
+        return raw
+
+    def _build(self, raw, version):
+        values, errors = {}, []
+        for s in self.settings:
+            try:
+                values[s.name] = s.parse(raw.get(s.env))
+            except ConfigError as e:
+                errors.append(str(e))
+        if errors:
+            raise ConfigError("\n".join(errors))
+        return Config(values, raw, version)
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def subscribe(self, fn):
+        self._subscribers.append(fn)
+
+    def reload(self):
+        # Returns the names of the settings that changed, or None on error.
+        with self._lock:
+            old = self.current
+            try:
+                new = self._build(self._read(), old.version + 1)
+            except ConfigError as e:
+                self.errors += 1
+                self.last_error = str(e)
+                return None
+            values, held = dict(new._values), []
+            for s in self.settings:
+                if not s.reload and values[s.name] != old._values[s.name]:
+                    values[s.name] = old._values[s.name]
+                    held.append(s.env)
+            changed = [s.name for s in self.settings if values[s.name] != old._values[s.name]]
+            self.pending_restart = held
+            self.last_error = None
+            if not changed:
+                return []
+            new = Config(values, new._raw, new.version)
+            self.current = new
+            self.reloads += 1
+        for fn in list(self._subscribers):
+            try:
+                fn(old, new, changed)
+            except Exception:
+                pass
+        return changed
+
+    def watch(self, interval_s=2.0):
+        # Polls the overlay file and reloads when it changes.
+        if not self.path or self._thread is not None:
+            return None
+        self._thread = threading.Thread(target=self._run, args=(float(interval_s),), name="config-watch", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self, interval_s):
+        while not self._stop.wait(interval_s):
+            if self._file_stamp() != self._stamp:
+                self.reload()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {"version": self.current.version, "path": self.path, "reloads": self.reloads,
+                "errors": self.errors, "last_error": self.last_error, "pending_restart": self.pending_restart}
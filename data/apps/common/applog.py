@@ -0,0 +1,268 @@
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+from common.pacing import RateLimiter
+
+# Structured, rate-limited logging for the probes.
+#
+# Probes used to print() on every frame; at 30 fps x N streams the stdout
+# traffic (captured by Docker as JSON log files) costs real CPU and disk.
+# Here a probe call only appends a record to a bounded ring; a background
+# thread formats and writes everything queued in one write per flush_s.
+#
+#   log = get_logger("test2")
+#   log.info("Creating Pipeline")                       # always emitted
+#   log.info("Frame Number=%d objects=%d", n, k, key="frame")
+#                                                       # <= DS_LOG_RATE/s per key
+#   log.debug("tracker %s", fields, key="past", every=100)   # 1 in 100
+#   log.record("detections", {"frame": n, "objects": [...]}) # machine channel
+#
+# Formatting is deferred to the flush thread, so pass plain values (ints,
+# strings, lists), never pyds meta objects that are only valid in the probe.
+#
+# Two channels, each its own ring and sink:
+#   human    "<time> <LEVEL> <name>: <message> [suppressed=N]" lines on
+#            stdout. Formatting happens on the flush thread and only for
+#            records that passed the level and rate checks.
+#   machine  one JSON object per line ({"ts", "src", "kind", ...}), off by
+#            default. DS_LOG_MACHINE=- writes to stdout, any other value is
+#            a file path. Not rate limited; the ring bound still applies.
+#
+# A full ring drops the new record and counts it; the count is reported on
+# the next line written. Environment: DS_LOG_LEVEL (DEBUG/INFO/WARN/ERROR,
+# default INFO), DS_LOG_RATE (lines/s per key, default 1; 0 = unlimited),
+# DS_LOG_RING (records per channel, default 4096), DS_LOG_FLUSH_MS (200),
+# DS_LOG_MACHINE. Stdout sinks look up sys.stdout on every write, so
+# contextlib.redirect_stdout() around a call that logs still applies
+# (records flushed after the block ends go to the restored stdout; call
+# flush() before leaving it).
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARN": WARN, "WARNING": WARN, "ERROR": ERROR}
+_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARN: "WARN", ERROR: "ERROR"}
+
+
+# Records on both channels: (ts, level, name, msg, args, suppressed, fields).
+# Machine records carry their kind as msg and their data as fields.
+
+def format_human(rec):
+    ts, level, name, msg, args, suppressed, fields = rec
+    text = msg % args if args else msg
+    if fields:
+        text += " " + " ".join("%s=%s" % kv for kv in fields.items())
+    if suppressed:
+        text += " [suppressed=%d]" % suppressed
+    return "%s.%03d %s %s: %s" % (time.strftime("%H:%M:%S", time.localtime(ts)), int(ts * 1000) % 1000,
+                                  _NAMES.get(level, level), name, text)
+
+
+def format_machine(rec):
+    ts, level, name, kind, args, suppressed, data = rec
+    out = {"ts": int(ts * 1000), "src": name, "kind": kind}
+    out.update(data or {})
+    return json.dumps(out, separators=(",", ":"), default=str)
+
+
+class RingHandler:
+    # Bounded, non-blocking: emit() never waits on the sink. stream=None
+    # means whatever sys.stdout is at write time.
+    def __init__(self, stream, size=4096, flush_s=0.2, fmt=format_human):
+        self.stream = stream
+        self.size = max(1, int(size))
+        self.flush_s = float(flush_s)
+        self.fmt = fmt
+        self._ring = collections.deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self._reported = 0
+
+    def emit(self, rec):
+        with self._lock:
+            if len(self._ring) >= self.size:
+                self.dropped += 1
+                return False
+            self._ring.append(rec)
+            self.emitted += 1
+            if self._thread is None:
+                self._start()
+        return True
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="log-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._ring = self._ring, collections.deque()
+            dropped = self.dropped - self._reported
+            self._reported = self.dropped
+        if not batch and not dropped:
+            return 0
+        lines = []
+        for rec in batch:
+            try:
+                lines.append(self.fmt(rec))
+            except Exception as e:
+                lines.append("log format error: %r %s" % (rec, e))
+        if dropped:
+            lines.append(self.fmt((time.time(), WARN, "log", "dropped", (), 0, {"count": dropped})))
+        stream = self.stream if self.stream is not None else sys.stdout
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+        self.written += len(batch)
+        return len(batch)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {"queued": len(self._ring), "emitted": self.emitted, "written": self.written,
+                    "dropped": self.dropped}
+
+
+class _Site:
+    __slots__ = ("limiter", "count", "suppressed")
+
+    def __init__(self, rate):
+        self.limiter = RateLimiter(rate, burst=1.0) if rate and rate > 0 else None
+        self.count = 0
+        self.suppressed = 0
+
+
+class Logger:
+    def __init__(self, name, level, human, machine, rate):
+        self.name = name
+        self.level = level
+        self.human = human
+        self.machine = machine
+        self.rate = rate
+        self._sites = {}
+
+    def enabled(self, level):
+        # For callers that would otherwise build an expensive argument.
+        return level >= self.level
+
+    def log(self, level, msg, *args, key=None, every=None, rate=None, **fields):
+        if level < self.level:
+            return False
+        suppressed = 0
+        if key is not None:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = _Site(self.rate if rate is None else rate)
+            site.count += 1
+            if every and (site.count - 1) % int(every):
+                site.suppressed += 1
+                return False
+            if site.limiter is not None and not site.limiter.try_take():
+                site.suppressed += 1
+                return False
+            suppressed, site.suppressed = site.suppressed, 0
+        return self.human.emit((time.time(), level, self.name, msg, args, suppressed, fields or None))
+
+    def debug(self, msg, *args, **kw):
+        return self.log(DEBUG, msg, *args, **kw)
+
+    def info(self, msg, *args, **kw):
+        return self.log(INFO, msg, *args, **kw)
+
+    def warn(self, msg, *args, **kw):
+        return self.log(WARN, msg, *args, **kw)
+
+    def error(self, msg, *args, **kw):
+        return self.log(ERROR, msg, *args, **kw)
+
+    def record(self, kind, data):
+        # Machine channel: data is a dict, serialized on the flush thread, so
+        # it must not be modified after the call.
+        if self.machine is None:
+            return False
+        return self.machine.emit((time.time(), INFO, self.name, kind, (), 0, data))
+
+    def machine_enabled(self):
+        return self.machine is not None
+
+
+_lock = threading.Lock()
+_state = {}
+
+
+def _handlers(machine_default=""):
+    with _lock:
+        if not _state:
+            size = int(os.getenv("DS_LOG_RING", "4096"))
+            flush_s = float(os.getenv("DS_LOG_FLUSH_MS", "200")) / 1000.0
+            _state["human"] = RingHandler(None, size, flush_s, format_human)
+            dest = os.getenv("DS_LOG_MACHINE", machine_default)
+            machine = None
+            if dest == "-":
+                machine = RingHandler(None, size, flush_s, format_machine)
+            elif dest not in ("", "0"):
+                try:
+                    machine = RingHandler(open(dest, "a", buffering=1 << 16), size, flush_s, format_machine)
+                except OSError as e:
+                    sys.stderr.write("DS_LOG_MACHINE disabled: %s\n" % e)
+            _state["machine"] = machine
+            _state["loggers"] = {}
+            atexit.register(shutdown)
+        return _state
+
+
+def get_logger(name, level=None, rate=None, machine=""):
+    # machine: where the machine channel goes when DS_LOG_MACHINE is unset;
+    # only the first call in the process decides.
+    st = _handlers(machine)
+    with _lock:
+        log = st["loggers"].get(name)
+        if log is None:
+            if level is None:
+                level = LEVELS.get(os.getenv("DS_LOG_LEVEL", "INFO").upper(), INFO)
+            if rate is None:
+                rate = float(os.getenv("DS_LOG_RATE", "1"))
+            log = st["loggers"][name] = Logger(name, level, st["human"], st["machine"], rate)
+        return log
+
+
+def flush():
+    for h in (_state.get("human"), _state.get("machine")):
+        if h is not None:
+            h.flush()
+
+
+def shutdown():
+    for h in (_state.get("human"), _state.get("machine")):
+        if h is not None:
+            h.close()
+
+
+def stats():
+    out = {}
+    for name in ("human", "machine"):
+        h = _state.get(name)
+        if h is not None:
+            out[name] = h.stats()
+    return out
@@ -0,0 +1,266 @@
+import collections
+import os
+import threading
+import time
+
+# Event-triggered clip recording from an encoded pre-roll ring.
+#
+#   EncodedFrame     one H.264 access unit (pts/dts/duration in ns, keyframe)
+#   EncodedRing      bounded in-memory ring of access units with a keyframe
+#                    index; eviction drops whole GOPs so the ring always starts
+#                    on a keyframe
+#   TriggerRules     class present / count threshold / new tracker id over the
+#                    per-frame detections the probe builds
+#   ClipRecorder     on a trigger at PTS T: clip = [keyframe <= T - pre,
+#                    T + post]; triggers inside an open clip extend it instead
+#                    of starting another; closed clips go to a writer
+#   GstClipWriter    muxes the stored access units to MP4/MKV through
+#                    appsrc ! h264parse ! mp4mux|matroskamux ! filesink,
+#                    without re-encoding
+#
+# Everything except GstClipWriter is plain Python so ring, index and trigger
+# behaviour can be tested with synthetic EncodedFrame records.
+
+NS = 1000000000
+UNTRACKED_OBJECT_ID = 0xffffffffffffffff
+
+
+class EncodedFrame:
+    __slots__ = ("pts", "dts", "duration", "keyframe", "data")
+
+    def __init__(self, pts, data, keyframe=False, dts=None, duration=0):
+        self.pts = int(pts)
+        self.dts = int(dts) if dts is not None else int(pts)
+        self.duration = int(duration or 0)
+        self.keyframe = bool(keyframe)
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class EncodedRing:
+    def __init__(self, max_seconds=20.0, max_bytes=64 * 1024 * 1024):
+        self.max_ns = int(max_seconds * NS)
+        self.max_bytes = int(max_bytes)
+        self.frames = collections.deque()
+        self.keyframes = collections.deque()  # pts of keyframes, ascending
+        self.bytes = 0
+        self.dropped_until_key = 0
+        self.evicted = 0
+
+    def push(self, frame):
+        if not self.frames and not frame.keyframe:
+            # A clip can only start on a keyframe; wait for the first one.
+            self.dropped_until_key += 1
+            return False
+        self.frames.append(frame)
+        self.bytes += len(frame)
+        if frame.keyframe:
+            self.keyframes.append(frame.pts)
+        self._evict()
+        return True
+
+    def _span_ns(self):
+        if not self.frames:
+            return 0
+        return self.frames[-1].pts - self.frames[0].pts
+
+    def _evict(self):
+        # Drop the oldest GOP while we are over budget and a newer keyframe
+        # exists to become the new head.
+        while len(self.keyframes) > 1 and (self._span_ns() > self.max_ns or self.bytes > self.max_bytes):
+            next_key = self.keyframes[1]
+            while self.frames and self.frames[0].pts != next_key:
+                f = self.frames.popleft()
+                self.bytes -= len(f)
+                self.evicted += 1
+            self.keyframes.popleft()
+
+    def keyframe_at_or_before(self, pts):
+        best = None
+        for k in self.keyframes:
+            if k <= pts:
+                best = k
+            else:
+                break
+        if best is None and self.keyframes:
+            best = self.keyframes[0]
+        return best
+
+    def since(self, pts):
+        start = self.keyframe_at_or_before(pts)
+        if start is None:
+            return []
+        return [f for f in self.frames if f.pts >= start]
+
+
+class TriggerRules:
+    def __init__(self, classes=None, min_count=0, count_class=None, new_track=False):
+        self.classes = set(classes or ())
+        self.min_count = int(min_count or 0)
+        self.count_class = count_class
+        self.new_track = bool(new_track)
+        self._seen = collections.OrderedDict()
+
+    @classmethod
+    def from_env(cls, getenv=os.getenv):
+        classes = [int(c) for c in getenv('DS_CLIP_CLASSES', '').split(',') if c.strip() != '']
+        count_class = getenv('DS_CLIP_COUNT_CLASS', '')
+        return cls(classes=classes, min_count=int(getenv('DS_CLIP_MIN_COUNT', '0') or 0),
+                   count_class=int(count_class) if count_class != '' else None,
+                   new_track=(getenv('DS_CLIP_NEW_TRACK', '0') or '').strip().lower() in ('1', 'true', 'yes', 'on'))
+
+    def evaluate(self, dets):
+        # Returns the first matching reason or None.
+        reason = None
+        if self.classes:
+            for d in dets:
+                if d.get("class_id") in self.classes:
+                    reason = "class:%d" % d["class_id"]
+                    break
+        if reason is None and self.min_count:
+            n = sum(1 for d in dets if self.count_class is None or d.get("class_id") == self.count_class)
+            if n >= self.min_count:
+                reason = "count:%d" % n
+        if self.new_track:
+            for d in dets:
+                oid = d.get("object_id")
+                if oid is None or oid == UNTRACKED_OBJECT_ID:
+                    continue
+                if oid not in self._seen:
+                    self._seen[oid] = True
+                    while len(self._seen) > 4096:
+                        self._seen.popitem(last=False)
+                    if reason is None:
+                        reason = "track:%d" % oid
+        return reason
+
+
+class Clip:
+    def __init__(self, start_pts, end_pts, reasons, frames):
+        self.start_pts = start_pts
+        self.end_pts = end_pts
+        self.reasons = list(reasons)
+        self.frames = list(frames)
+        self.triggers = 1
+
+
+class ClipRecorder:
+    def __init__(self, ring, pre_s=5.0, post_s=5.0, max_s=120.0, on_clip=None):
+        self.ring = ring
+        self.pre_ns = int(pre_s * NS)
+        self.post_ns = int(post_s * NS)
+        self.max_ns = int(max_s * NS)
+        self.on_clip = on_clip
+        self.active = None
+        self.clips = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def trigger(self, pts, reason="trigger"):
+        with self._lock:
+            end = pts + self.post_ns
+            if self.active is not None:
+                # Overlapping trigger: extend the open clip, capped at max_s.
+                self.active.end_pts = min(max(self.active.end_pts, end), self.active.start_pts + self.max_ns)
+                self.active.reasons.append(reason)
+                self.active.triggers += 1
+                self.coalesced += 1
+                return False
+            frames = self.ring.since(pts - self.pre_ns)
+            if not frames:
+                return False
+            self.active = Clip(frames[0].pts, end, [reason], frames)
+            return True
+
+    def push(self, frame):
+        # Feed every encoded access unit; returns a finished Clip or None.
+        self.ring.push(frame)
+        done = None
+        with self._lock:
+            clip = self.active
+            if clip is None:
+                return None
+            if frame.pts > clip.end_pts:
+                self.active = None
+                self.clips += 1
+                done = clip
+            elif not clip.frames or frame.pts > clip.frames[-1].pts:
+                clip.frames.append(frame)
+        if done is not None and self.on_clip is not None:
+            self.on_clip(done)
+        return done
+
+
+class GstClipWriter:
+    def __init__(self, Gst, out_dir, container="mp4", prefix="clip"):
+        self.Gst = Gst
+        self.out_dir = out_dir
+        self.container = "mkv" if container in ("mkv", "matroska") else "mp4"
+        self.prefix = prefix
+        self.written = []
+        self.failed = 0
+
+    def path_for(self, clip):
+        ts = time.strftime("%Y%m%d-%H%M%S", time.localtime())
+        return os.path.join(self.out_dir, "%s_%s_%d.%s" % (self.prefix, ts, clip.start_pts // 1000000, self.container))
+
+    def write_async(self, clip):
+        t = threading.Thread(target=self.write, args=(clip,), daemon=True)
+        t.start()
+        return t
+
+    def write(self, clip):
+        Gst = self.Gst
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = self.path_for(clip)
+        mux = "matroskamux" if self.container == "mkv" else "mp4mux"
+        pipe = Gst.parse_launch(
+            "appsrc name=src format=time caps=video/x-h264,stream-format=byte-stream,alignment=au "
+            "! h264parse ! %s ! filesink name=sink location=%s" % (mux, path))
+        src = pipe.get_by_name("src")
+        pipe.set_state(Gst.State.PLAYING)
+        base = clip.frames[0].pts
+        for f in clip.frames:
+            buf = Gst.Buffer.new_wrapped(bytes(f.data))
+            buf.pts = f.pts - base
+            buf.dts = max(0, f.dts - base)
+            if f.duration:
+                buf.duration = f.duration
+            if not f.keyframe:
+                buf.set_flags(Gst.BufferFlags.DELTA_UNIT)
+            src.emit("push-buffer", buf)
+        src.emit("end-of-stream")
+        bus = pipe.get_bus()
+        msg = bus.timed_pop_filtered(30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipe.set_state(Gst.State.NULL)
+        if msg is None or msg.type != Gst.MessageType.EOS:
+            # No EOS means the file is missing or truncated: drop it so
+            # nothing (catalog rebuild, web listing) picks it up.
+            error = "timeout waiting for EOS" if msg is None else msg.parse_error()[0].message
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.failed += 1
+            print("CLIP_FAILED", path, "frames", len(clip.frames), "error", error)
+            return None
+        self.written.append(path)
+        print("CLIP_SAVED", path, "frames", len(clip.frames), "triggers", clip.triggers,
+              "reasons", ",".join(clip.reasons[:8]))
+        return path
+
+
+def frame_from_sample(Gst, sample):
+    buf = sample.get_buffer()
+    ok, info = buf.map(Gst.MapFlags.READ)
+    if not ok:
+        return None
+    try:
+        data = bytes(info.data)
+    finally:
+        buf.unmap(info)
+    keyframe = not buf.has_flags(Gst.BufferFlags.DELTA_UNIT)
+    dts = buf.dts if buf.dts != Gst.CLOCK_TIME_NONE else buf.pts
+    return EncodedFrame(buf.pts, data, keyframe=keyframe, dts=dts, duration=buf.duration)
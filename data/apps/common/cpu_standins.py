@@ -0,0 +1,292 @@
+import collections
+import random
+import threading
+import time
+
+from common import fake_pyds
+from common import synthetic_meta
+
+# CPU stand-ins for the nv* GStreamer elements, so app pipelines can run
+# end to end on a plain Linux box with fake_pyds supplying the metadata.
+#
+# install(Gst) patches, for the lifetime of the process:
+#   Gst.ElementFactory.make   nv* factory names -> STANDINS (same element name)
+#   Gst.Caps.from_string      drops the (memory:NVMM) caps feature
+#   Gst.CapsFeatures.contains reports memory:NVMM as present (test3 checks it)
+#   Gst.Element.set_property  ignores properties a stand-in does not have
+#   Gst.Element.get_request_pad / request_pad_simple
+#                             tags muxer sink pads with their pad_index
+#   Gst.Pad.add_probe         binds the synthetic batch meta of the buffer
+#                             (looked up by PTS) around every buffer probe and
+#                             times the callback
+# The nvinfer/nvinferserver stand-in is an identity element whose src pad
+# probe (MetaInjector) generates a batch with synthetic_meta.make_batch for
+# every buffer; downstream probes find it with
+# pyds.gst_buffer_get_nvds_batch_meta(hash(buf)) as on device.
+
+STANDINS = {
+    "nvstreammux": ("funnel", {}),
+    "nvstreamdemux": ("tee", {}),
+    "nvinfer": ("identity", {}),
+    "nvinferserver": ("identity", {}),
+    "nvtracker": ("identity", {}),
+    "nvdsanalytics": ("identity", {}),
+    "nvdspreprocess": ("identity", {}),
+    "nvdslogger": ("identity", {}),
+    "nvmultistreamtiler": ("identity", {}),
+    "nvvideoconvert": ("videoconvert", {}),
+    "nvdsosd": ("identity", {}),
+    "nvegltransform": ("identity", {}),
+    "nv3dsink": ("fakesink", {"sync": True}),
+    "nveglglessink": ("fakesink", {"sync": True}),
+    "nvmsgconv": ("identity", {}),
+    "nvmsgbroker": ("fakesink", {"sync": False, "async": False}),
+    "nvv4l2decoder": ("avdec_h264", {}),
+    "nvjpegdec": ("jpegdec", {}),
+    "nvv4l2h264enc": ("x264enc", {"tune": 0x4}),
+    "nvv4l2h265enc": ("x265enc", {}),
+    "nvurisrcbin": ("uridecodebin", {}),
+    "v4l2src": ("videotestsrc", {"is-live": True}),
+}
+
+FALLBACKS = {
+    "avdec_h264": ("openh264dec",),
+    "x264enc": ("openh264enc",),
+}
+
+INJECT_AT = ("nvinfer", "nvinferserver")
+MUXERS = ("nvstreammux",)
+
+_lock = threading.Lock()
+_installed = {}
+
+
+class ProbeStats:
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.total_ns = collections.Counter()
+        self.max_ns = collections.Counter()
+        self.latency_ns = collections.Counter()
+        self.latency_n = collections.Counter()
+        self.ignored_props = collections.Counter()
+        self.frames = 0
+        self.t0 = time.perf_counter()
+        self.cpu0 = time.process_time()
+
+    def record(self, name, dt_ns, latency_ns=None):
+        with _lock:
+            self.calls[name] += 1
+            self.total_ns[name] += dt_ns
+            if dt_ns > self.max_ns[name]:
+                self.max_ns[name] = dt_ns
+            if latency_ns is not None:
+                self.latency_ns[name] += latency_ns
+                self.latency_n[name] += 1
+
+    def report(self):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.cpu0
+        out = {
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "cpu_pct": round(100.0 * cpu / wall, 1) if wall else 0.0,
+            "frames": self.frames,
+            "fps": round(self.frames / wall, 2) if wall else 0.0,
+            "cpu_us_per_frame": round(cpu * 1e6 / self.frames, 1) if self.frames else 0.0,
+            "probes": {},
+        }
+        for name, n in sorted(self.calls.items()):
+            entry = {
+                "calls": n,
+                "mean_us": round(self.total_ns[name] / n / 1000.0, 1),
+                "max_us": round(self.max_ns[name] / 1000.0, 1),
+            }
+            if self.latency_n[name]:
+                entry["latency_ms"] = round(self.latency_ns[name] / self.latency_n[name] / 1e6, 3)
+            out["probes"][name] = entry
+        if self.ignored_props:
+            out["ignored_properties"] = dict(self.ignored_props)
+        return out
+
+
+stats = ProbeStats()
+
+
+class MetaInjector:
+    # Attaches a synthetic batch to every buffer leaving the stand-in nvinfer.
+    # Metas are keyed by PTS because CPU converters allocate new buffers; the
+    # PTS survives them.
+    MAX_PENDING = 256
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed)
+        self.frame_num = {}
+        self.by_pts = collections.OrderedDict()
+        self.t_inject = {}
+        self.pad_of_pts = collections.OrderedDict()
+
+    def note_pad(self, pts, pad_index):
+        with _lock:
+            self.pad_of_pts[pts] = pad_index
+            while len(self.pad_of_pts) > self.MAX_PENDING:
+                self.pad_of_pts.popitem(last=False)
+
+    def inject(self, pts):
+        with _lock:
+            pad_index = self.pad_of_pts.pop(pts, 0)
+        n = self.frame_num.get(pad_index, 0)
+        self.frame_num[pad_index] = n + 1
+        batch = synthetic_meta.make_batch(self.cfg, n, self.rng, track_base=(n // 90) * self.cfg.objects)
+        frames = fake_pyds.glist_items(batch.frame_meta_list)
+        for f in frames:
+            f.pad_index = pad_index
+            f.source_id = pad_index
+        with _lock:
+            self.by_pts[pts] = batch
+            self.t_inject[pts] = time.perf_counter_ns()
+            while len(self.by_pts) > self.MAX_PENDING:
+                old, _ = self.by_pts.popitem(last=False)
+                self.t_inject.pop(old, None)
+            stats.frames += 1
+
+    def lookup(self, pts):
+        with _lock:
+            return self.by_pts.get(pts), self.t_inject.get(pts)
+
+
+injector = None
+
+
+def _strip_nvmm(s):
+    return s.replace("(memory:NVMM)", "")
+
+
+def install(Gst, cfg=None):
+    # Idempotent; returns the MetaInjector so callers can inspect it.
+    global injector
+    if _installed:
+        return injector
+    injector = MetaInjector(cfg or synthetic_meta.SceneConfig(streams=1, objects=8, seed=1))
+
+    orig_make = Gst.ElementFactory.make
+    orig_from_string = Gst.Caps.from_string
+    orig_contains = Gst.CapsFeatures.contains
+    orig_set_property = Gst.Element.set_property
+    orig_get_request_pad = Gst.Element.get_request_pad
+    orig_request_pad_simple = getattr(Gst.Element, "request_pad_simple", None)
+    orig_add_probe = Gst.Pad.add_probe
+    _installed.update(make=orig_make, from_string=orig_from_string, contains=orig_contains,
+                      set_property=orig_set_property, get_request_pad=orig_get_request_pad,
+                      request_pad_simple=orig_request_pad_simple, add_probe=orig_add_probe)
+
+    def make(factory, name=None):
+        entry = STANDINS.get(factory)
+        if entry is None:
+            return orig_make(factory, name)
+        standin, props = entry
+        el = None
+        for candidate in (standin,) + FALLBACKS.get(standin, ()):
+            el = orig_make(candidate, name)
+            if el is not None:
+                break
+        if el is None:
+            return None
+        el._ds_standin = factory
+        for k, v in props.items():
+            try:
+                orig_set_property(el, k, v)
+            except Exception:
+                pass
+        if factory in INJECT_AT:
+            def _inject(pad, info, u):
+                buf = info.get_buffer()
+                if buf is not None:
+                    injector.inject(buf.pts)
+                return Gst.PadProbeReturn.OK
+            orig_add_probe(el.get_static_pad("src"), Gst.PadProbeType.BUFFER, _inject, 0)
+        return el
+
+    def from_string(s):
+        return orig_from_string(_strip_nvmm(s))
+
+    def contains(self, feature):
+        if feature == "memory:NVMM":
+            return True
+        return orig_contains(self, feature)
+
+    def set_property(self, name, value):
+        if getattr(self, "_ds_standin", None) and self.find_property(name) is None:
+            stats.ignored_props["%s.%s" % (self._ds_standin, name)] += 1
+            return
+        return orig_set_property(self, name, value)
+
+    def _tag_mux_pad(el, pad, template):
+        if pad is None or getattr(el, "_ds_standin", None) not in MUXERS:
+            return pad
+        try:
+            pad_index = int(template.rsplit("_", 1)[1])
+        except Exception:
+            return pad
+
+        def _note(p, info, u):
+            buf = info.get_buffer()
+            if buf is not None:
+                injector.note_pad(buf.pts, pad_index)
+            return Gst.PadProbeReturn.OK
+        orig_add_probe(pad, Gst.PadProbeType.BUFFER, _note, 0)
+        return pad
+
+    def get_request_pad(self, template):
+        return _tag_mux_pad(self, orig_get_request_pad(self, template), template)
+
+    def request_pad_simple(self, template):
+        return _tag_mux_pad(self, orig_request_pad_simple(self, template), template)
+
+    def add_probe(self, mask, callback, *user_data):
+        if not (int(mask) & int(Gst.PadProbeType.BUFFER)):
+            return orig_add_probe(self, mask, callback, *user_data)
+        name = "%s@%s" % (getattr(callback, "__name__", "probe"), self.get_name())
+        parent = self.get_parent()
+        if parent is not None:
+            name = "%s@%s.%s" % (getattr(callback, "__name__", "probe"), parent.get_name(), self.get_name())
+
+        def _wrapped(pad, info, *args):
+            buf = info.get_buffer()
+            batch, t_inj = (None, None)
+            if buf is not None:
+                batch, t_inj = injector.lookup(buf.pts)
+                if batch is not None:
+                    fake_pyds.attach_batch_meta(buf, batch)
+            t0 = time.perf_counter_ns()
+            try:
+                return callback(pad, info, *args)
+            finally:
+                t1 = time.perf_counter_ns()
+                stats.record(name, t1 - t0, (t1 - t_inj) if t_inj is not None else None)
+                if batch is not None:
+                    fake_pyds.release_batch_meta(buf)
+        return orig_add_probe(self, mask, _wrapped, *user_data)
+
+    Gst.ElementFactory.make = staticmethod(make)
+    Gst.Caps.from_string = staticmethod(from_string)
+    Gst.CapsFeatures.contains = contains
+    Gst.Element.set_property = set_property
+    Gst.Element.get_request_pad = get_request_pad
+    if orig_request_pad_simple is not None:
+        Gst.Element.request_pad_simple = request_pad_simple
+    Gst.Pad.add_probe = add_probe
+    return injector
+
+
+class CpuPlatformInfo:
+    # common.platform_info.PlatformInfo without the CUDA bindings.
+    def is_wsl(self):
+        return False
+
+    def is_integrated_gpu(self):
+        return False
+
+    def is_platform_aarch64(self):
+        import platform
+        return platform.machine().lower() in ("aarch64", "arm64")
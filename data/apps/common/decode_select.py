@@ -0,0 +1,227 @@
+import threading
+import time
+
+# Chooses how a USB camera's frames get from v4l2src into NVMM memory.
+#
+# For image/jpeg the candidates are tried in order of how much CPU they save:
+#   nvv4l2decoder   jpegparse ! nvv4l2decoder mjpeg=1   (NVJPG engine, NVMM out)
+#   nvjpegdec       jpegparse ! nvjpegdec               (NVMM out)
+#   jpegdec         jpegdec ! videoconvert              (CPU decode + convert)
+# Raw caps always use videoconvert. Every path ends in the caller's
+# nvvideoconvert -> NV12 NVMM capsfilter.
+#
+# All GStreamer access goes through a `factory` object with
+#   find(name)          -> truthy if the plugin feature exists
+#   make(name, elname)  -> element or None
+# so selection can be unit tested with a mocked factory. GstFactory wraps the
+# real Gst.ElementFactory.
+
+
+class GstFactory:
+    def __init__(self, Gst):
+        self._Gst = Gst
+
+    def find(self, name):
+        return self._Gst.ElementFactory.find(name)
+
+    def make(self, name, elname=None):
+        return self._Gst.ElementFactory.make(name, elname)
+
+
+class DecodePath:
+    def __init__(self, name, chain, hw, probe_props=None):
+        # chain: [(factory_name, {prop: value}, optional)]
+        self.name = name
+        self.chain = chain
+        self.hw = hw
+        self.probe_props = probe_props or ()
+
+    def __repr__(self):
+        return "DecodePath(%s)" % self.name
+
+
+PATHS = {
+    "nvv4l2decoder": DecodePath("nvv4l2decoder",
+                                [("jpegparse", {}, True), ("nvv4l2decoder", {"mjpeg": 1}, False)],
+                                hw=True, probe_props=("mjpeg",)),
+    "nvjpegdec": DecodePath("nvjpegdec", [("jpegparse", {}, True), ("nvjpegdec", {}, False)], hw=True),
+    "jpegdec": DecodePath("jpegdec", [("jpegdec", {}, False), ("videoconvert", {}, False)], hw=False),
+    "raw": DecodePath("raw", [("videoconvert", {}, False)], hw=False),
+}
+
+MJPEG_ORDER = ("nvv4l2decoder", "nvjpegdec", "jpegdec")
+
+_probe_cache = {}
+
+
+def _has_property(element, prop):
+    try:
+        return element.find_property(prop) is not None
+    except Exception:
+        return False
+
+
+def path_available(factory, path):
+    # A path is usable when every required element can be instantiated and
+    # carries the properties we rely on (nvv4l2decoder only has "mjpeg" on
+    # Jetson builds).
+    key = (id(factory), path.name)
+    if key in _probe_cache:
+        return _probe_cache[key]
+    ok = True
+    for fname, _, optional in path.chain:
+        if optional:
+            continue
+        try:
+            if not factory.find(fname):
+                ok = False
+                break
+            el = factory.make(fname, None)
+        except Exception:
+            el = None
+        if el is None:
+            ok = False
+            break
+        for prop in path.probe_props:
+            if fname == path.chain[-1][0] and not _has_property(el, prop):
+                ok = False
+        if not ok:
+            break
+    _probe_cache[key] = ok
+    return ok
+
+
+def candidate_order(caps, prefer=None):
+    if 'image/jpeg' not in (caps or ''):
+        return ["raw"]
+    prefer = (prefer or 'auto').strip().lower()
+    if prefer in ('sw', 'cpu', 'software'):
+        prefer = 'jpegdec'
+    order = list(MJPEG_ORDER)
+    if prefer in order:
+        order.remove(prefer)
+        order.insert(0, prefer)
+    return order
+
+
+def select_decode_path(caps, factory, prefer=None):
+    order = candidate_order(caps, prefer)
+    for name in order:
+        path = PATHS[name]
+        if path_available(factory, path):
+            return path
+    # Software decode is the last resort even if probing failed; the caller
+    # will report the usual "Unable to create" errors.
+    return PATHS[order[-1]]
+
+
+def make_chain(factory, path, name_fn):
+    # Returns the list of created elements, or None if a required one failed.
+    elements = []
+    for fname, props, optional in path.chain:
+        el = None
+        try:
+            el = factory.make(fname, name_fn(fname))
+        except Exception:
+            el = None
+        if el is None:
+            if optional:
+                continue
+            return None
+        for k, v in props.items():
+            try:
+                el.set_property(k, v)
+            except Exception:
+                if not optional:
+                    return None
+        elements.append(el)
+    return elements
+
+
+def build_decode_chain(pipeline, caps, factory, name_fn, prefer=None):
+    # Picks the best available path and falls back along candidate_order()
+    # if an element cannot be created. Elements are added to the pipeline and
+    # linked to each other; returns (path, elements).
+    order = candidate_order(caps, prefer)
+    chosen = select_decode_path(caps, factory, prefer)
+    order = [chosen.name] + [n for n in order if n != chosen.name]
+    for name in order:
+        path = PATHS[name]
+        elements = make_chain(factory, path, name_fn)
+        if elements is None:
+            continue
+        for el in elements:
+            pipeline.add(el)
+        for a, b in zip(elements, elements[1:]):
+            a.link(b)
+        return path, elements
+    return None, []
+
+
+class DecodeTimer:
+    # Measures per-frame time from the decode chain's input pad to its NVMM
+    # output pad, matched by buffer PTS.
+    MAX_PENDING = 64
+
+    def __init__(self, path_name):
+        self.path_name = path_name
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._win_frames = 0
+        self._win_ns = 0
+
+    def on_input(self, pts):
+        if pts is None or pts < 0:
+            return
+        with self._lock:
+            if len(self._pending) >= self.MAX_PENDING:
+                self._pending.clear()
+            self._pending[pts] = time.perf_counter_ns()
+
+    def on_output(self, pts):
+        with self._lock:
+            t0 = self._pending.pop(pts, None)
+            if t0 is None:
+                return
+            dt = time.perf_counter_ns() - t0
+            self.frames += 1
+            self.total_ns += dt
+            self._win_frames += 1
+            self._win_ns += dt
+            if dt > self.max_ns:
+                self.max_ns = dt
+
+    def snapshot(self, reset_window=True):
+        with self._lock:
+            avg = (self._win_ns / self._win_frames / 1000.0) if self._win_frames else 0.0
+            out = {
+                "decoder": self.path_name,
+                "decode_us": round(avg, 1),
+                "decode_max_us": round(self.max_ns / 1000.0, 1),
+            }
+            if reset_window:
+                self._win_frames = 0
+                self._win_ns = 0
+                self.max_ns = 0
+        return out
+
+    def attach(self, Gst, in_pad, out_pad):
+        none = getattr(Gst, 'CLOCK_TIME_NONE', None)
+
+        def _in(pad, info, u):
+            buf = info.get_buffer()
+            if buf is not None and buf.pts != none:
+                self.on_input(buf.pts)
+            return Gst.PadProbeReturn.OK
+
+        def _out(pad, info, u):
+            buf = info.get_buffer()
+            if buf is not None and buf.pts != none:
+                self.on_output(buf.pts)
+            return Gst.PadProbeReturn.OK
+
+        in_pad.add_probe(Gst.PadProbeType.BUFFER, _in, 0)
+        out_pad.add_probe(Gst.PadProbeType.BUFFER, _out, 0)
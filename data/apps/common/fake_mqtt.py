@@ -0,0 +1,203 @@
+import threading
+import time
+
+# In-process stand-in for an MQTT broker plus the subset of the paho Client
+# API the apps use (connect/loop_start/loop/publish/subscribe/disconnect). Messages
+# are delivered synchronously to subscribers of the same FakeBroker, and the
+# broker keeps per-topic counters so load tests can check what arrived.
+# set_online(False) simulates an outage: publishes fail with
+# MQTT_ERR_NO_CONN and connected clients get on_disconnect.
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def topic_matches(pattern, topic):
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, part in enumerate(p):
+        if part == '#':
+            return True
+        if i >= len(t):
+            return False
+        if part != '+' and part != t[i]:
+            return False
+    return len(p) == len(t)
+
+
+class FakeMessage:
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class FakeMessageInfo:
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+
+class FakeBroker:
+    def __init__(self, latency_s=0.0):
+        self.latency_s = float(latency_s)
+        self.online = True
+        self._lock = threading.Lock()
+        self._clients = []
+        self.retained = {}
+        self.counts = {}
+        self.bytes = {}
+        self.messages = 0
+
+    def set_online(self, online):
+        with self._lock:
+            self.online = bool(online)
+            clients = list(self._clients)
+        if not online:
+            for c in clients:
+                c._drop()
+
+    def _attach(self, client):
+        with self._lock:
+            if not self.online:
+                return False
+            if client not in self._clients:
+                self._clients.append(client)
+        return True
+
+    def _detach(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _route(self, msg):
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+        with self._lock:
+            if not self.online:
+                return False
+            size = len(msg.payload) if msg.payload is not None else 0
+            self.messages += 1
+            self.counts[msg.topic] = self.counts.get(msg.topic, 0) + 1
+            self.bytes[msg.topic] = self.bytes.get(msg.topic, 0) + size
+            if msg.retain:
+                self.retained[msg.topic] = msg
+            targets = [c for c in self._clients if c._wants(msg.topic)]
+        for c in targets:
+            c._deliver(msg)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"messages": self.messages, "topics": dict(self.counts), "bytes": dict(self.bytes)}
+
+
+_default_broker = None
+
+
+def default_broker():
+    global _default_broker
+    if _default_broker is None:
+        _default_broker = FakeBroker()
+    return _default_broker
+
+
+class FakeClient:
+    def __init__(self, client_id="", broker=None, **kwargs):
+        self._client_id = client_id
+        self._broker = broker or default_broker()
+        self._subs = {}
+        self._mid = 0
+        self._connected = False
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_publish = None
+
+    def connect(self, host="127.0.0.1", port=1883, keepalive=60):
+        if not self._broker._attach(self):
+            raise ConnectionRefusedError("fake broker offline")
+        self._connected = True
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        return MQTT_ERR_SUCCESS
+
+    def reconnect(self):
+        return self.connect()
+
+    def is_connected(self):
+        return self._connected
+
+    def disconnect(self):
+        self._broker._detach(self)
+        was = self._connected
+        self._connected = False
+        if was and self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+        return MQTT_ERR_SUCCESS
+
+    def _drop(self):
+        self._connected = False
+        self._broker._detach(self)
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 7)
+
+    def loop_start(self):
+        return MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force=False):
+        return MQTT_ERR_SUCCESS
+
+    def loop(self, timeout=1.0):
+        # Delivery is synchronous, so a manual loop only has to wait.
+        if timeout:
+            time.sleep(timeout)
+        return MQTT_ERR_SUCCESS if self._connected else MQTT_ERR_NO_CONN
+
+    def want_write(self):
+        return False
+
+    def subscribe(self, topic, qos=0):
+        self._subs[topic] = qos
+        return (MQTT_ERR_SUCCESS, self._next_mid())
+
+    def _next_mid(self):
+        self._mid += 1
+        return self._mid
+
+    def _wants(self, topic):
+        for pattern in self._subs:
+            if topic_matches(pattern, topic):
+                return True
+        return False
+
+    def _deliver(self, msg):
+        cb = self.on_message
+        if cb is not None:
+            try:
+                cb(self, None, msg)
+            except Exception:
+                pass
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        mid = self._next_mid()
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if not self._connected:
+            return FakeMessageInfo(MQTT_ERR_NO_CONN, mid)
+        if not self._broker._route(FakeMessage(topic, payload, qos, retain, mid)):
+            return FakeMessageInfo(MQTT_ERR_NO_CONN, mid)
+        if self.on_publish is not None:
+            try:
+                self.on_publish(self, None, mid)
+            except Exception:
+                pass
+        return FakeMessageInfo(MQTT_ERR_SUCCESS, mid)
@@ -0,0 +1,450 @@
+import sys
+import types
+
+# Pure-Python stand-in for the pyds bindings. It only models the parts of the
+# metadata API the sample probes touch: GList walking via .data/.next, the
+# NvDs*.cast() helpers, display/user meta pools and the event-msg allocators.
+# Batches are registered against a buffer with attach_batch_meta() and looked
+# up again by gst_buffer_get_nvds_batch_meta(hash(buffer)), like on device.
+
+# When True, walking past the tail of a list raises StopIteration instead of
+# returning None, which is how older bindings behaved.
+RAISE_STOP_ITERATION = False
+
+_batches = {}
+
+
+class GList:
+    __slots__ = ("data", "_next")
+
+    def __init__(self, data, nxt=None):
+        self.data = data
+        self._next = nxt
+
+    @property
+    def next(self):
+        if self._next is None and RAISE_STOP_ITERATION:
+            raise StopIteration
+        return self._next
+
+
+def make_glist(items):
+    head = None
+    for item in reversed(items):
+        head = GList(item, head)
+    return head
+
+
+def glist_items(l_item):
+    out = []
+    while l_item is not None:
+        out.append(l_item.data)
+        l_item = l_item._next
+    return out
+
+
+class _Castable:
+    @classmethod
+    def cast(cls, data):
+        if data is None:
+            raise StopIteration
+        return data
+
+
+class _Enum:
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+NvDsMetaType = _Enum(
+    NVDS_INVALID_META=-1,
+    NVDS_BATCH_META=1,
+    NVDS_FRAME_META=2,
+    NVDS_OBJ_META=3,
+    NVDS_DISPLAY_META=4,
+    NVDS_CLASSIFIER_META=5,
+    NVDS_LABEL_INFO_META=6,
+    NVDS_USER_META=7,
+    NVDS_EVENT_MSG_META=0x1000 + 1,
+    NVDS_TRACKER_PAST_FRAME_META=0x1000 + 3,
+    NVDS_OBJ_META_NVDSANALYTICS=0x1000 + 20,
+    NVDS_FRAME_META_NVDSANALYTICS=0x1000 + 21,
+)
+NVDSINFER_SEGMENTATION_META = 0x1000 + 11
+NVDS_PREPROCESS_BATCH_META = 0x1000 + 27
+
+NvDsEventType = _Enum(NVDS_EVENT_ENTRY=0, NVDS_EVENT_EXIT=1, NVDS_EVENT_MOVING=2,
+                      NVDS_EVENT_STOPPED=3, NVDS_EVENT_EMPTY=4, NVDS_EVENT_PARKED=5)
+NvDsObjectType = _Enum(NVDS_OBJECT_TYPE_VEHICLE=0, NVDS_OBJECT_TYPE_PERSON=1,
+                       NVDS_OBJECT_TYPE_FACE=2, NVDS_OBJECT_TYPE_BAG=3,
+                       NVDS_OBJECT_TYPE_UNKNOWN=8)
+
+
+class NvOSD_ColorParams:
+    __slots__ = ("red", "green", "blue", "alpha")
+
+    def __init__(self):
+        self.red = self.green = self.blue = self.alpha = 0.0
+
+    def set(self, red, green, blue, alpha):
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.alpha = alpha
+
+
+class NvOSD_FontParams:
+    def __init__(self):
+        self.font_name = ""
+        self.font_size = 0
+        self.font_color = NvOSD_ColorParams()
+
+
+class NvOSD_TextParams:
+    def __init__(self):
+        self.display_text = ""
+        self.x_offset = 0
+        self.y_offset = 0
+        self.font_params = NvOSD_FontParams()
+        self.set_bg_clr = 0
+        self.text_bg_clr = NvOSD_ColorParams()
+
+
+class NvOSD_RectParams:
+    def __init__(self, left=0.0, top=0.0, width=0.0, height=0.0):
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.border_width = 0
+        self.border_color = NvOSD_ColorParams()
+        self.has_bg_color = 0
+        self.bg_color = NvOSD_ColorParams()
+
+
+class NvDsBaseMeta:
+    __slots__ = ("meta_type", "batch_meta")
+
+    def __init__(self, meta_type=-1):
+        self.meta_type = meta_type
+        self.batch_meta = None
+
+
+class NvDsUserMeta(_Castable):
+    def __init__(self, meta_type=-1, user_meta_data=None):
+        self.base_meta = NvDsBaseMeta(meta_type)
+        self.user_meta_data = user_meta_data
+
+
+class NvDsObjectMeta(_Castable):
+    def __init__(self, class_id=0, object_id=0xffffffffffffffff, confidence=0.0,
+                 rect=None, obj_label="", user_meta=None):
+        self.class_id = class_id
+        self.object_id = object_id
+        self.confidence = confidence
+        self.tracker_confidence = confidence
+        self.rect_params = rect or NvOSD_RectParams()
+        self.text_params = NvOSD_TextParams()
+        self.obj_label = obj_label
+        self.obj_user_meta_list = make_glist(user_meta or [])
+
+
+class NvDsDisplayMeta(_Castable):
+    MAX_ELEMENTS_IN_DISPLAY_META = 16
+
+    def __init__(self):
+        self.num_labels = 0
+        self.num_rects = 0
+        self.num_lines = 0
+        self.text_params = [NvOSD_TextParams() for _ in range(self.MAX_ELEMENTS_IN_DISPLAY_META)]
+        self.rect_params = [NvOSD_RectParams() for _ in range(self.MAX_ELEMENTS_IN_DISPLAY_META)]
+
+
+class NvDsFrameMeta(_Castable):
+    def __init__(self, frame_num=0, pad_index=0, batch_id=0, source_frame_width=1920,
+                 source_frame_height=1080, objects=None, user_meta=None, ntp_timestamp=0):
+        self.frame_num = frame_num
+        self.pad_index = pad_index
+        self.source_id = pad_index
+        self.batch_id = batch_id
+        self.source_frame_width = source_frame_width
+        self.source_frame_height = source_frame_height
+        self.ntp_timestamp = ntp_timestamp
+        self.buf_pts = 0
+        objects = objects or []
+        self.num_obj_meta = len(objects)
+        self.obj_meta_list = make_glist(objects)
+        self.frame_user_meta_list = make_glist(user_meta or [])
+        self.display_meta_list = None
+        self.num_display_meta = 0
+
+
+class NvDsBatchMeta(_Castable):
+    def __init__(self, frames=None, user_meta=None):
+        frames = frames or []
+        self.num_frames_in_batch = len(frames)
+        self.max_frames_in_batch = len(frames)
+        self.frame_meta_list = make_glist(frames)
+        self.batch_user_meta_list = make_glist(user_meta or [])
+
+
+class NvDsAnalyticsObjInfo(_Castable):
+    def __init__(self, roiStatus=None, ocStatus=None, lcStatus=None, dirStatus=""):
+        self.roiStatus = roiStatus or []
+        self.ocStatus = ocStatus or []
+        self.lcStatus = lcStatus or []
+        self.dirStatus = dirStatus
+
+
+class NvDsAnalyticsFrameMeta(_Castable):
+    def __init__(self, objInROIcnt=None, objLCCumCnt=None, objLCCurrCnt=None, ocStatus=None):
+        self.objInROIcnt = objInROIcnt or {}
+        self.objLCCumCnt = objLCCumCnt or {}
+        self.objLCCurrCnt = objLCCurrCnt or {}
+        self.ocStatus = ocStatus or {}
+
+
+class NvDsInferSegmentationMeta(_Castable):
+    def __init__(self, width=0, height=0, classes=0, class_map=None):
+        self.width = width
+        self.height = height
+        self.classes = classes
+        self.class_map = class_map
+
+
+class NvDsRoiMeta:
+    def __init__(self, rect=None, frame_meta=None):
+        self.roi = rect or NvOSD_RectParams()
+        self.frame_meta = frame_meta
+
+
+class GstNvDsPreProcessBatchMeta(_Castable):
+    def __init__(self, rois=None):
+        self.roi_vector = list(rois or [])
+
+
+class NvDsTargetMiscDataFrame(_Castable):
+    def __init__(self, frameNum=0, tBbox=None, confidence=0.0, age=0):
+        self.frameNum = frameNum
+        self.tBbox = tBbox or NvOSD_RectParams()
+        self.confidence = confidence
+        self.age = age
+
+
+class NvDsTargetMiscDataObject(_Castable):
+    def __init__(self, uniqueId=0, classId=0, objLabel="", frames=None):
+        self.uniqueId = uniqueId
+        self.classId = classId
+        self.objLabel = objLabel
+        self._frames = list(frames or [])
+        self.numObj = len(self._frames)
+
+    @staticmethod
+    def list(obj):
+        return iter(obj._frames)
+
+
+class NvDsTargetMiscDataStream(_Castable):
+    def __init__(self, streamID=0, objects=None):
+        self.streamID = streamID
+        self.surfaceStreamID = streamID
+        self._objects = list(objects or [])
+        self.numFilled = len(self._objects)
+
+    @staticmethod
+    def list(stream):
+        return iter(stream._objects)
+
+
+class NvDsTargetMiscDataBatch(_Castable):
+    def __init__(self, streams=None):
+        self._streams = list(streams or [])
+        self.numFilled = len(self._streams)
+
+    @staticmethod
+    def list(batch):
+        return iter(batch._streams)
+
+
+class NvDsEventMsgMeta(_Castable):
+    def __init__(self):
+        self.bbox = NvOSD_RectParams()
+        self.frameId = 0
+        self.trackingId = 0
+        self.confidence = 0.0
+        self.sensorId = 0
+        self.placeId = 0
+        self.moduleId = 0
+        self.sensorStr = ""
+        self.ts = None
+        self.type = 0
+        self.objType = 0
+        self.objClassId = 0
+        self.extMsg = None
+        self.extMsgSize = 0
+
+
+class NvDsVehicleObject(_Castable):
+    def __init__(self):
+        self.type = self.color = self.make = self.model = self.license = self.region = ""
+
+
+class NvDsPersonObject(_Castable):
+    def __init__(self):
+        self.age = 0
+        self.cap = self.hair = self.gender = self.apparel = ""
+
+
+class FakeBuffer:
+    # Stands in for a Gst.Buffer; hash() is the "C address" the probes pass on.
+    __slots__ = ("pts", "dts", "duration", "__weakref__")
+
+    def __init__(self, pts=0):
+        self.pts = pts
+        self.dts = pts
+        self.duration = 0
+
+
+class FakeProbeInfo:
+    __slots__ = ("_buffer",)
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def get_buffer(self):
+        return self._buffer
+
+
+def attach_batch_meta(buffer, batch_meta):
+    _batches[hash(buffer)] = batch_meta
+    return buffer
+
+
+def release_batch_meta(buffer):
+    _batches.pop(hash(buffer), None)
+
+
+def gst_buffer_get_nvds_batch_meta(addr):
+    return _batches.get(addr)
+
+
+def nvds_acquire_display_meta_from_pool(batch_meta):
+    return NvDsDisplayMeta()
+
+
+def nvds_add_display_meta_to_frame(frame_meta, display_meta):
+    frame_meta.num_display_meta += 1
+
+
+def nvds_acquire_user_meta_from_pool(batch_meta):
+    return NvDsUserMeta()
+
+
+def nvds_add_user_meta_to_frame(frame_meta, user_meta):
+    frame_meta.frame_user_meta_list = GList(user_meta, frame_meta.frame_user_meta_list)
+
+
+def nvds_add_user_meta_to_obj(obj_meta, user_meta):
+    obj_meta.obj_user_meta_list = GList(user_meta, obj_meta.obj_user_meta_list)
+
+
+def alloc_nvds_event_msg_meta(user_meta):
+    return NvDsEventMsgMeta()
+
+
+def alloc_nvds_vehicle_object():
+    return NvDsVehicleObject()
+
+
+def alloc_nvds_person_object():
+    return NvDsPersonObject()
+
+
+def alloc_buffer(size):
+    return bytearray(size)
+
+
+def generate_ts_rfc3339(buf, size):
+    return None
+
+
+def get_string(value):
+    return value
+
+
+def nvds_measure_buffer_latency(addr):
+    batch_meta = _batches.get(addr)
+    return batch_meta.num_frames_in_batch if batch_meta is not None else 0
+
+
+def get_segmentation_masks(segmeta):
+    return segmeta.class_map
+
+
+_surfaces = {}
+
+
+def get_nvds_buf_surface(addr, batch_id):
+    import numpy as np
+    batch_meta = _batches.get(addr)
+    frames = glist_items(batch_meta.frame_meta_list) if batch_meta is not None else []
+    frame = frames[batch_id] if batch_id < len(frames) else None
+    shape = (frame.source_frame_height, frame.source_frame_width, 4) if frame else (1080, 1920, 4)
+    surf = _surfaces.get(shape)
+    if surf is None:
+        surf = np.zeros(shape, dtype=np.uint8)
+        _surfaces[shape] = surf
+    return surf
+
+
+def unmap_nvds_buf_surface(addr, batch_id):
+    return None
+
+
+def install():
+    # Make "import pyds" / "import pyds_ext" resolve to this module.
+    mod = sys.modules[__name__]
+    sys.modules["pyds"] = mod
+    sys.modules["pyds_ext"] = mod
+    return mod
+
+
+def _any_module(name):
+    # Permissive placeholder for optional imports (gi, cuda bindings) so app
+    # modules can be imported for their probes on hosts without those stacks.
+    class _Any:
+        def __init__(self, path):
+            self._path = path
+
+        def __getattr__(self, attr):
+            if attr.startswith("__"):
+                raise AttributeError(attr)
+            return _Any(self._path + "." + attr)
+
+        def __call__(self, *args, **kwargs):
+            return _Any(self._path + "()")
+
+        def __or__(self, other):
+            return self
+
+        def __repr__(self):
+            return self._path
+
+    mod = types.ModuleType(name)
+    mod.__getattr__ = lambda attr: _Any(name + "." + attr)
+    mod.__path__ = []
+    return mod
+
+
+def install_platform_stubs(names=("gi", "gi.repository", "cuda", "cuda.bindings",
+                                  "cuda.bindings.runtime", "cuda.bindings.driver")):
+    stubbed = []
+    for name in names:
+        if name in sys.modules:
+            continue
+        try:
+            __import__(name)
+        except Exception:
+            sys.modules[name] = _any_module(name)
+            stubbed.append(name)
+    return stubbed
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+
+import argparse
+import errno
+import json
+import mmap
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+try:
+    from multiprocessing import shared_memory
+except Exception:
+    shared_memory = None
+
+# Shared-memory ring of encoded frames for sidecar processes.
+#
+# The app (one writer) puts each snapshot JPEG and its detection metadata in
+# the next fixed-size slot of a POSIX shared memory segment (/dev/shm/<name>).
+# Sidecars (MQTT, ROS, dataset export) map the same segment read-only and get
+# the JPEG as a memoryview into it: no file, no read(), no copy.
+#
+#   ring = FrameRing.create("ds_frames", slots=8, slot_bytes=1 << 20)
+#   ring.put(jpeg, {"detections": dets}, cam=0, frame=n, kind="osd")
+#
+#   reader = FrameReader("ds_frames")           # another process
+#   f = reader.next(timeout=1.0)                # Frame or None
+#   send(f.data, f.meta)                         # f.data is a memoryview
+#   if not f.valid(): ...                        # overwritten while in use
+#   f.release()
+#
+# Layout: a 64-byte header (magic, version, slots, slot_bytes, head seq)
+# followed by `slots` slots of a 40-byte slot header and slot_bytes of data
+# (JPEG then JSON metadata). Sequence numbers start at 1 and never repeat.
+# The writer zeroes a slot's seq, copies the data, then stores the new seq
+# and head, so a reader that sees the same seq before and after using the
+# data knows it was not overwritten (a seqlock).
+#
+# The writer never waits for readers. A reader that falls more than `slots`
+# frames behind jumps to the oldest frame still in the ring and counts the
+# frames it missed as skipped; latest=True always jumps to the newest frame,
+# which is what a snapshot publisher wants.
+#
+# Notification: each reader binds a unix datagram socket
+# <sock_dir>/<name>.<pid>.sock; after every put() the writer sends a 1-byte
+# datagram to each of them without blocking (the eventfd idea, without
+# having to pass a descriptor between unrelated processes). A reader whose
+# socket buffer is full is marked slow in the writer stats and simply gets
+# no further wakeups until it drains. Readers also poll the head seq, so a
+# lost datagram costs at most poll_s of latency.
+#
+# Two processes on one machine:
+#   python3 frame_ring.py --name test write --fps 30      # terminal 1
+#   python3 frame_ring.py --name test tail                # terminal 2
+#
+# Standard library only, so the sidecars need nothing beyond python3.
+
+MAGIC = b"DSFR"
+VERSION = 1
+_HDR = struct.Struct("<4sIIIQ")          # magic, version, slots, slot_bytes, head
+_HDR_SIZE = 64
+_HEAD_OFF = 16
+_SLOT = struct.Struct("<QqiiII8s")       # seq, ts_ms, cam, frame, data_len, meta_len, kind
+_SLOT_SIZE = 40
+_SEQ = struct.Struct("<Q")
+SOCK_DIR = "/tmp/ds_frame_ring"
+
+
+def _shm_path(name):
+    return os.path.join("/dev/shm", name.lstrip("/"))
+
+
+def _sock_prefix(sock_dir, name):
+    return os.path.join(sock_dir, name.lstrip("/") + ".")
+
+
+class FrameRing:
+    # Writer side; put() may be called from several streaming threads.
+    def __init__(self, shm, slots, slot_bytes, sock_dir=SOCK_DIR, scan_s=1.0):
+        self.shm = shm
+        self.name = shm.name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._buf = shm.buf
+        self.sock_dir = sock_dir
+        self.scan_s = float(scan_s)
+        self._sock = None
+        self._peers = {}       # path -> consecutive full-buffer count
+        self._last_scan = 0.0
+        self._dir_stamp = None
+        self._lock = threading.Lock()
+        self.seq = 0
+        self.put_count = 0
+        self.put_bytes = 0
+        self.oversize = 0
+        self.wakeups = 0
+        self.slow = 0
+
+    @classmethod
+    def create(cls, name, slots=8, slot_bytes=1 << 20, sock_dir=SOCK_DIR):
+        if shared_memory is None:
+            raise RuntimeError("multiprocessing.shared_memory needs Python 3.8+")
+        slots, slot_bytes = int(slots), int(slot_bytes)
+        size = _HDR_SIZE + slots * (_SLOT_SIZE + slot_bytes)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a writer that crashed; readers re-attach on magic/size.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:_HDR_SIZE] = bytes(_HDR_SIZE)
+        _HDR.pack_into(shm.buf, 0, MAGIC, VERSION, slots, slot_bytes, 0)
+        return cls(shm, slots, slot_bytes, sock_dir)
+
+    def _slot_off(self, seq):
+        return _HDR_SIZE + ((seq - 1) % self.slots) * (_SLOT_SIZE + self.slot_bytes)
+
+    def put(self, data, meta=None, cam=0, frame=0, kind="", ts_ms=None):
+        # data: bytes-like JPEG; meta: dict (JSON) or bytes. Returns the seq,
+        # or 0 if the frame does not fit in a slot.
+        if isinstance(meta, dict):
+            meta = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        meta = meta or b""
+        n, m = len(data), len(meta)
+        if n + m > self.slot_bytes:
+            self.oversize += 1
+            return 0
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        with self._lock:
+            return self._put(data, meta, n, m, cam, frame, kind, ts_ms)
+
+    def _put(self, data, meta, n, m, cam, frame, kind, ts_ms):
+        seq = self.seq + 1
+        off = self._slot_off(seq)
+        buf = self._buf
+        _SEQ.pack_into(buf, off, 0)
+        start = off + _SLOT_SIZE
+        buf[start:start + n] = data
+        if m:
+            buf[start + n:start + n + m] = meta
+        _SLOT.pack_into(buf, off, 0, int(ts_ms), int(cam), int(frame), n, m, kind.encode("ascii", "replace")[:8])
+        _SEQ.pack_into(buf, off, seq)
+        _SEQ.pack_into(buf, _HEAD_OFF, seq)
+        self.seq = seq
+        self.put_count += 1
+        self.put_bytes += n
+        self._notify()
+        return seq
+
+    def _scan(self, now, stamp):
+        self._last_scan = now
+        self._dir_stamp = stamp
+        prefix = _sock_prefix(self.sock_dir, self.name)
+        try:
+            names = os.listdir(self.sock_dir)
+        except OSError:
+            names = []
+        found = set()
+        for f in names:
+            path = os.path.join(self.sock_dir, f)
+            if path.startswith(prefix) and f.endswith(".sock"):
+                found.add(path)
+        self._peers = {p: self._peers.get(p, 0) for p in found}
+
+    def _notify(self):
+        # A reader binding or removing its socket changes the directory mtime,
+        # so new readers get wakeups from the next put() on.
+        now = time.monotonic()
+        try:
+            stamp = os.stat(self.sock_dir).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp != self._dir_stamp or now - self._last_scan >= self.scan_s:
+            self._scan(now, stamp)
+        if not self._peers:
+            return
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        for path in list(self._peers):
+            try:
+                self._sock.sendto(b"\x01", path)
+                self._peers[path] = 0
+                self.wakeups += 1
+            except BlockingIOError:
+                # The reader has not drained its earlier wakeups: it is behind.
+                if self._peers[path] == 0:
+                    self.slow += 1
+                self._peers[path] += 1
+            except OSError as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # Reader exited without cleaning up.
+                    self._peers.pop(path, None)
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    def close(self, unlink=True):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._buf = None
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {"name": self.name, "seq": self.seq, "slots": self.slots, "slot_bytes": self.slot_bytes,
+                "put": self.put_count, "put_bytes": self.put_bytes, "oversize": self.oversize,
+                "readers": len(self._peers), "wakeups": self.wakeups,
+                "slow_readers": sum(1 for n in self._peers.values() if n), "slow": self.slow}
+
+
+class Frame:
+    __slots__ = ("seq", "ts_ms", "cam", "frame", "kind", "data", "_meta", "_reader")
+
+    def __init__(self, reader, seq, ts_ms, cam, frame, kind, data, meta):
+        self._reader = reader
+        self.seq = seq
+        self.ts_ms = ts_ms
+        self.cam = cam
+        self.frame = frame
+        self.kind = kind
+        self.data = data
+        self._meta = meta
+
+    @property
+    def meta(self):
+        # Parsed on first use; the JSON is small, so this copy is cheap.
+        if not isinstance(self._meta, dict):
+            raw = bytes(self._meta)
+            self._meta = json.loads(raw) if raw else {}
+        return self._meta
+
+    def valid(self):
+        # False once the writer has started to reuse the slot.
+        return self._reader is not None and self._reader._seq_at(self.seq) == self.seq
+
+    def release(self):
+        # Drop the views into the segment (required before FrameReader.close()).
+        if not isinstance(self._meta, dict):
+            self._meta.release()
+            self._meta = None
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        self._reader = None
+
+
+class FrameReader:
+    # Reader side: maps the segment read-only; never writes to it.
+    def __init__(self, name, latest=False, sock_dir=SOCK_DIR, poll_s=0.05):
+        self.name = name.lstrip("/")
+        self.latest = bool(latest)
+        self.sock_dir = sock_dir
+        self.poll_s = float(poll_s)
+        self._map = None
+        self._view = None
+        self._sock = None
+        self._sock_path = None
+        self.next_seq = None
+        self.read = 0
+        self.skipped = 0
+        self.torn = 0
+        self._attach()
+
+    def _attach(self):
+        fd = os.open(_shm_path(self.name), os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            size, self._ino = st.st_size, st.st_ino
+            self._map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        self._view = memoryview(self._map)
+        magic, version, slots, slot_bytes, _ = _HDR.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a frame ring (v%d)" % (self.name, VERSION))
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        try:
+            os.makedirs(self.sock_dir, exist_ok=True)
+            path = "%s%d.sock" % (_sock_prefix(self.sock_dir, self.name), os.getpid())
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            sock.setblocking(False)
+            self._sock, self._sock_path = sock, path
+        except OSError:
+            self._sock = None   # polling only
+
+    def stale(self):
+        # True once the writer has recreated (or removed) the segment, e.g.
+        # after an app restart; close() and open a new reader.
+        try:
+            return os.stat(_shm_path(self.name)).st_ino != self._ino
+        except OSError:
+            return True
+
+    def head(self):
+        return _SEQ.unpack_from(self._view, _HEAD_OFF)[0]
+
+    def _slot_off(self, seq):
+        return _HDR_SIZE + ((seq - 1) % self.slots) * (_SLOT_SIZE + self.slot_bytes)
+
+    def _seq_at(self, seq):
+        if self._view is None:
+            return 0
+        return _SEQ.unpack_from(self._view, self._slot_off(seq))[0]
+
+    def _drain(self):
+        if self._sock is None:
+            return
+        try:
+            while self._sock.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _wait(self, timeout):
+        wait = self.poll_s if timeout is None else min(self.poll_s, max(0.0, timeout))
+        if self._sock is not None:
+            select.select([self._sock], [], [], wait)
+        else:
+            time.sleep(wait)
+        self._drain()
+
+    def poll(self):
+        # The next frame if one is ready, else None. Never blocks.
+        head = self.head()
+        if head == 0:
+            return None
+        if self.next_seq is None:
+            self.next_seq = head
+        if self.latest and head > self.next_seq:
+            self.skipped += head - self.next_seq
+            self.next_seq = head
+        elif head - self.next_seq >= self.slots:
+            oldest = head - self.slots + 1
+            self.skipped += oldest - self.next_seq
+            self.next_seq = oldest
+        if self.next_seq > head:
+            return None
+        seq = self.next_seq
+        off = self._slot_off(seq)
+        got, ts_ms, cam, frame, n, m, kind = _SLOT.unpack_from(self._view, off)
+        if got != seq or n + m > self.slot_bytes:
+            # Being rewritten right now: the writer lapped us.
+            self.torn += 1
+            self.skipped += 1
+            self.next_seq = seq + 1
+            return None
+        start = off + _SLOT_SIZE
+        f = Frame(self, seq, ts_ms, cam, frame, kind.rstrip(b"\0").decode("ascii", "replace"),
+                  self._view[start:start + n], self._view[start + n:start + n + m])
+        self.next_seq = seq + 1
+        if not f.valid():
+            f.release()
+            self.torn += 1
+            self.skipped += 1
+            return None
+        self.read += 1
+        return f
+
+    def next(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Wakeups that arrived while the caller was busy are stale now.
+        self._drain()
+        while True:
+            f = self.poll()
+            if f is not None:
+                return f
+            if self.next_seq is not None and self.head() >= self.next_seq:
+                continue
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return None
+            self._wait(left)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self._sock_path)
+            except OSError:
+                pass
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def stats(self):
+        return {"name": self.name, "head": self.head() if self._view is not None else None,
+                "next": self.next_seq, "read": self.read, "skipped": self.skipped, "torn": self.torn}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="frame_ring", description="Write or tail a shared-memory frame ring.")
+    parser.add_argument("--name", default=os.getenv('DS_FRAME_RING', 'ds_frames') or 'ds_frames')
+    sub = parser.add_subparsers(dest="cmd")
+    w = sub.add_parser("write", help="publish synthetic frames")
+    w.add_argument("--fps", type=float, default=30.0)
+    w.add_argument("--bytes", type=int, default=200000)
+    w.add_argument("--slots", type=int, default=8)
+    w.add_argument("--slot-kb", type=int, default=1024)
+    w.add_argument("--count", type=int, default=0, help="stop after N frames (0 = run forever)")
+    t = sub.add_parser("tail", help="read frames and print stats once a second")
+    t.add_argument("--latest", action="store_true", help="only the newest frame")
+    t.add_argument("--delay-ms", type=float, default=0.0, help="simulate a slow consumer")
+    t.add_argument("--count", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "write":
+        ring = FrameRing.create(args.name, args.slots, args.slot_kb * 1024)
+        payload = bytes(range(256)) * (args.bytes // 256 + 1)
+        payload = payload[:args.bytes]
+        last = time.monotonic()
+        try:
+            while not args.count or ring.seq < args.count:
+                ring.put(payload, {"frame": ring.seq + 1, "detections": []}, frame=ring.seq + 1, kind="test")
+                now = time.monotonic()
+                if now - last >= 1.0:
+                    print(json.dumps(ring.stats()))
+                    last = now
+                time.sleep(1.0 / args.fps if args.fps > 0 else 0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(json.dumps(ring.stats()))
+            ring.close()
+        return 0
+    if args.cmd != "tail":
+        parser.print_help()
+        return 2
+    reader = FrameReader(args.name, latest=args.latest)
+    last, got, lat = time.monotonic(), 0, 0.0
+    try:
+        while not args.count or reader.read < args.count:
+            f = reader.next(timeout=1.0)
+            if f is not None:
+                lat += time.time() * 1000 - f.ts_ms
+                got += 1
+                if args.delay_ms:
+                    time.sleep(args.delay_ms / 1000.0)
+                if not f.valid():
+                    reader.torn += 1
+                f.release()
+            now = time.monotonic()
+            if now - last >= 1.0:
+                out = reader.stats()
+                out["latency_ms"] = round(lat / got, 2) if got else None
+                print(json.dumps(out))
+                last, got, lat = now, 0, 0.0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(reader.stats()))
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
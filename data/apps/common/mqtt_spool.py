@@ -0,0 +1,349 @@
+import collections
+import os
+import struct
+import threading
+import zlib
+
+from common.pacing import RateLimiter
+
+# Store-and-forward MQTT output.
+#
+#   SegmentSpool   append-only segment files seg_<seq>.log under a directory.
+#                  Record: crc32, payload length, topic length (">IIH"), topic,
+#                  payload. A new segment is started every segment_bytes.
+#                  On open, appends continue in the last segment while it
+#                  has room, after cutting off a torn record at its end;
+#                  empty leftover segments are removed. The read cursor
+#                  (segment, offset) is saved to "cursor" and only moves
+#                  over acknowledged records. Past max_bytes the oldest
+#                  segments are dropped (counted in stats).
+#   SpoolReplayer  replays a spool at QoS 1: at most `inflight` unacked
+#                  messages, at most replay_rate messages/s. The cursor only
+#                  advances over the acked prefix; a disconnect rewinds to it,
+#                  so delivery is at-least-once.
+#
+# common/mqtt_transport.py decides what goes to the spool (while
+# disconnected, or while a backlog remains so order is kept per topic) and
+# drives the replayer from its network thread.
+
+_HDR = struct.Struct(">IIH")
+MQTT_ERR_SUCCESS = 0
+
+
+class SegmentSpool:
+    def __init__(self, path, segment_bytes=4 << 20, max_bytes=256 << 20):
+        self.path = path
+        self.segment_bytes = int(segment_bytes)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.segments = sorted(int(n[4:-4]) for n in os.listdir(path) if n.startswith("seg_") and n.endswith(".log"))
+        self.sizes = {s: os.path.getsize(self._seg(s)) for s in self.segments}
+        self.ack = self._load_cursor()
+        self.read = self.ack
+        for seq in [s for s in self.segments if s < self.ack[0]]:
+            # Fully acknowledged before the last shutdown.
+            self.segments.remove(seq)
+            self.sizes.pop(seq)
+            os.remove(self._seg(seq))
+        for seq in [s for s in self.segments[:-1] if self.sizes[s] == 0]:
+            # Left by restarts while nothing was spooled.
+            self.segments.remove(seq)
+            self.sizes.pop(seq)
+            os.remove(self._seg(seq))
+        if self.segments and self.ack[0] not in self.sizes:
+            self.ack = self.read = (self.segments[0], 0)
+        self.write_seq = (self.segments[-1] + 1) if self.segments else 0
+        self._wf = None
+        self._rf = None
+        self._rf_seq = None
+        self.appended = 0
+        self.dropped_segments = 0
+        self.dropped_bytes = 0
+        self.corrupt = 0
+        self._cursor_dirty = False
+        if self.segments and self.sizes[self.segments[-1]] < self.segment_bytes:
+            self._reopen(self.segments[-1])
+        else:
+            self._roll()
+
+    def _seg(self, seq):
+        return os.path.join(self.path, "seg_%012d.log" % seq)
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.path, "cursor"), "r") as f:
+                seq, off = f.read().split()
+            pos = (int(seq), int(off))
+        except Exception:
+            pos = None
+        if pos is None or pos[0] not in self.sizes:
+            return (self.segments[0], 0) if self.segments else (0, 0)
+        return pos
+
+    def save_cursor(self):
+        with self._lock:
+            if not self._cursor_dirty:
+                return
+            self._cursor_dirty = False
+            seq, off = self.ack
+        tmp = os.path.join(self.path, "cursor.tmp")
+        with open(tmp, "w") as f:
+            f.write("%d %d" % (seq, off))
+        os.replace(tmp, os.path.join(self.path, "cursor"))
+
+    def _reopen(self, seq):
+        # Keeps appending to seq. A record torn by a crash would stall the
+        # reader (or hide what follows it), so the file is cut back to the
+        # last complete record first.
+        with open(self._seg(seq), "rb") as f:
+            data = f.read()
+        end = 0
+        while end + _HDR.size <= len(data):
+            crc, plen, tlen = _HDR.unpack_from(data, end)
+            nxt = end + _HDR.size + tlen + plen
+            if nxt > len(data) or zlib.crc32(data[end + _HDR.size:nxt]) != crc:
+                break
+            end = nxt
+        if end < len(data):
+            with open(self._seg(seq), "r+b") as f:
+                f.truncate(end)
+            self.corrupt += 1
+            self.sizes[seq] = end
+            if self.ack[0] == seq and self.ack[1] > end:
+                self.ack = self.read = (seq, end)
+                self._cursor_dirty = True
+        self._wf = open(self._seg(seq), "ab")
+
+    def _roll(self):
+        if self._wf is not None:
+            self._wf.close()
+        seq = self.write_seq
+        self.write_seq += 1
+        self._wf = open(self._seg(seq), "ab")
+        self.segments.append(seq)
+        self.sizes[seq] = 0
+        if not self.segments or self.ack[0] not in self.sizes:
+            self.ack = self.read = (seq, 0)
+
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def backlog_bytes(self):
+        with self._lock:
+            seq, off = self.ack
+            return sum(sz for s, sz in self.sizes.items() if s > seq) + self.sizes.get(seq, 0) - off
+
+    def empty(self):
+        # Nothing unacknowledged.
+        return self.backlog_bytes() <= 0
+
+    def append(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        t = topic.encode("utf-8")
+        rec = _HDR.pack(zlib.crc32(t + payload), len(payload), len(t)) + t + payload
+        with self._lock:
+            seq = self.segments[-1]
+            if self.sizes[seq] and self.sizes[seq] + len(rec) > self.segment_bytes:
+                self._roll()
+                seq = self.segments[-1]
+            self._wf.write(rec)
+            self._wf.flush()
+            self.sizes[seq] += len(rec)
+            self.appended += 1
+            self._enforce()
+
+    def _enforce(self):
+        while len(self.segments) > 1 and self.total_bytes() > self.max_bytes:
+            seq = self.segments.pop(0)
+            self.dropped_bytes += self.sizes.pop(seq)
+            self.dropped_segments += 1
+            if self._rf_seq == seq:
+                self._rf.close()
+                self._rf, self._rf_seq = None, None
+            try:
+                os.remove(self._seg(seq))
+            except OSError:
+                pass
+            nxt = (self.segments[0], 0)
+            if self.ack[0] == seq or self.ack < nxt:
+                self.ack = nxt
+                self._cursor_dirty = True
+            if self.read < nxt:
+                self.read = nxt
+
+    def next(self):
+        # Next unread record as (topic, payload, end_pos), or None.
+        with self._lock:
+            while True:
+                seq, off = self.read
+                if seq not in self.sizes:
+                    later = [s for s in self.segments if s > seq]
+                    if not later:
+                        return None
+                    self.read = (later[0], 0)
+                    continue
+                size = self.sizes[seq]
+                last = seq == self.segments[-1]
+                if off + _HDR.size > size:
+                    if last:
+                        return None
+                    self.read = (self.segments[self.segments.index(seq) + 1], 0)
+                    continue
+                f = self._reader(seq)
+                f.seek(off)
+                hdr = f.read(_HDR.size)
+                crc, plen, tlen = _HDR.unpack(hdr)
+                end = off + _HDR.size + tlen + plen
+                body = f.read(tlen + plen) if end <= size else b""
+                if end > size or zlib.crc32(body) != crc:
+                    if last and end > size:
+                        return None
+                    # Torn tail of an older segment: skip the rest of it.
+                    self.corrupt += 1
+                    self.read = (self.segments[self.segments.index(seq) + 1], 0) if not last else (seq, size)
+                    continue
+                self.read = (seq, end)
+                return body[:tlen].decode("utf-8"), body[tlen:], (seq, end)
+
+    def _reader(self, seq):
+        if self._rf_seq != seq:
+            if self._rf is not None:
+                self._rf.close()
+            self._rf = open(self._seg(seq), "rb")
+            self._rf_seq = seq
+        return self._rf
+
+    def commit(self, pos):
+        # Everything up to pos is acknowledged; drop fully consumed segments.
+        with self._lock:
+            if pos <= self.ack:
+                return
+            self.ack = pos
+            self._cursor_dirty = True
+            while len(self.segments) > 1 and self.segments[0] < pos[0]:
+                seq = self.segments.pop(0)
+                self.sizes.pop(seq, None)
+                if self._rf_seq == seq:
+                    self._rf.close()
+                    self._rf, self._rf_seq = None, None
+                try:
+                    os.remove(self._seg(seq))
+                except OSError:
+                    pass
+
+    def rewind(self):
+        with self._lock:
+            self.read = self.ack
+
+    def close(self):
+        self.save_cursor()
+        with self._lock:
+            if self._wf is not None:
+                self._wf.close()
+            if self._rf is not None:
+                self._rf.close()
+
+    def stats(self):
+        return {"segments": len(self.segments), "bytes": self.total_bytes(), "backlog_bytes": self.backlog_bytes(),
+                "appended": self.appended, "dropped_segments": self.dropped_segments,
+                "dropped_bytes": self.dropped_bytes, "corrupt": self.corrupt}
+
+
+class SpoolReplayer:
+    # QoS 1 replay of a SegmentSpool: at most `inflight` unacked messages and
+    # at most replay_rate messages/s. Call pump() from the thread that owns
+    # the client, on_publish() from its on_publish callback, reset() when
+    # the connection drops.
+    def __init__(self, spool, inflight=20, replay_rate=200.0):
+        self.spool = spool
+        self.inflight_max = max(1, int(inflight))
+        self.set_rate(replay_rate)
+        self._lock = threading.Lock()
+        self._inflight = collections.OrderedDict()  # mid -> [end_pos, acked]
+        self._early = set()
+        self._publishing = False
+        self.replayed = 0
+        self.acked = 0
+
+    def set_rate(self, replay_rate):
+        replay_rate = float(replay_rate)
+        self.limiter = RateLimiter(replay_rate, burst=min(replay_rate, float(self.inflight_max))) if replay_rate > 0 else None
+
+    def inflight(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def idle(self):
+        # Nothing inflight and nothing left in the spool.
+        return self.inflight() == 0 and self.spool.empty()
+
+    def reset(self):
+        with self._lock:
+            self._inflight.clear()
+            self._early.clear()
+        self.spool.rewind()
+
+    def on_publish(self, mid):
+        with self._lock:
+            entry = self._inflight.get(mid)
+            if entry is None:
+                # Clients that ack inside publish() (FakeClient) call back
+                # before pump() has recorded the mid.
+                if self._publishing:
+                    self._early.add(mid)
+                return
+            entry[1] = True
+        self._advance()
+
+    def _advance(self):
+        pos = None
+        with self._lock:
+            while self._inflight:
+                mid, (end, acked) = next(iter(self._inflight.items()))
+                if not acked:
+                    break
+                self._inflight.popitem(last=False)
+                self.acked += 1
+                pos = end
+        if pos is not None:
+            self.spool.commit(pos)
+
+    def pump(self, publish):
+        # publish(topic, payload, qos) -> MQTTMessageInfo. Never blocks on the
+        # rate limit; returns the number of messages handed to the client.
+        sent = 0
+        while self.inflight() < self.inflight_max:
+            if self.limiter is not None and not self.limiter.try_take():
+                break
+            rec = self.spool.next()
+            if rec is None:
+                if self.limiter is not None:
+                    self.limiter.refund()
+                break
+            topic, payload, end = rec
+            self._publishing = True
+            try:
+                info = publish(topic, payload, 1)
+            except Exception:
+                info = None
+            finally:
+                self._publishing = False
+            if info is None or getattr(info, "rc", MQTT_ERR_SUCCESS) != MQTT_ERR_SUCCESS:
+                self.reset()
+                break
+            with self._lock:
+                acked = info.mid in self._early
+                self._early.discard(info.mid)
+                self._inflight[info.mid] = [end, acked]
+            self.replayed += 1
+            sent += 1
+            if acked:
+                self._advance()
+        return sent
+
+    def stats(self):
+        out = {"replayed": self.replayed, "acked": self.acked, "inflight": self.inflight()}
+        out.update(self.spool.stats())
+        return out
@@ -0,0 +1,282 @@
+import collections
+import threading
+import time
+
+from common.mqtt_spool import SpoolReplayer
+
+# One MQTT connection, one thread, several logical channels.
+#
+# The transport owns a single paho client and drives it from its own thread
+# with client.loop() (no loop_start), so connecting, reading/writing the
+# socket, paho callbacks, timers (heartbeat) and spool replay all run on that
+# one thread. Producers only append to per-channel queues.
+#
+#   t = MqttTransport(mqtt.Client(), host, port)
+#   t.channel("heartbeat", priority=0, max_queue=2)
+#   t.channel("detections", priority=1, max_queue=512, spool=SegmentSpool(dir))
+#   t.channel("snapshots", priority=2, max_queue=4)
+#   t.every(1.0, send_heartbeat)
+#   t.start(); t.publish("detections", topic, payload); t.stop()
+#
+# Priorities: every pass sends the queued messages of each channel in
+# priority order (0 first). Messages of at least large_bytes are handed to the
+# client only while its output buffer is empty, one per pass, so a burst of
+# snapshots never sits in front of detections in paho's socket queue.
+# Backpressure: a full queue drops its oldest message (counted), except on
+# spooled channels, which overflow to disk. A spooled channel also goes to
+# disk while disconnected and stays there until the backlog is replayed, so
+# order within a topic is kept (see common/mqtt_spool.py).
+
+MQTT_ERR_SUCCESS = 0
+
+
+class Channel:
+    def __init__(self, name, priority=1, max_queue=256, qos=0, spool=None, inflight=20, replay_rate=200.0):
+        self.name = name
+        self.priority = int(priority)
+        self.max_queue = max(1, int(max_queue))
+        self.qos = int(qos)
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.replayer = SpoolReplayer(spool, inflight, replay_rate) if spool is not None else None
+        self.spooling = False
+        self.queued = 0
+        self.sent = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.spooled = 0
+
+    def stats(self):
+        with self.lock:
+            out = {"queued": len(self.queue), "sent": self.sent, "sent_bytes": self.sent_bytes,
+                   "dropped": self.dropped}
+        if self.replayer is not None:
+            out["spooled"] = self.spooled
+            out.update(self.replayer.stats())
+        return out
+
+
+class MqttTransport:
+    def __init__(self, client, host="127.0.0.1", port=1883, keepalive=60, backoff_max_s=30.0,
+                 idle_s=0.05, large_bytes=16384):
+        self.client = client
+        self.host = host
+        self.port = int(port)
+        self.keepalive = keepalive
+        self.backoff_max_s = float(backoff_max_s)
+        self.idle_s = float(idle_s)
+        self.large_bytes = int(large_bytes)
+        self.channels = {}
+        self._order = []
+        self._timers = []
+        self._stop = threading.Event()
+        self._deadline = None
+        self._thread = None
+        self._socket_up = False
+        self._ever_connected = False
+        self._next_attempt = 0.0
+        self._backoff = 1.0
+        self.connected = False
+        self.reconnects = 0
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+
+    def channel(self, name, **kwargs):
+        ch = Channel(name, **kwargs)
+        self.channels[name] = ch
+        self._order = sorted(self.channels.values(), key=lambda c: c.priority)
+        return ch
+
+    def every(self, interval_s, fn):
+        # fn() runs on the transport thread every interval_s, connected or not.
+        self._timers.append([float(interval_s), 0.0, fn])
+
+    def publish(self, channel, topic, payload):
+        # Thread-safe. Returns False when the message was dropped.
+        ch = self.channels[channel]
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with ch.lock:
+            ch.queued += 1
+            if ch.replayer is not None and (not self.connected or ch.spooling or len(ch.queue) >= ch.max_queue):
+                ch.spooling = True
+                ch.replayer.spool.append(topic, payload)
+                ch.spooled += 1
+                return True
+            if len(ch.queue) >= ch.max_queue:
+                ch.queue.popleft()
+                ch.dropped += 1
+                ch.queue.append((topic, payload))
+                return False
+            ch.queue.append((topic, payload))
+        return True
+
+    # paho callbacks; all run on the transport thread (inside loop()/connect())
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        if rc == 0:
+            self.connected = True
+            self._ever_connected = True
+            self._backoff = 1.0
+
+    def _on_disconnect(self, client, userdata, rc, *args):
+        self._lost()
+
+    def _on_publish(self, client, userdata, mid, *args):
+        for ch in self._order:
+            if ch.replayer is not None:
+                ch.replayer.on_publish(mid)
+
+    def _lost(self):
+        was = self._socket_up or self.connected
+        self.connected = False
+        self._socket_up = False
+        if not was:
+            return
+        for ch in self._order:
+            if ch.replayer is None:
+                continue
+            with ch.lock:
+                # Whatever was queued goes to disk ahead of newer messages.
+                while ch.queue:
+                    ch.replayer.spool.append(*ch.queue.popleft())
+                    ch.spooled += 1
+                ch.spooling = True
+            ch.replayer.reset()
+        self._next_attempt = time.monotonic() + self._backoff
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mqtt-transport", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush_s=2.0):
+        # Sends what is queued for up to flush_s, then disconnects.
+        self._deadline = time.monotonic() + float(flush_s)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=flush_s + 2.0)
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        try:
+            if self._ever_connected:
+                self.client.reconnect()
+            else:
+                self.client.connect(self.host, self.port, self.keepalive)
+            self._socket_up = True
+            self.reconnects += 1
+            return True
+        except Exception:
+            self._next_attempt = now + self._backoff
+            self._backoff = min(self.backoff_max_s, self._backoff * 2)
+            return False
+
+    def _pending(self):
+        for ch in self._order:
+            if ch.queue:
+                return True
+            if ch.replayer is not None and ch.spooling and self.connected:
+                return True
+        return False
+
+    def _run(self):
+        last_save = 0.0
+        while True:
+            if self._stop.is_set() and (not self._pending() or time.monotonic() > self._deadline):
+                break
+            if not self._socket_up:
+                if not self._connect():
+                    self._run_timers()
+                    time.sleep(self.idle_s)
+                    continue
+            busy = self._send()
+            try:
+                rc = self.client.loop(timeout=0.0 if busy else self.idle_s)
+            except Exception:
+                rc = -1
+            if rc != MQTT_ERR_SUCCESS:
+                self._lost()
+            self._run_timers()
+            now = time.monotonic()
+            if now - last_save > 1.0:
+                self._save_cursors()
+                last_save = now
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+        self._save_cursors(close=True)
+
+    def _run_timers(self):
+        now = time.monotonic()
+        for t in self._timers:
+            if now >= t[1]:
+                t[1] = now + t[0]
+                try:
+                    t[2]()
+                except Exception:
+                    pass
+
+    def _save_cursors(self, close=False):
+        for ch in self._order:
+            if ch.replayer is None:
+                continue
+            try:
+                if close:
+                    ch.replayer.spool.close()
+                else:
+                    ch.replayer.spool.save_cursor()
+            except Exception:
+                pass
+
+    def _send(self):
+        # One pass in priority order; returns True if anything is left over.
+        if not self.connected:
+            return False
+        large_sent = False
+        for ch in self._order:
+            while True:
+                with ch.lock:
+                    if not ch.queue:
+                        break
+                    topic, payload = ch.queue[0]
+                    large = len(payload) >= self.large_bytes
+                    if large and (large_sent or self._want_write()):
+                        break
+                    ch.queue.popleft()
+                try:
+                    info = self.client.publish(topic, payload, qos=ch.qos, retain=False)
+                    ok = getattr(info, "rc", MQTT_ERR_SUCCESS) == MQTT_ERR_SUCCESS
+                except Exception:
+                    ok = False
+                if not ok:
+                    with ch.lock:
+                        ch.queue.appendleft((topic, payload))
+                    self._lost()
+                    return False
+                ch.sent += 1
+                ch.sent_bytes += len(payload)
+                if large:
+                    large_sent = True
+            if ch.replayer is not None and ch.spooling:
+                with ch.lock:
+                    drained = not ch.queue
+                if drained:
+                    ch.replayer.pump(lambda t, p, q: self.client.publish(t, p, qos=q, retain=False))
+                    with ch.lock:
+                        if ch.replayer.idle():
+                            ch.spooling = False
+        return any(ch.queue for ch in self._order)
+
+    def _want_write(self):
+        try:
+            return bool(self.client.want_write())
+        except Exception:
+            return False
+
+    def stats(self):
+        return {"connected": self.connected, "reconnects": self.reconnects,
+                "channels": {ch.name: ch.stats() for ch in self._order}}
@@ -0,0 +1,101 @@
+import time
+
+# Deadline-based pacing. Every event gets an absolute due time computed from
+# the start of the run, so sleep overshoot never accumulates into drift. The
+# last stretch before a deadline is spun instead of slept because
+# time.sleep() granularity (~1 ms on Linux, worse under load) dominates at
+# high replay rates.
+
+
+class Pacer:
+    def __init__(self, speed=1.0, spin_s=0.002, clock=time.perf_counter, sleep=time.sleep):
+        if speed <= 0:
+            raise ValueError("speed must be > 0")
+        self.speed = float(speed)
+        self.spin_s = float(spin_s)
+        self._clock = clock
+        self._sleep = sleep
+        self._t0 = None
+        self._origin = None
+        self.events = 0
+        self.late_events = 0
+        self.max_lag_s = 0.0
+        self.total_lag_s = 0.0
+
+    def start(self, origin_s=0.0):
+        self._t0 = self._clock()
+        self._origin = float(origin_s)
+
+    def due(self, event_s):
+        if self._t0 is None:
+            self.start(event_s)
+        return self._t0 + (float(event_s) - self._origin) / self.speed
+
+    def overdue(self, event_s):
+        return self._t0 is not None and self.due(event_s) <= self._clock()
+
+    def wait(self, event_s):
+        # Blocks until the event's due time and returns how late it was (>= 0).
+        due = self.due(event_s)
+        while True:
+            remaining = due - self._clock()
+            if remaining <= 0:
+                break
+            if remaining > self.spin_s:
+                self._sleep(remaining - self.spin_s)
+        lag = max(0.0, self._clock() - due)
+        self.events += 1
+        self.total_lag_s += lag
+        if lag > self.max_lag_s:
+            self.max_lag_s = lag
+        if lag > 0.005:
+            self.late_events += 1
+        return lag
+
+    def elapsed(self):
+        if self._t0 is None:
+            return 0.0
+        return self._clock() - self._t0
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "late_events": self.late_events,
+            "max_lag_ms": round(self.max_lag_s * 1000.0, 3),
+            "avg_lag_ms": round((self.total_lag_s / self.events) * 1000.0, 3) if self.events else 0.0,
+        }
+
+
+class RateLimiter:
+    # Token bucket; take() blocks until `n` tokens are available.
+    def __init__(self, rate_per_s, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate_per_s)
+        self.burst = float(burst if burst is not None else max(1.0, rate_per_s))
+        self._tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_take(self, n=1.0):
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self._tokens >= n:
+            self._tokens -= n
+            return True
+        return False
+
+    def refund(self, n=1.0):
+        # Returns tokens taken for work that turned out not to exist.
+        self._tokens = min(self.burst, self._tokens + n)
+
+    def take(self, n=1.0):
+        if self.rate <= 0:
+            return
+        while not self.try_take(n):
+            self._sleep(max(0.0005, (n - self._tokens) / self.rate))
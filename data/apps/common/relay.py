@@ -0,0 +1,332 @@
+import collections
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+
+# Publish channel between pipeline workers and one publisher process.
+#
+# Workers do not talk to the broker. RelayClient has the publishing side of
+# MqttTransport (channel/every/publish/start/stop/stats), so the app uses it
+# in place of the transport. Each message becomes a frame on a unix stream
+# socket:
+#
+#   <body_len u32><topic_len u16><channel_len u8> channel topic body
+#
+# The publisher process runs a RelayServer and hands every frame to its own
+# MqttTransport, so N workers share one broker connection, one spool and
+# one set of priorities.
+#
+#   relay = RelayClient("/tmp/ds_publish.sock", "w0")
+#   relay.channel("detections", priority=1, max_queue=512)
+#   relay.start(); relay.publish("detections", topic, payload)
+#
+#   server = RelayServer("/tmp/ds_publish.sock", lambda peer, ch, t, p: transport.publish(ch, t, p))
+#   server.start()
+#
+# The first frame of a connection is a hello on channel "" carrying the
+# worker name, so the server can keep stats per worker. While the socket is
+# down, RelayClient queues as the transport does (oldest dropped per
+# channel), and it reconnects with backoff. The publisher can be restarted
+# under running workers.
+
+_HDR = struct.Struct("<IHB")
+MAX_BODY = 64 << 20
+
+
+def encode(channel, topic, payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    c = channel.encode("utf-8")
+    t = topic.encode("utf-8")
+    return b"".join((_HDR.pack(len(payload), len(t), len(c)), c, t, payload))
+
+
+class _Channel:
+    def __init__(self, name, priority=1, max_queue=256):
+        self.name = name
+        self.priority = int(priority)
+        self.max_queue = max(1, int(max_queue))
+        self.queue = collections.deque()
+        self.sent = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {"queued": len(self.queue), "sent": self.sent, "dropped": self.dropped}
+
+
+class RelayClient:
+    def __init__(self, path, name, backoff_max_s=10.0, idle_s=0.05, send_timeout_s=5.0):
+        self.path = path
+        self.name = name
+        self.send_timeout_s = float(send_timeout_s)
+        self.backoff_max_s = float(backoff_max_s)
+        self.idle_s = float(idle_s)
+        self.channels = {}
+        self._order = []
+        self._timers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._deadline = None
+        self._thread = None
+        self._sock = None
+        self._backoff = 0.5
+        self._next_attempt = 0.0
+        self.connected = False
+        self.reconnects = 0
+
+    def channel(self, name, priority=1, max_queue=256, **ignored):
+        # Extra MqttTransport options (qos, spool, ...) belong to the publisher.
+        ch = _Channel(name, priority, max_queue)
+        self.channels[name] = ch
+        self._order = sorted(self.channels.values(), key=lambda c: c.priority)
+        return ch
+
+    def every(self, interval_s, fn):
+        self._timers.append([float(interval_s), 0.0, fn])
+
+    def publish(self, channel, topic, payload):
+        ch = self.channels[channel]
+        frame = encode(channel, topic, payload)
+        with self._lock:
+            if len(ch.queue) >= ch.max_queue:
+                ch.queue.popleft()
+                ch.dropped += 1
+                ch.queue.append(frame)
+                self._wake.set()
+                return False
+            ch.queue.append(frame)
+        self._wake.set()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="relay-client", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush_s=2.0):
+        self._deadline = time.monotonic() + float(flush_s)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=flush_s + 1.0)
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            # A publisher that stops reading counts as gone after send_timeout_s.
+            sock.settimeout(self.send_timeout_s)
+            sock.sendall(encode("", self.name, b""))
+        except OSError:
+            sock.close()
+            self._next_attempt = now + self._backoff
+            self._backoff = min(self.backoff_max_s, self._backoff * 2)
+            return False
+        self._sock = sock
+        self._backoff = 0.5
+        self.connected = True
+        self.reconnects += 1
+        return True
+
+    def _lost(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self.connected = False
+        self._next_attempt = time.monotonic() + self._backoff
+
+    def _pending(self):
+        return any(ch.queue for ch in self._order)
+
+    def _run(self):
+        while True:
+            if self._stop.is_set() and (not self._pending() or time.monotonic() > self._deadline):
+                break
+            self._run_timers()
+            if self._sock is None and not self._connect():
+                self._wake.wait(self.idle_s)
+                self._wake.clear()
+                continue
+            if not self._send():
+                self._wake.wait(self.idle_s)
+                self._wake.clear()
+        if self._sock is not None:
+            self._sock.close()
+
+    def _send(self):
+        # Everything queued, in priority order, as one sendall.
+        batch, taken = [], []
+        with self._lock:
+            for ch in self._order:
+                while ch.queue:
+                    batch.append(ch.queue.popleft())
+                    taken.append(ch)
+        if not batch:
+            return False
+        try:
+            self._sock.sendall(b"".join(batch))
+        except OSError:
+            # Part of the batch may have gone out; the rest is requeued, so a
+            # message can be sent twice across a reconnect but never lost
+            # while it fits in its queue.
+            with self._lock:
+                for ch, frame in reversed(list(zip(taken, batch))):
+                    if len(ch.queue) < ch.max_queue:
+                        ch.queue.appendleft(frame)
+                    else:
+                        ch.dropped += 1
+            self._lost()
+            return False
+        for ch in taken:
+            ch.sent += 1
+        return True
+
+    def _run_timers(self):
+        now = time.monotonic()
+        for t in self._timers:
+            if now >= t[1]:
+                t[1] = now + t[0]
+                try:
+                    t[2]()
+                except Exception:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {"relay": self.path, "connected": self.connected, "reconnects": self.reconnects,
+                    "channels": {ch.name: ch.stats() for ch in self._order}}
+
+
+class _Peer:
+    def __init__(self, sock):
+        self.sock = sock
+        self.name = None
+        self.buf = bytearray()
+        self.messages = 0
+        self.bytes = 0
+        self.since = time.monotonic()
+
+
+class RelayServer:
+    def __init__(self, path, on_message):
+        # on_message(peer_name, channel, topic, payload), called on the
+        # server thread.
+        self.path = path
+        self.on_message = on_message
+        self._sel = selectors.DefaultSelector()
+        self._listen = None
+        self._peers = {}
+        self._totals = {}      # peer name -> [messages, bytes]
+        self._stop = threading.Event()
+        self._thread = None
+        self.errors = 0
+
+    def start(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._listen = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listen.bind(self.path)
+        self._listen.listen(64)
+        self._listen.setblocking(False)
+        self._sel.register(self._listen, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name="relay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        for peer in list(self._peers.values()):
+            self._drop(peer)
+        if self._listen is not None:
+            self._listen.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            for key, _ in self._sel.select(timeout=0.2):
+                if key.fileobj is self._listen:
+                    try:
+                        sock, _ = self._listen.accept()
+                    except OSError:
+                        continue
+                    sock.setblocking(False)
+                    peer = _Peer(sock)
+                    self._peers[sock.fileno()] = peer
+                    self._sel.register(sock, selectors.EVENT_READ, peer)
+                else:
+                    self._read(key.data)
+
+    def _drop(self, peer):
+        self._peers.pop(peer.sock.fileno(), None)
+        try:
+            self._sel.unregister(peer.sock)
+        except (KeyError, ValueError):
+            pass
+        peer.sock.close()
+
+    def _read(self, peer):
+        try:
+            data = peer.sock.recv(1 << 20)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(peer)
+            return
+        buf = peer.buf
+        buf += data
+        pos = 0
+        while len(buf) - pos >= _HDR.size:
+            n, t, c = _HDR.unpack_from(buf, pos)
+            if n > MAX_BODY:
+                self.errors += 1
+                self._drop(peer)
+                return
+            end = pos + _HDR.size + c + t + n
+            if len(buf) < end:
+                break
+            p = pos + _HDR.size
+            channel = bytes(buf[p:p + c]).decode("utf-8", "replace")
+            topic = bytes(buf[p + c:p + c + t]).decode("utf-8", "replace")
+            payload = bytes(buf[p + c + t:end])
+            pos = end
+            if channel == "":
+                peer.name = topic
+                continue
+            peer.messages += 1
+            peer.bytes += n
+            tot = self._totals.setdefault(peer.name or "?", [0, 0])
+            tot[0] += 1
+            tot[1] += n
+            try:
+                self.on_message(peer.name, channel, topic, payload)
+            except Exception:
+                self.errors += 1
+        del buf[:pos]
+
+    def stats(self):
+        connected = set(p.name for p in list(self._peers.values()))
+        return {"errors": self.errors,
+                "workers": {name: {"connected": name in connected, "messages": m, "bytes": b}
+                            for name, (m, b) in list(self._totals.items())}}
@@ -0,0 +1,243 @@
+import heapq
+import os
+import threading
+import time
+
+# Quota-based retention for a snapshot directory (autocap).
+#
+# Files are grouped by snapshot base so <ts>_clean.jpg, <ts>_osd.jpg and
+# <ts>_meta.json are always evicted together; any other file is its own
+# group. The ledger (group -> ts, bytes, paths) is built once at start by a
+# single scan of the tree - the snapshot catalog, when there is one, only
+# supplies timestamps, since it can miss files written before it or behind
+# its back - and then kept up to date by record() calls from the writer, so
+# enforcing the quotas never re-stats the tree.
+#
+# Quotas (0 = off): max_bytes, max_files, max_age_s, min_free_bytes (free
+# space on the filesystem, one statvfs per check). While any is exceeded the
+# oldest groups are deleted, batch groups at a time.
+#
+#   ret = RetentionManager(root, max_bytes=20 << 30, max_age_s=7 * 86400, catalog=cat)
+#   ret.start()                      # loads the ledger, enforces every interval_s
+#   ret.record(path, size)           # after each successful write
+#   ret.stats()                      # usage and eviction counters
+#
+# Clock and statvfs are injectable so the manager can be driven on a temp
+# directory without waiting or filling a disk.
+
+GROUP_SUFFIXES = ("_clean.jpg", "_osd.jpg", "_meta.json")
+SKIP_PREFIXES = ("catalog.sqlite3",)
+
+
+def group_key(rel):
+    low = rel.lower()
+    for suffix in GROUP_SUFFIXES:
+        if low.endswith(suffix):
+            return rel[:-len(suffix)]
+    return rel
+
+
+def _ts_of(key, fallback):
+    name = key.rsplit("/", 1)[-1]
+    return int(name) / 1000.0 if name.isdigit() else fallback
+
+
+class RetentionManager:
+    def __init__(self, root, max_bytes=0, max_files=0, max_age_s=0, min_free_bytes=0,
+                 batch=64, interval_s=10.0, catalog=None, clock=time.time, statvfs=os.statvfs):
+        self.root = root
+        self.max_bytes = int(max_bytes or 0)
+        self.max_files = int(max_files or 0)
+        self.max_age_s = float(max_age_s or 0)
+        self.min_free_bytes = int(min_free_bytes or 0)
+        self.batch = max(1, int(batch))
+        self.interval_s = float(interval_s)
+        self.catalog = catalog
+        self._clock = clock
+        self._statvfs = statvfs
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.groups = {}   # key -> [ts, bytes, {rel: size}]
+        self._heap = []    # (ts, key); stale entries are skipped on pop
+        self.bytes = 0
+        self.files = 0
+        self.loaded = False
+        self.evicted_groups = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.delete_errors = 0
+        self.last_reason = None
+
+    def enabled(self):
+        return bool(self.max_bytes or self.max_files or self.max_age_s or self.min_free_bytes)
+
+    def _rel(self, path):
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root)
+        return path.replace(os.sep, "/")
+
+    def _add(self, rel, size, ts):
+        key = group_key(rel)
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = [_ts_of(key, ts), 0, {}]
+            heapq.heappush(self._heap, (g[0], key))
+        old = g[2].get(rel)
+        if old is None:
+            self.files += 1
+        else:
+            g[1] -= old
+            self.bytes -= old
+        g[2][rel] = size
+        g[1] += size
+        self.bytes += size
+
+    def load(self):
+        # One pass over the tree; afterwards only record().
+        found = {}
+        self._scan(self.root, "", found)
+        stamps = {}
+        if self.catalog is not None:
+            with self.catalog._lock:
+                stamps = dict(self.catalog.conn.execute("SELECT path, ts_ms FROM files").fetchall())
+        with self._lock:
+            self.groups, self._heap = {}, []
+            self.bytes = self.files = 0
+            for rel, (size, mtime) in found.items():
+                ts_ms = stamps.get(rel)
+                self._add(rel, size, ts_ms / 1000.0 if ts_ms is not None else mtime)
+            self.loaded = True
+        gone = [p for p in stamps if p not in found]
+        if gone:
+            # Rows for files deleted while nothing was recording.
+            try:
+                self.catalog.remove(gone)
+            except Exception:
+                pass
+
+    def _scan(self, path, rel, out):
+        try:
+            it = os.scandir(path)
+        except OSError:
+            return
+        with it:
+            for e in it:
+                r = rel + "/" + e.name if rel else e.name
+                if e.is_dir(follow_symlinks=False):
+                    self._scan(e.path, r, out)
+                elif not e.name.startswith(SKIP_PREFIXES) and not e.name.endswith(".tmp"):
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    out[r] = (st.st_size, st.st_mtime)
+
+    def record(self, path, size, ts=None):
+        with self._lock:
+            self._add(self._rel(path), int(size), self._clock() if ts is None else ts)
+            over = self.max_bytes and self.bytes > self.max_bytes or self.max_files and self.files > self.max_files
+        if over:
+            self._wake.set()
+
+    def _over(self, now, check_free=True):
+        if self.max_bytes and self.bytes > self.max_bytes:
+            return "bytes"
+        if self.max_files and self.files > self.max_files:
+            return "files"
+        if self.max_age_s and self._heap and now - self._heap[0][0] > self.max_age_s:
+            return "age"
+        if check_free and self.min_free_bytes and self.groups:
+            try:
+                st = self._statvfs(self.root)
+                if st.f_bavail * st.f_frsize < self.min_free_bytes:
+                    return "free"
+            except OSError:
+                pass
+        return None
+
+    def _pop_oldest(self):
+        while self._heap:
+            ts, key = heapq.heappop(self._heap)
+            g = self.groups.get(key)
+            if g is not None and g[0] == ts:
+                del self.groups[key]
+                self.bytes -= g[1]
+                self.files -= len(g[2])
+                return key, g
+        return None, None
+
+    def enforce(self, now=None):
+        # Deletes oldest groups until every quota holds; returns groups evicted.
+        if not self.loaded:
+            self.load()
+        now = self._clock() if now is None else now
+        evicted = 0
+        while True:
+            with self._lock:
+                reason = self._over(now)
+                if reason is None:
+                    break
+                # Ledger quotas stop as soon as they hold again; free space is
+                # only known after deleting, so it takes a whole batch.
+                victims = []
+                while len(victims) < self.batch:
+                    key, g = self._pop_oldest()
+                    if key is None:
+                        break
+                    victims.append(g)
+                    if reason != "free" and self._over(now, check_free=False) is None:
+                        break
+                self.last_reason = reason
+            if not victims:
+                break
+            removed = []
+            for ts, size, paths in victims:
+                for rel in paths:
+                    try:
+                        os.remove(os.path.join(self.root, rel))
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        self.delete_errors += 1
+                        continue
+                    removed.append(rel)
+                self.evicted_bytes += size
+                self.evicted_files += len(paths)
+            self.evicted_groups += len(victims)
+            evicted += len(victims)
+            if self.catalog is not None and removed:
+                try:
+                    self.catalog.remove(removed)
+                except Exception:
+                    pass
+        return evicted
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.enforce()
+            except Exception:
+                pass
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+    def stats(self):
+        with self._lock:
+            oldest = self._heap[0][0] if self._heap else None
+            return {"bytes": self.bytes, "files": self.files, "groups": len(self.groups),
+                    "oldest_age_s": round(self._clock() - oldest, 1) if oldest is not None else None,
+                    "max_bytes": self.max_bytes, "max_files": self.max_files, "max_age_s": self.max_age_s,
+                    "evicted_groups": self.evicted_groups, "evicted_files": self.evicted_files,
+                    "evicted_bytes": self.evicted_bytes, "delete_errors": self.delete_errors,
+                    "last_reason": self.last_reason}
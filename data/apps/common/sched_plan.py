@@ -0,0 +1,295 @@
+import os
+import re
+import threading
+import time
+
+# CPU placement and nice levels for the threads of one process.
+#
+# Every thread is given a role from its name:
+#   capture     v4l2src and the source caps/queue threads
+#   decode      jpegparse/jpegdec/nvv4l2decoder/nvjpegdec, source converters
+#   infer       streammux, nvinfer, demux, tiler/OSD, queues in between; the
+#               pad probes run here
+#   publish     MQTT transport/paho, relay client, roslibpy/Twisted, msgbroker
+#   background  log flush, config watch, profiler, retention, clip writer, ...
+#   main        the GLib main loop (bus messages, timers, ROS callbacks)
+#   other       anything unmatched (left alone)
+# Names come, best first, from GStreamer stream-status messages (the owning
+# element of each streaming thread, recorded on that thread by
+# on_stream_status()), Python thread names, and /proc/<pid>/task/<tid>/comm
+# (GStreamer sets it to "<element>:src" and the kernel cuts it at 15 chars).
+#
+# A policy maps roles to (cpus, nice); cpus None leaves the affinity alone,
+# nice None leaves the priority alone:
+#   parse_policy("capture=1:-5;decode=2:-5;infer=3;publish=0:5;background=0:10")
+#   auto_policy(sorted(os.sched_getaffinity(0)))
+# auto keeps the first allowed CPU (which also takes most interrupts on
+# Jetson) for publish/background/main, and gives capture, decode and infer
+# their own cores when there are enough.
+#
+#   plan = ThreadPlanner(auto_policy(cpus))
+#   bus.connect("sync-message::stream-status", lambda b, m: plan.on_stream_status(m.parse_stream_status()[1].get_name()))
+#   plan.apply()           # periodically; new threads are placed once
+#   plan.report()          # {"roles": {role: {cpus, nice, threads, cpu_pct}}, "threads": [...]}
+#
+# A new thread inherits the affinity of the thread that creates it, so
+# "other" threads started from the main loop run on the main role's CPUs.
+# Negative nice needs CAP_SYS_NICE; failures are counted, not raised.
+#
+# root, setaffinity, setpriority and python_threads can be replaced to run
+# against a fake /proc tree.
+
+ROLES = ("capture", "decode", "infer", "publish", "background", "main", "other")
+
+RULES = (
+    ("capture", r"^(v4l2src|usb-cam|source|caps_v4l2src|q_src)"),
+    ("decode", r"^(jpegparse|jpegdec|mjpg_|nvv4l2dec|nvjpegdec|convertor_src|nvvidconv_src|decode)"),
+    ("publish", r"^(mqtt|paho|relay|ros|twisted|autobahn|nvmsg|q_post_msg|snap-mqtt)"),
+    ("background", r"^(log-flush|config-watch|stack-profiler|retention|clip|q_clip|catalog|telemetry|out-)"),
+    ("infer", r"^(stream-muxer|streammux|nvstreammux|primary-inference|nvinfer|q_|queue|tee|nvstreamdemux|demux|"
+              r"nvosd|osd|onscreendisplay|tiler|nvtiler|convertor|sink|fakesink|nveglglessink|caps_)"),
+    ("main", r"^main$"),
+)
+_RULES = [(role, re.compile(rx, re.I)) for role, rx in RULES]
+
+
+def classify(name):
+    if not name:
+        return "other"
+    for role, rx in _RULES:
+        if rx.search(name):
+            return role
+    return "other"
+
+
+def parse_cpus(spec):
+    # "2", "2-3", "0,4-5" -> {...}; "" -> None (no pinning).
+    cpus = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus or None
+
+
+def parse_policy(spec):
+    # "role=cpus[:nice];..." e.g. "capture=1:-5;publish=0:5;background=:10"
+    policy = {}
+    for item in (spec or "").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        role, sep, rest = item.partition("=")
+        role = role.strip()
+        if not sep or role not in ROLES:
+            raise ValueError("bad policy entry %r (roles: %s)" % (item, ", ".join(ROLES)))
+        cpus, _, nice = rest.partition(":")
+        policy[role] = (parse_cpus(cpus), int(nice) if nice.strip() else None)
+    return policy
+
+
+def auto_policy(cpus):
+    c = sorted(cpus)
+    n = len(c)
+    if n < 2:
+        return {"capture": (None, -5), "decode": (None, -5), "publish": (None, 5), "background": (None, 10)}
+    if n == 2:
+        hot, low = {c[1]}, {c[0]}
+        return {"capture": (hot, -5), "decode": (hot, -5), "infer": (hot, None),
+                "publish": (low, 5), "background": (low, 10), "main": (low, None)}
+    low = {c[0], c[-1]} if n >= 6 else {c[0]}
+    if n == 3:
+        capture, decode, infer = {c[1]}, {c[1]}, {c[2]}
+    else:
+        capture, decode = {c[1]}, {c[2]}
+        infer = set(c[3:-1]) if n >= 6 else set(c[3:])
+    return {"capture": (capture, -5), "decode": (decode, -5), "infer": (infer, None),
+            "publish": (low, 5), "background": (low, 10), "main": (low, None)}
+
+
+def plan_workers(n, cpus, publisher=True):
+    # Splits the CPUs between a publisher (first CPU) and n workers
+    # (contiguous chunks of the rest). Returns (publisher_cpus, [worker_cpus]).
+    c = sorted(cpus)
+    pub = {c[0]} if publisher and len(c) > 1 else None
+    rest = c[1:] if pub else c
+    if n <= 0:
+        return pub, []
+    out = []
+    if len(rest) >= n:
+        size, extra = divmod(len(rest), n)
+        i = 0
+        for k in range(n):
+            take = size + (1 if k < extra else 0)
+            out.append(set(rest[i:i + take]))
+            i += take
+    else:
+        out = [{rest[k % len(rest)]} for k in range(n)]
+    return pub, out
+
+
+def _setpriority(tid, nice):
+    os.setpriority(os.PRIO_PROCESS, tid, nice)
+
+
+class ThreadPlanner:
+    def __init__(self, policy, root="/", pid=None, setaffinity=None, setpriority=None,
+                 python_threads=None, clock=time.monotonic):
+        self.policy = dict(policy or {})
+        self.root = root
+        self.pid = os.getpid() if pid is None else int(pid)
+        self._setaffinity = setaffinity or getattr(os, "sched_setaffinity", None)
+        self._setpriority = setpriority or (_setpriority if hasattr(os, "setpriority") else None)
+        self._python_threads = python_threads or self._live_python_threads
+        self._clock = clock
+        self.hz = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._lock = threading.Lock()
+        self._elements = {}   # tid -> element name from stream-status
+        self._threads = {}    # tid -> {"name", "role", "applied"}
+        self._ticks = {}
+        self._last_t = None
+        self.cpu = {}         # tid -> CPU % since the previous report()
+        self.applied = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _live_python_threads(self):
+        out = {}
+        for t in threading.enumerate():
+            native = getattr(t, "native_id", None)
+            if native is not None:
+                out[native] = "main" if t is threading.main_thread() else t.name
+        return out
+
+    def on_stream_status(self, element_name):
+        # Call from a sync bus handler for STREAM_STATUS ENTER: it runs on
+        # the new streaming thread, so the current tid is that thread.
+        tid = threading.get_native_id() if hasattr(threading, "get_native_id") else None
+        if tid is None or not element_name:
+            return
+        with self._lock:
+            self._elements[tid] = element_name
+            t = self._threads.get(tid)
+            if t is None or t["name"] != element_name:
+                self._threads[tid] = {"name": element_name, "role": classify(element_name), "applied": False}
+        self.apply()
+
+    def _task_dir(self):
+        return os.path.join(self.root, "proc", str(self.pid), "task")
+
+    def _read_stat(self, tid):
+        try:
+            with open(os.path.join(self._task_dir(), str(tid), "stat"), "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        head, _, rest = raw.rpartition(b")")
+        fields = rest.split()
+        if len(fields) < 37:
+            return None
+        comm = head.partition(b"(")[2].decode("utf-8", "replace")
+        # utime + stime, and the CPU the thread last ran on
+        return comm, int(fields[11]) + int(fields[12]), int(fields[36])
+
+    def scan(self):
+        try:
+            tids = [int(t) for t in os.listdir(self._task_dir()) if t.isdigit()]
+        except OSError:
+            tids = []
+        py = self._python_threads()
+        seen = set()
+        with self._lock:
+            for tid in tids:
+                seen.add(tid)
+                name = self._elements.get(tid) or py.get(tid)
+                if name is None and tid == self.pid:
+                    name = "main"
+                t = self._threads.get(tid)
+                if name is None:
+                    if t is not None:
+                        continue
+                    st = self._read_stat(tid)
+                    name = st[0] if st else str(tid)
+                if t is None or t["name"] != name:
+                    self._threads[tid] = {"name": name, "role": classify(name), "applied": False}
+            for tid in list(self._threads):
+                if tid not in seen:
+                    del self._threads[tid]
+                    self._elements.pop(tid, None)
+                    self._ticks.pop(tid, None)
+                    self.cpu.pop(tid, None)
+        return len(seen)
+
+    def apply(self):
+        # Places threads that are new or changed role since the last call.
+        if not self.policy:
+            return 0
+        done = 0
+        with self._lock:
+            pending = [(tid, t) for tid, t in self._threads.items() if not t["applied"]]
+        for tid, t in pending:
+            cpus, nice = self.policy.get(t["role"], (None, None))
+            ok = True
+            if cpus and self._setaffinity is not None:
+                ok = self._try(self._setaffinity, tid, cpus) and ok
+            if nice is not None and self._setpriority is not None:
+                ok = self._try(self._setpriority, tid, nice) and ok
+            t["applied"] = True
+            if ok and (cpus or nice is not None):
+                done += 1
+        self.applied += done
+        return done
+
+    def _try(self, fn, tid, arg):
+        try:
+            fn(tid, arg)
+            return True
+        except (OSError, ValueError) as e:
+            # ESRCH for a thread that just exited, EPERM for negative nice
+            # without CAP_SYS_NICE, EINVAL for CPUs outside the cpuset.
+            self.errors += 1
+            self.last_error = "%s(%d): %s" % (getattr(fn, "__name__", "set"), tid, e)
+            return False
+
+    def sample(self):
+        now = self._clock()
+        dt = now - self._last_t if self._last_t is not None else None
+        self._last_t = now
+        last_cpu = {}
+        with self._lock:
+            tids = list(self._threads)
+        for tid in tids:
+            st = self._read_stat(tid)
+            if st is None:
+                continue
+            _, ticks, cpu = st
+            last_cpu[tid] = cpu
+            prev = self._ticks.get(tid)
+            self._ticks[tid] = ticks
+            if prev is not None and dt:
+                self.cpu[tid] = round((ticks - prev) * 100.0 / self.hz / dt, 1)
+        return last_cpu
+
+    def report(self):
+        self.scan()
+        self.apply()
+        last_cpu = self.sample()
+        roles, threads = {}, []
+        with self._lock:
+            items = sorted(self._threads.items())
+        for tid, t in items:
+            pct = self.cpu.get(tid, 0.0)
+            r = roles.get(t["role"])
+            if r is None:
+                cpus, nice = self.policy.get(t["role"], (None, None))
+                r = roles[t["role"]] = {"cpus": sorted(cpus) if cpus else None, "nice": nice,
+                                        "threads": 0, "cpu_pct": 0.0}
+            r["threads"] += 1
+            r["cpu_pct"] = round(r["cpu_pct"] + pct, 1)
+            threads.append({"tid": tid, "name": t["name"], "role": t["role"], "cpu_pct": pct,
+                            "on_cpu": last_cpu.get(tid)})
+        threads.sort(key=lambda x: -x["cpu_pct"])
+        return {"roles": roles, "threads": threads, "applied": self.applied, "errors": self.errors,
+                "last_error": self.last_error}
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# SQLite catalog of the files under a snapshot directory, so listings are an
+# indexed query instead of a readdir + stat of the whole tree.
+#
+# One row per file: (ts_ms, cam, kind, path relative to the root, size,
+# frame_id, detection count, per-class counts, snapshot reason). Kinds are
+# "clean", "osd", "meta", "clip", "media" and "jpg" (any other JPEG).
+# file_classes holds (file_id, class_id) for class-filtered queries. Listings
+# are newest first and paged by an opaque "<ts_ms>:<id>" cursor.
+#
+# The USB apps record each file as they write it. "rebuild" rescans a root
+# from disk (file name -> kind/ts, <base>_meta.json -> detections). A catalog
+# that has never been rebuilt is rebuilt when a writer opens it, so files
+# written before it existed are listed too; until then readers (list,
+# jetson-web) treat it as incomplete and fall back to the directory.
+#
+#   python3 snapshot_catalog.py --db /data/ds/datasets/autocap/catalog.sqlite3 list --kind osd --class 2 --limit 50
+#   python3 snapshot_catalog.py --db ... list --since 1700000000000 --cursor 1700000123456:812
+#   python3 snapshot_catalog.py --db ... rebuild /data/ds/datasets/autocap
+#
+# Only the standard library is used so the web server can shell out to it.
+
+DB_NAME = "catalog.sqlite3"
+VIDEO_EXTS = (".mp4", ".mkv", ".avi", ".mov", ".ts", ".h264", ".h265", ".webm")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts_ms INTEGER NOT NULL,
+    cam INTEGER NOT NULL DEFAULT 0,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL DEFAULT 0,
+    frame_id INTEGER,
+    n_dets INTEGER NOT NULL DEFAULT 0,
+    classes TEXT,
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS files_ts ON files (ts_ms, id);
+CREATE INDEX IF NOT EXISTS files_kind_ts ON files (kind, ts_ms, id);
+CREATE TABLE IF NOT EXISTS file_classes (
+    file_id INTEGER NOT NULL,
+    class_id INTEGER NOT NULL,
+    PRIMARY KEY (class_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS file_classes_file ON file_classes (file_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = ("id", "ts_ms", "cam", "kind", "path", "size", "frame_id", "n_dets", "classes", "reason")
+
+
+def default_db(root):
+    return os.getenv('DS_SNAPSHOT_CATALOG') or os.path.join(root, DB_NAME)
+
+
+def classify(name):
+    # (kind, base) from a file name, or None for files the catalog ignores.
+    low = name.lower()
+    for suffix, kind in (("_clean.jpg", "clean"), ("_osd.jpg", "osd"), ("_meta.json", "meta")):
+        if low.endswith(suffix):
+            return kind, name[:-len(suffix)]
+    if low.endswith(VIDEO_EXTS):
+        return ("clip" if low.startswith("clip_") else "media"), os.path.splitext(name)[0]
+    if low.endswith((".jpg", ".jpeg")):
+        return "jpg", os.path.splitext(name)[0]
+    return None
+
+
+def summarize(dets):
+    counts = {}
+    for d in dets or ():
+        c = d.get("class_id")
+        if c is not None:
+            counts[int(c)] = counts.get(int(c), 0) + 1
+    return counts
+
+
+def encode_cursor(row):
+    return "%d:%d" % (row["ts_ms"], row["id"])
+
+
+def decode_cursor(cursor):
+    ts, rid = str(cursor).split(":", 1)
+    return int(ts), int(rid)
+
+
+class SnapshotCatalog:
+    def __init__(self, db_path, root=None, scan=True):
+        self.db_path = db_path
+        self.root = root if root is not None else os.path.dirname(os.path.abspath(db_path))
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets the web server and sidecars read while the app writes.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        if scan and not self.complete():
+            self.rebuild()
+
+    def rebuilt_ms(self):
+        # Time of the last rebuild(), None if the catalog was never rebuilt.
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'rebuilt_ms'").fetchone()
+        return int(row[0]) if row else None
+
+    def complete(self):
+        # True once rebuild() has imported what was on disk.
+        return self.rebuilt_ms() is not None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def relpath(self, path):
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root)
+        return path.replace(os.sep, "/")
+
+    def _insert(self, rel, kind, ts_ms, cam, size, frame_id, dets, reason):
+        counts = summarize(dets)
+        self.conn.execute(
+            "INSERT INTO files (ts_ms, cam, kind, path, size, frame_id, n_dets, classes, reason) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET ts_ms=excluded.ts_ms, cam=excluded.cam, kind=excluded.kind, "
+            "size=excluded.size, frame_id=excluded.frame_id, n_dets=excluded.n_dets, "
+            "classes=excluded.classes, reason=excluded.reason",
+            (int(ts_ms), int(cam), kind, rel, int(size or 0), frame_id, len(dets or ()),
+             json.dumps(counts, sort_keys=True) if counts else None, reason))
+        # lastrowid is not reliable after the UPDATE branch of an upsert.
+        fid = self.conn.execute("SELECT id FROM files WHERE path = ?", (rel,)).fetchone()[0]
+        self.conn.execute("DELETE FROM file_classes WHERE file_id = ?", (fid,))
+        self.conn.executemany("INSERT INTO file_classes (file_id, class_id) VALUES (?, ?)",
+                              [(fid, c) for c in counts])
+        return fid
+
+    def add(self, path, kind, ts_ms, cam=0, size=None, frame_id=None, dets=None, reason=None):
+        rel = self.relpath(path)
+        if size is None:
+            try:
+                size = os.path.getsize(os.path.join(self.root, rel))
+            except OSError:
+                size = 0
+        with self._lock:
+            fid = self._insert(rel, kind, ts_ms, cam, size, frame_id, dets, reason)
+            self.conn.commit()
+        return fid
+
+    def remove(self, paths):
+        rels = [self.relpath(p) for p in paths]
+        with self._lock:
+            for i in range(0, len(rels), 500):
+                chunk = rels[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                self.conn.execute("DELETE FROM file_classes WHERE file_id IN "
+                                  "(SELECT id FROM files WHERE path IN (%s))" % marks, chunk)
+                self.conn.execute("DELETE FROM files WHERE path IN (%s)" % marks, chunk)
+            self.conn.commit()
+
+    def query(self, since_ms=None, until_ms=None, kinds=None, classes=None, cam=None,
+              limit=100, cursor=None):
+        # Newest first. Returns (rows, next_cursor); next_cursor is None on
+        # the last page.
+        where, args = [], []
+        if since_ms is not None:
+            where.append("ts_ms >= ?")
+            args.append(int(since_ms))
+        if until_ms is not None:
+            where.append("ts_ms <= ?")
+            args.append(int(until_ms))
+        if kinds:
+            where.append("kind IN (%s)" % ",".join("?" * len(kinds)))
+            args.extend(kinds)
+        if cam is not None:
+            where.append("cam = ?")
+            args.append(int(cam))
+        if classes:
+            where.append("id IN (SELECT file_id FROM file_classes WHERE class_id IN (%s))"
+                         % ",".join("?" * len(classes)))
+            args.extend(int(c) for c in classes)
+        if cursor:
+            ts, rid = decode_cursor(cursor)
+            where.append("(ts_ms < ? OR (ts_ms = ? AND id < ?))")
+            args.extend((ts, ts, rid))
+        limit = max(1, int(limit))
+        sql = "SELECT %s FROM files" % ", ".join(_COLUMNS)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts_ms DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = [dict(r) for r in self.conn.execute(sql, args + [limit + 1])]
+        nxt = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+        for r in rows:
+            r["classes"] = json.loads(r["classes"]) if r["classes"] else {}
+        return rows, nxt
+
+    def after(self, last_id, kinds=None, limit=1000):
+        # Rows added since last_id, oldest first (for tailing readers).
+        sql = "SELECT %s FROM files WHERE id > ?" % ", ".join(_COLUMNS)
+        args = [int(last_id)]
+        if kinds:
+            sql += " AND kind IN (%s)" % ",".join("?" * len(kinds))
+            args.extend(kinds)
+        sql += " ORDER BY id LIMIT ?"
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, args + [int(limit)])]
+
+    def max_id(self):
+        # Ids only grow (AUTOINCREMENT), also across rebuild(); tailing
+        # readers still restart when this drops below their cursor, which
+        # catalogs created before AUTOINCREMENT can do.
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0), MIN(ts_ms), MAX(ts_ms) "
+                                     "FROM files GROUP BY kind").fetchall()
+        return {k: {"files": n, "bytes": b, "first_ts_ms": lo, "last_ts_ms": hi} for k, n, b, lo, hi in rows}
+
+    def rebuild(self, max_depth=3):
+        # Replaces the catalog with what is on disk under root.
+        t0 = time.time()
+        found = []
+        self._scan(self.root, "", 0, max_depth, found)
+        metas = {}
+        for rel, kind, base, st in found:
+            if kind == "meta":
+                try:
+                    with open(os.path.join(self.root, rel), "r") as f:
+                        metas[base] = json.load(f)
+                except Exception:
+                    metas[base] = {}
+        with self._lock:
+            self.conn.execute("DELETE FROM file_classes")
+            self.conn.execute("DELETE FROM files")
+            for rel, kind, base, st in found:
+                name = base.rsplit("/", 1)[-1]
+                ts_ms = int(name) if name.isdigit() else int(st.st_mtime * 1000)
+                cam = _cam_of(rel)
+                meta = metas.get(base) or {}
+                self._insert(rel, kind, ts_ms, meta.get("cam", cam), st.st_size, meta.get("frame"),
+                             meta.get("detections"), meta.get("snapshot_reason"))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rebuilt_ms', ?)",
+                              (str(int(time.time() * 1000)),))
+            self.conn.commit()
+        return {"files": len(found), "seconds": round(time.time() - t0, 3)}
+
+    def _scan(self, path, rel, depth, max_depth, out):
+        try:
+            it = os.scandir(path)
+        except OSError:
+            return
+        with it:
+            for e in it:
+                r = rel + "/" + e.name if rel else e.name
+                if e.is_dir(follow_symlinks=False):
+                    if depth < max_depth:
+                        self._scan(e.path, r, depth + 1, max_depth, out)
+                    continue
+                c = classify(e.name)
+                if c is None:
+                    continue
+                kind, base = c
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                out.append((r, kind, (rel + "/" + base) if rel else base, st))
+
+
+def _cam_of(rel):
+    head = rel.split("/", 1)[0]
+    if "/" in rel and head.startswith("cam") and head[3:].isdigit():
+        return int(head[3:])
+    return 0
+
+
+def _csv(v):
+    return [x for x in (v or "").split(",") if x != ""]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="snapshot_catalog", description="Query or rebuild a snapshot catalog.")
+    parser.add_argument("--db", default=None, help="catalog file (default <root>/%s)" % DB_NAME)
+    parser.add_argument("--root", default=os.getenv('DS_SNAPSHOT_DIR', '/data/ds/datasets/autocap'))
+    sub = parser.add_subparsers(dest="cmd")
+    q = sub.add_parser("list", help="newest-first listing as JSON")
+    q.add_argument("--since", type=int, default=None, help="ts_ms lower bound")
+    q.add_argument("--until", type=int, default=None, help="ts_ms upper bound")
+    q.add_argument("--kind", default="", help="comma separated kinds (clean,osd,meta,clip,media,jpg)")
+    q.add_argument("--class", dest="classes", default="", help="comma separated class ids")
+    q.add_argument("--cam", type=int, default=None)
+    q.add_argument("--limit", type=int, default=100)
+    q.add_argument("--cursor", default=None)
+    r = sub.add_parser("rebuild", help="rescan the root directory")
+    r.add_argument("dir", nargs="?", default=None)
+    r.add_argument("--depth", type=int, default=3)
+    sub.add_parser("stats", help="files and bytes per kind")
+    args = parser.parse_args(argv)
+
+    root = getattr(args, "dir", None) or args.root
+    db = args.db or default_db(root)
+    if args.cmd != "rebuild" and not os.path.exists(db):
+        print(json.dumps({"error": "no catalog at %s" % db}))
+        return 2
+    cat = SnapshotCatalog(db, root, scan=False)
+    try:
+        if args.cmd != "rebuild" and not cat.complete():
+            # Never rebuilt: rows would miss the files already on disk.
+            print(json.dumps({"error": "catalog at %s is not complete yet" % db}))
+            return 3
+        if args.cmd == "rebuild":
+            out = cat.rebuild(args.depth)
+        elif args.cmd == "stats":
+            out = cat.stats()
+        else:
+            if args.cmd is None:
+                args = parser.parse_args(list(argv or sys.argv[1:]) + ["list"])
+            t0 = time.perf_counter()
+            rows, nxt = cat.query(args.since, args.until, _csv(args.kind), _csv(args.classes), args.cam,
+                                  args.limit, args.cursor)
+            out = {"files": rows, "next_cursor": nxt, "query_ms": round((time.perf_counter() - t0) * 1000, 2)}
+        print(json.dumps(out))
+    finally:
+        cat.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
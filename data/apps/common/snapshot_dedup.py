@@ -0,0 +1,226 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Perceptual-hash near-duplicate suppression for autocap snapshots.
+#
+#   dhash(gray)        64-bit difference hash: 9x8 area downscale, one bit per
+#                      horizontally adjacent pixel pair
+#   phash(gray)        64-bit DCT hash: 32x32 downscale, 8x8 low frequencies
+#                      (DC excluded) thresholded at their median
+#   BKTree             metric tree over Hamming distance; radius queries only
+#                      visit children whose edge distance is within d +- r
+#   HashIndex          bounded rolling index: a BK-tree plus an insertion-order
+#                      queue. Entries past max_size (or max_age_s) are evicted
+#                      lazily and the tree is rebuilt once half of it is dead.
+#   SnapshotDedup      per-camera indexes + JPEG decode at 1/8 scale; is_duplicate()
+#                      returns True when a recent snapshot is within max_dist bits
+#
+# Everything except SnapshotDedup.decode takes plain numpy arrays, so hashing
+# and the index can be exercised (and benchmarked) without OpenCV.
+
+
+def _area_resize(gray, h, w):
+    # Block-mean downscale; crops the remainder so every output pixel averages
+    # the same number of inputs. Inputs smaller than the target are repeated.
+    gray = np.asarray(gray, dtype=np.float32)
+    if gray.ndim == 3:
+        gray = gray.mean(axis=2)
+    H, W = gray.shape
+    if H < h or W < w:
+        gray = np.repeat(np.repeat(gray, -(-h // H), axis=0), -(-w // W), axis=1)
+        H, W = gray.shape
+    bh, bw = H // h, W // w
+    return gray[:bh * h, :bw * w].reshape(h, bh, w, bw).mean(axis=(1, 3))
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def dhash(gray, size=8):
+    small = _area_resize(gray, size, size + 1)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+_DCT = {}
+
+
+def _dct_matrix(n):
+    m = _DCT.get(n)
+    if m is None:
+        k = np.arange(n).reshape(-1, 1)
+        x = np.arange(n).reshape(1, -1)
+        m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        m[0] /= np.sqrt(2.0)
+        m = m.astype(np.float32)
+        _DCT[n] = m
+    return m
+
+
+def phash(gray, size=8, highfreq=4):
+    n = size * highfreq
+    small = _area_resize(gray, n, n)
+    d = _dct_matrix(n)
+    coeffs = (d @ small @ d.T)[:size, :size].ravel()[1:]
+    return _bits_to_int(coeffs > np.median(coeffs))
+
+
+HASHES = {"dhash": dhash, "phash": phash}
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    __slots__ = ("root", "size", "dead")
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+        self.dead = 0
+
+    def add(self, h):
+        # Returns the node for h; a repeated hash reuses its node.
+        node = self.root
+        if node is None:
+            self.root = [h, 1, {}]
+            self.size = 1
+            return self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                if node[1] == 0:
+                    self.dead -= 1
+                node[1] += 1
+                return node
+            child = node[2].get(d)
+            if child is None:
+                child = node[2][d] = [h, 1, {}]
+                self.size += 1
+                return child
+            node = child
+
+    def release(self, node):
+        node[1] -= 1
+        if node[1] == 0:
+            self.dead += 1
+
+    def nearest(self, h, radius):
+        # Closest live hash within radius as (distance, hash), or None.
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if node[1] > 0 and d <= radius and (best is None or d < best[0]):
+                best = (d, node[0])
+                if d == 0:
+                    break
+                radius = d
+            lo, hi = d - radius, d + radius
+            for k, child in node[2].items():
+                if lo <= k <= hi:
+                    stack.append(child)
+        return best
+
+
+class HashIndex:
+    def __init__(self, max_size=2048, max_age_s=0.0):
+        self.max_size = max(1, int(max_size))
+        self.max_age_s = float(max_age_s or 0.0)
+        self.tree = BKTree()
+        self.entries = collections.deque()  # (time, node)
+        self.evicted = 0
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def nearest(self, h, radius, now=None):
+        self._expire(time.time() if now is None else now)
+        return self.tree.nearest(h, radius)
+
+    def add(self, h, now=None):
+        now = time.time() if now is None else now
+        self.entries.append((now, self.tree.add(h)))
+        self._expire(now)
+
+    def _expire(self, now):
+        while self.entries and (len(self.entries) > self.max_size or
+                                (self.max_age_s and now - self.entries[0][0] > self.max_age_s)):
+            _, node = self.entries.popleft()
+            self.tree.release(node)
+            self.evicted += 1
+        if self.tree.dead > max(64, self.tree.size // 2):
+            self._rebuild()
+
+    def _rebuild(self):
+        tree = BKTree()
+        self.entries = collections.deque((t, tree.add(node[0])) for t, node in self.entries)
+        self.tree = tree
+        self.rebuilds += 1
+
+
+class SnapshotDedup:
+    def __init__(self, method="phash", max_dist=6, max_size=2048, max_age_s=0.0):
+        if method not in HASHES:
+            raise ValueError("unknown hash %r (use %s)" % (method, "/".join(sorted(HASHES))))
+        self.method = method
+        self.hash_fn = HASHES[method]
+        self.max_dist = int(max_dist)
+        self.max_size = max_size
+        self.max_age_s = max_age_s
+        self.indexes = {}
+        self.checked = 0
+        self.skipped = 0
+        self.errors = 0
+        self.hash_us = 0.0
+        self.last_dist = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def decode(jpeg):
+        # libjpeg decodes straight to 1/8 scale grayscale: ~240x135 for 1080p,
+        # far cheaper than a full decode and plenty for a 64-bit hash.
+        import cv2
+        return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+    def check_gray(self, cam, gray, now=None):
+        t0 = time.perf_counter()
+        h = self.hash_fn(gray)
+        with self._lock:
+            index = self.indexes.get(cam)
+            if index is None:
+                index = self.indexes[cam] = HashIndex(self.max_size, self.max_age_s)
+            hit = index.nearest(h, self.max_dist, now)
+            self.checked += 1
+            self.hash_us += (time.perf_counter() - t0) * 1e6
+            if hit is not None:
+                self.skipped += 1
+                self.last_dist = hit[0]
+                return True
+            index.add(h, now)
+            return False
+
+    def is_duplicate(self, cam, jpeg, now=None):
+        # Undecodable input is never treated as a duplicate.
+        try:
+            gray = self.decode(jpeg)
+        except Exception:
+            gray = None
+        if gray is None:
+            self.errors += 1
+            return False
+        return self.check_gray(cam, gray, now)
+
+    def stats(self):
+        with self._lock:
+            return {"method": self.method, "max_dist": self.max_dist, "checked": self.checked,
+                    "skipped": self.skipped, "kept": self.checked - self.skipped, "errors": self.errors,
+                    "indexed": sum(len(i) for i in self.indexes.values()),
+                    "evicted": sum(i.evicted for i in self.indexes.values()),
+                    "hash_us": round(self.hash_us / self.checked, 1) if self.checked else 0.0}
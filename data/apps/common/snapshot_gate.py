@@ -0,0 +1,59 @@
+import threading
+
+# Keeps JPEG snapshot branches closed with a pad-probe drop and opens each of
+# them for exactly one buffer when a snapshot is due. The BGR conversion and
+# jpegenc after a gate only run for frames that are actually saved.
+#
+#   gate = SnapshotGate(("clean", "osd"))
+#   gate.attach_trigger(Gst, upstream_pad, due_fn)  # due_fn(buf) -> bool, per frame
+#   gate.attach(Gst, conv_clean.get_static_pad("sink"), "clean")
+#   gate.attach(Gst, conv_osd.get_static_pad("sink"), "osd")
+#
+# The trigger pad must sit upstream of every gated pad (before the tee) so all
+# gated branches pass the same frame.
+
+
+class SnapshotGate:
+    def __init__(self, kinds):
+        self._lock = threading.Lock()
+        self._open = {k: False for k in kinds}
+        self.armed = 0
+        self.passed = 0
+        self.dropped = 0
+
+    def arm(self):
+        with self._lock:
+            for k in self._open:
+                self._open[k] = True
+            self.armed += 1
+
+    def take(self, kind):
+        with self._lock:
+            if self._open.get(kind):
+                self._open[kind] = False
+                self.passed += 1
+                return True
+            self.dropped += 1
+            return False
+
+    def attach_trigger(self, Gst, pad, due_fn, on_arm=None):
+        def _probe(pad, info, u):
+            try:
+                if due_fn(info.get_buffer()):
+                    self.arm()
+                    if on_arm is not None:
+                        on_arm()
+            except Exception:
+                pass
+            return Gst.PadProbeReturn.OK
+        pad.add_probe(Gst.PadProbeType.BUFFER, _probe, 0)
+
+    def attach(self, Gst, pad, kind, on_buffer=None):
+        def _probe(pad, info, u):
+            if on_buffer is not None:
+                try:
+                    on_buffer(kind)
+                except Exception:
+                    pass
+            return Gst.PadProbeReturn.OK if self.take(kind) else Gst.PadProbeReturn.DROP
+        pad.add_probe(Gst.PadProbeType.BUFFER, _probe, 0)
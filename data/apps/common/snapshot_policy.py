@@ -0,0 +1,202 @@
+import json
+import threading
+
+# Detection-driven snapshot policy: decides per frame whether a snapshot is
+# due, from the detections the probe builds ({"class_id", "confidence",
+# "object_id"?, ...}). Rules are OR-ed; limiters then veto.
+#
+# Spec (DS_SNAPSHOT_POLICY, /deepstream/snapshot/policy), comma separated or
+# the same keys as a JSON object:
+#   period=1000          every 1000 ms (the old DS_SNAPSHOT_PERIOD_MS)
+#   class=0|2            an object of class 0 or 2 is present
+#   count_change=2       object count changed by >= 2 since the last frame
+#   new_track            a tracker id not seen before
+#   conf=0.3-0.6         some detection's confidence is inside the band
+#   min_interval=500     never two snapshots closer than 500 ms (per camera)
+#   class_rate=2:5000|0:1000
+#                        class-triggered snapshots of class 2 at most every
+#                        5 s, class 0 every 1 s
+# Example: "period=10000,class=2,new_track,conf=0.3-0.5,min_interval=250"
+
+
+class PeriodRule:
+    name = "period"
+
+    def __init__(self, period_ms):
+        self.period_ms = max(0, int(period_ms))
+        self.last = {}
+
+    def evaluate(self, cam, dets, now_ms):
+        if self.period_ms <= 0:
+            return None
+        if now_ms - self.last.get(cam, 0) >= self.period_ms:
+            self.last[cam] = now_ms
+            return ("period", None)
+        return None
+
+
+class ClassPresentRule:
+    name = "class"
+
+    def __init__(self, classes):
+        self.classes = set(int(c) for c in classes)
+
+    def evaluate(self, cam, dets, now_ms):
+        for d in dets:
+            if d.get("class_id") in self.classes:
+                return ("class", d["class_id"])
+        return None
+
+
+class CountChangeRule:
+    name = "count_change"
+
+    def __init__(self, min_delta=1):
+        self.min_delta = max(1, int(min_delta))
+        self.last = {}
+
+    def evaluate(self, cam, dets, now_ms):
+        n = len(dets)
+        prev = self.last.get(cam)
+        self.last[cam] = n
+        if prev is not None and abs(n - prev) >= self.min_delta:
+            return ("count_change", None)
+        return None
+
+
+class NewTrackRule:
+    name = "new_track"
+    MAX_IDS = 4096
+
+    def __init__(self):
+        self.seen = {}
+
+    def evaluate(self, cam, dets, now_ms):
+        seen = self.seen.setdefault(cam, {})
+        hit = None
+        for d in dets:
+            oid = d.get("object_id")
+            if oid is None or oid in seen:
+                continue
+            seen[oid] = now_ms
+            if hit is None:
+                hit = ("new_track", d.get("class_id"))
+        if len(seen) > self.MAX_IDS:
+            for oid in sorted(seen, key=seen.get)[:len(seen) - self.MAX_IDS]:
+                del seen[oid]
+        return hit
+
+
+class ConfidenceBandRule:
+    name = "conf"
+
+    def __init__(self, lo, hi):
+        self.lo = float(lo)
+        self.hi = float(hi)
+
+    def evaluate(self, cam, dets, now_ms):
+        for d in dets:
+            c = d.get("confidence", -1.0)
+            if self.lo <= c <= self.hi:
+                return ("conf", d.get("class_id"))
+        return None
+
+
+def parse_spec(spec):
+    if isinstance(spec, dict):
+        return dict(spec)
+    spec = (spec or "").strip()
+    if spec.startswith("{"):
+        return json.loads(spec)
+    out = {}
+    for term in spec.split(","):
+        term = term.strip()
+        if not term:
+            continue
+        if "=" in term:
+            k, v = term.split("=", 1)
+            out[k.strip()] = v.strip()
+        else:
+            out[term] = True
+    return out
+
+
+def _split(v):
+    if isinstance(v, (list, tuple)):
+        return list(v)
+    return [x for x in str(v).replace("|", " ").split() if x]
+
+
+class SnapshotPolicy:
+    def __init__(self, spec="period=1000"):
+        self._lock = threading.Lock()
+        self.enabled = True
+        self.counts = {}
+        self.suppressed = 0
+        self.configure(spec)
+
+    def configure(self, spec):
+        cfg = parse_spec(spec)
+        rules = []
+        period = PeriodRule(cfg.get("period", 0) or 0)
+        rules.append(period)
+        if cfg.get("class") not in (None, False, ""):
+            rules.append(ClassPresentRule(_split(cfg["class"])))
+        if cfg.get("count_change") not in (None, False, ""):
+            rules.append(CountChangeRule(1 if cfg["count_change"] is True else cfg["count_change"]))
+        if cfg.get("new_track"):
+            rules.append(NewTrackRule())
+        if cfg.get("conf") not in (None, False, ""):
+            band = cfg["conf"]
+            lo, hi = band if isinstance(band, (list, tuple)) else str(band).split("-", 1)
+            rules.append(ConfidenceBandRule(lo, hi))
+        class_rate = {}
+        for item in _split(cfg.get("class_rate", "")):
+            cls, ms = str(item).split(":", 1)
+            class_rate[int(cls)] = int(ms)
+        with self._lock:
+            self.spec = cfg
+            self.period = period
+            self.rules = rules
+            self.min_interval_ms = int(cfg.get("min_interval", 0) or 0)
+            self.class_rate = class_rate
+            self.last_snap = {}
+            self.last_class = {}
+        return cfg
+
+    def set_period(self, ms):
+        with self._lock:
+            self.period.period_ms = max(0, int(ms))
+            self.spec["period"] = self.period.period_ms
+
+    def should_snap(self, cam, dets, now_ms):
+        # Returns the triggering reason ("period", "class:2", ...) or None.
+        if not self.enabled:
+            return None
+        with self._lock:
+            hit = None
+            for rule in self.rules:
+                # Every rule sees every frame so stateful rules stay current.
+                r = rule.evaluate(cam, dets, now_ms)
+                if r is not None and hit is None:
+                    hit = r
+            if hit is None:
+                return None
+            kind, cls = hit
+            if self.min_interval_ms and now_ms - self.last_snap.get(cam, -1e18) < self.min_interval_ms:
+                self.suppressed += 1
+                return None
+            if cls is not None and cls in self.class_rate:
+                key = (cam, cls)
+                if now_ms - self.last_class.get(key, -1e18) < self.class_rate[cls]:
+                    self.suppressed += 1
+                    return None
+                self.last_class[key] = now_ms
+            self.last_snap[cam] = now_ms
+            reason = kind if cls is None else "%s:%d" % (kind, cls)
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            return reason
+
+    def stats(self):
+        with self._lock:
+            return {"spec": dict(self.spec), "snapshots": dict(self.counts), "suppressed": self.suppressed}
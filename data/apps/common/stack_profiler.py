@@ -0,0 +1,153 @@
+import os
+import sys
+import threading
+import time
+
+# Low-frequency sampling profiler for the whole process.
+#
+# While running, a daemon thread wakes every interval_s, takes
+# sys._current_frames() and adds one count to the collapsed stack of every
+# other thread ("thread;outer (file:line);...;inner (file:line)"). The
+# result is Brendan Gregg's folded format, so dump() output goes straight
+# into flamegraph.pl or speedscope. Pad probes and appsink callbacks run on
+# GStreamer streaming threads, which are labelled "thread-<ident>" unless
+# Python knows their name; the probe function is the root frame either way.
+#
+# Overhead: nothing at all while stopped (no thread, no hooks). While
+# running, the sampler measures its own CPU time and stretches the
+# interval so it stays under max_overhead of one core. At most max_stacks
+# distinct stacks are kept; further new stacks are counted as "[dropped]".
+#
+#   prof = StackProfiler(interval_s=0.02)
+#   prof.start()                    # SIGUSR2 or a control message
+#   prof.stop(); prof.dump(path)    # folded stacks, one "stack count" per line
+
+DROPPED = "[dropped]"
+
+
+def _label(code):
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackProfiler:
+    def __init__(self, interval_s=0.02, max_depth=64, max_stacks=20000, max_overhead=0.01,
+                 out_dir="/tmp", clock=time.monotonic):
+        self.interval_s = float(interval_s)
+        self.max_depth = int(max_depth)
+        self.max_stacks = int(max_stacks)
+        self.max_overhead = float(max_overhead)
+        self.out_dir = out_dir
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._labels = {}      # code -> label, so a frame is formatted once
+        self.stacks = {}
+        self.samples = 0
+        self.dropped = 0
+        self.cpu_s = 0.0
+        self.wall_s = 0.0
+        self.started = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_s=None):
+        if interval_s is not None:
+            self.interval_s = float(interval_s)
+        if self.running():
+            return False
+        self._stop.clear()
+        self.started = self._clock()
+        self._thread = threading.Thread(target=self._run, name="stack-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running():
+            return False
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        return True
+
+    def toggle(self):
+        # Returns the path written when this call stopped the profiler.
+        if self.running():
+            self.stop()
+            return self.dump()
+        self.start()
+        return None
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.samples = self.dropped = 0
+            self.cpu_s = self.wall_s = 0.0
+
+    def _run(self):
+        me = threading.get_ident()
+        wait = self.interval_s
+        while not self._stop.wait(wait):
+            t0 = self._clock()
+            c0 = time.thread_time()
+            self.sample(skip=me)
+            cost = time.thread_time() - c0
+            with self._lock:
+                self.cpu_s += cost
+            # Keep cost / (cost + wait) <= max_overhead.
+            wait = max(self.interval_s, cost / self.max_overhead - cost) if self.max_overhead > 0 else self.interval_s
+            with self._lock:
+                self.wall_s += self._clock() - t0 + wait
+
+    def sample(self, skip=None):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        labels = self._labels
+        folded = []
+        for ident, frame in frames.items():
+            if ident == skip:
+                continue
+            parts = []
+            while frame is not None and len(parts) < self.max_depth:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _label(code)
+                parts.append(label)
+                frame = frame.f_back
+            parts.append(names.get(ident) or "thread-%d" % ident)
+            parts.reverse()
+            folded.append(";".join(parts))
+        del frames
+        with self._lock:
+            for key in folded:
+                n = self.stacks.get(key)
+                if n is None and len(self.stacks) >= self.max_stacks:
+                    key, n = DROPPED, self.stacks.get(DROPPED, 0)
+                    self.dropped += 1
+                self.stacks[key] = (n or 0) + 1
+            self.samples += 1
+
+    def folded(self):
+        with self._lock:
+            items = sorted(self.stacks.items(), key=lambda kv: -kv[1])
+        return "".join("%s %d\n" % kv for kv in items)
+
+    def dump(self, path=None):
+        if path is None:
+            path = os.path.join(self.out_dir, "ds_profile_%d_%d.folded" % (os.getpid(), int(time.time())))
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.folded())
+        os.replace(tmp, path)
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {"running": self.running(), "interval_s": self.interval_s, "samples": self.samples,
+                    "stacks": len(self.stacks), "dropped": self.dropped,
+                    "overhead_pct": round(self.cpu_s * 100.0 / self.wall_s, 2) if self.wall_s else 0.0}
@@ -0,0 +1,193 @@
+import ast
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# Runs pipeline workers as child processes and keeps them running.
+#
+#   sup = Supervisor([Worker("publisher", [...]), Worker("w0", [...], env={...}, cpus={2, 3})])
+#   sup.run()        # until SIGINT/SIGTERM; stats every report_s
+#
+# A worker that exits is started again after a backoff that doubles from
+# backoff_min_s up to backoff_max_s, and resets once it has run for
+# stable_s. The output of every worker is copied line by line to our stdout
+# unchanged, so anything that reads the app log keeps working. "**PERF:"
+# lines are also parsed for the worker's per-stream FPS. Workers with `cpus`
+# are pinned with sched_setaffinity right after they start.
+#
+# stop() sends SIGTERM to every worker (publisher last) and SIGKILL to
+# whatever is still alive after kill_after_s.
+
+
+class Worker:
+    def __init__(self, name, argv, env=None, cpus=None, last=False):
+        self.name = name
+        self.argv = list(argv)
+        self.env = dict(env or {})
+        self.cpus = set(cpus) if cpus else None
+        self.last = last          # stopped after the others (the publisher)
+        self.proc = None
+        self.started = None
+        self.restarts = 0
+        self.exit_code = None
+        self.backoff = 0.0
+        self.next_start = 0.0
+        self.fps = {}
+        self.fps_at = None
+        self._reader = None
+
+    def state(self):
+        if self.proc is not None and self.proc.poll() is None:
+            return "running"
+        return "backoff" if self.started is not None else "new"
+
+
+def parse_perf(line):
+    # "**PERF:  {'stream0': {'fps': 29.9, ...}}" -> {"stream0": 29.9}
+    try:
+        d = ast.literal_eval(line.split("**PERF:", 1)[1].strip())
+    except (ValueError, SyntaxError, IndexError):
+        return None
+    if not isinstance(d, dict):
+        return None
+    return {k: (v.get("fps") if isinstance(v, dict) else v) for k, v in d.items()}
+
+
+class Supervisor:
+    def __init__(self, workers, backoff_min_s=1.0, backoff_max_s=60.0, stable_s=30.0,
+                 report_s=10.0, kill_after_s=5.0, out=None, clock=time.monotonic):
+        self.workers = list(workers)
+        self.backoff_min_s = float(backoff_min_s)
+        self.backoff_max_s = float(backoff_max_s)
+        self.stable_s = float(stable_s)
+        self.report_s = float(report_s)
+        self.kill_after_s = float(kill_after_s)
+        self.out = out or sys.stdout
+        self._clock = clock
+        self._out_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _emit(self, line):
+        with self._out_lock:
+            try:
+                self.out.write(line)
+                self.out.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _pump(self, w, proc):
+        for raw in iter(proc.stdout.readline, b""):
+            line = raw.decode("utf-8", "replace")
+            if "**PERF:" in line:
+                fps = parse_perf(line)
+                if fps is not None:
+                    w.fps = fps
+                    w.fps_at = self._clock()
+            self._emit(line)
+        proc.stdout.close()
+
+    def start(self, w):
+        env = dict(os.environ)
+        env.update(w.env)
+        env.setdefault("PYTHONUNBUFFERED", "1")
+        try:
+            proc = subprocess.Popen(w.argv, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            self._emit("SUPERVISOR start %s failed: %s\n" % (w.name, e))
+            w.proc = None
+            w.started = self._clock()
+            self._schedule(w)
+            return False
+        if w.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(proc.pid, w.cpus)
+            except OSError as e:
+                self._emit("SUPERVISOR affinity %s %s: %s\n" % (w.name, sorted(w.cpus), e))
+        w.proc = proc
+        w.started = self._clock()
+        w.exit_code = None
+        w.fps = {}
+        w._reader = threading.Thread(target=self._pump, args=(w, proc), name="out-" + w.name, daemon=True)
+        w._reader.start()
+        return True
+
+    def _schedule(self, w):
+        now = self._clock()
+        if w.started is not None and now - w.started >= self.stable_s:
+            w.backoff = 0.0
+        w.backoff = min(self.backoff_max_s, max(self.backoff_min_s, w.backoff * 2))
+        w.next_start = now + w.backoff
+
+    def poll(self):
+        # One supervision pass; returns the workers that were (re)started.
+        started = []
+        now = self._clock()
+        for w in self.workers:
+            if w.proc is None:
+                if w.started is None or now >= w.next_start:
+                    if w.started is not None:
+                        w.restarts += 1
+                    if self.start(w):
+                        started.append(w)
+                continue
+            code = w.proc.poll()
+            if code is None:
+                continue
+            w.exit_code = code
+            w.proc = None
+            w.fps = {}
+            self._schedule(w)
+            self._emit("SUPERVISOR %s exited with %s, restart in %.1fs\n" % (w.name, code, w.backoff))
+        return started
+
+    def stats(self):
+        now = self._clock()
+        out = {}
+        for w in self.workers:
+            alive = w.proc is not None and w.proc.poll() is None
+            out[w.name] = {"state": w.state(), "pid": w.proc.pid if alive else None,
+                           "uptime_s": round(now - w.started, 1) if alive else 0,
+                           "restarts": w.restarts, "exit_code": w.exit_code,
+                           "fps": w.fps, "cpus": sorted(w.cpus) if w.cpus else None}
+        return out
+
+    def run(self, tick_s=0.5):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, lambda *_: self._stop.set())
+            except ValueError:
+                pass
+        last = self._clock()
+        try:
+            while not self._stop.is_set():
+                self.poll()
+                now = self._clock()
+                if self.report_s > 0 and now - last >= self.report_s:
+                    self._emit("SUPERVISOR %s\n" % __import__("json").dumps(self.stats()))
+                    last = now
+                self._stop.wait(tick_s)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        for group in ([w for w in self.workers if not w.last], [w for w in self.workers if w.last]):
+            live = [w for w in group if w.proc is not None and w.proc.poll() is None]
+            for w in live:
+                try:
+                    w.proc.terminate()
+                except OSError:
+                    pass
+            deadline = self._clock() + self.kill_after_s
+            for w in live:
+                try:
+                    w.proc.wait(timeout=max(0.0, deadline - self._clock()))
+                except subprocess.TimeoutExpired:
+                    w.proc.kill()
+                    w.proc.wait()
+            for w in group:
+                if w._reader is not None:
+                    w._reader.join(timeout=1.0)
@@ -0,0 +1,115 @@
+import random
+
+from common import fake_pyds as pyds
+
+# Scene generators for fake_pyds. A scene is a reproducible stream of
+# (buffer, batch_meta) pairs shaped like what nvstreammux/nvinfer/nvtracker/
+# nvdsanalytics would attach, so probes can be driven without a GPU.
+
+DEFAULT_CLASSES = (0, 1, 2, 3)
+
+
+class SceneConfig:
+    def __init__(self, streams=1, objects=8, classes=DEFAULT_CLASSES, width=1920, height=1080,
+                 analytics=False, segmentation=None, preprocess_rois=0, past_frames=0,
+                 tracked=True, seed=1234):
+        self.streams = max(1, int(streams))
+        self.objects = max(0, int(objects))
+        self.classes = tuple(classes)
+        self.width = int(width)
+        self.height = int(height)
+        self.analytics = bool(analytics)
+        self.segmentation = segmentation
+        self.preprocess_rois = int(preprocess_rois)
+        self.past_frames = int(past_frames)
+        self.tracked = bool(tracked)
+        self.seed = seed
+
+
+def _rect(rng, width, height):
+    w = rng.uniform(16, width / 4)
+    h = rng.uniform(16, height / 4)
+    return pyds.NvOSD_RectParams(rng.uniform(0, width - w), rng.uniform(0, height - h), w, h)
+
+
+def _analytics_obj_meta(rng):
+    info = pyds.NvDsAnalyticsObjInfo(
+        roiStatus=["RF"] if rng.random() < 0.5 else [],
+        lcStatus=["Exit"] if rng.random() < 0.1 else [],
+        dirStatus="DIR:North" if rng.random() < 0.2 else "",
+    )
+    return pyds.NvDsUserMeta(pyds.NvDsMetaType.NVDS_OBJ_META_NVDSANALYTICS, info)
+
+
+def _analytics_frame_meta(rng, objects):
+    info = pyds.NvDsAnalyticsFrameMeta(
+        objInROIcnt={"RF": objects // 2},
+        objLCCumCnt={"Exit": rng.randint(0, 100)},
+        objLCCurrCnt={"Exit": rng.randint(0, 2)},
+        ocStatus={"OC": objects > 10},
+    )
+    return pyds.NvDsUserMeta(pyds.NvDsMetaType.NVDS_FRAME_META_NVDSANALYTICS, info)
+
+
+def _segmentation_meta(shape, classes):
+    h, w = shape
+    try:
+        import numpy as np
+        class_map = (np.arange(h * w, dtype=np.int32).reshape(h, w) % classes)
+    except Exception:
+        class_map = [[(y * w + x) % classes for x in range(w)] for y in range(h)]
+    seg = pyds.NvDsInferSegmentationMeta(w, h, classes, class_map)
+    return pyds.NvDsUserMeta(pyds.NVDSINFER_SEGMENTATION_META, seg)
+
+
+def make_batch(cfg, frame_num, rng, track_base=0):
+    frames = []
+    for pad in range(cfg.streams):
+        objects = []
+        for i in range(cfg.objects):
+            class_id = cfg.classes[rng.randrange(len(cfg.classes))] if cfg.classes else 0
+            object_id = (track_base + pad * 10000 + i) if cfg.tracked else 0xffffffffffffffff
+            user_meta = [_analytics_obj_meta(rng)] if cfg.analytics else None
+            objects.append(pyds.NvDsObjectMeta(class_id, object_id, rng.uniform(0.2, 0.99),
+                                               _rect(rng, cfg.width, cfg.height), user_meta=user_meta))
+        frame_user = []
+        if cfg.analytics:
+            frame_user.append(_analytics_frame_meta(rng, cfg.objects))
+        if cfg.segmentation:
+            frame_user.append(_segmentation_meta(cfg.segmentation, max(2, len(cfg.classes))))
+        frames.append(pyds.NvDsFrameMeta(frame_num, pad, pad, cfg.width, cfg.height,
+                                         objects, frame_user))
+    batch_user = []
+    if cfg.preprocess_rois:
+        rois = [pyds.NvDsRoiMeta(_rect(rng, cfg.width, cfg.height), frames[i % len(frames)])
+                for i in range(cfg.preprocess_rois)]
+        batch_user.append(pyds.NvDsUserMeta(pyds.NVDS_PREPROCESS_BATCH_META,
+                                            pyds.GstNvDsPreProcessBatchMeta(rois)))
+    if cfg.past_frames:
+        streams = []
+        for pad in range(cfg.streams):
+            objs = []
+            for i in range(cfg.objects):
+                past = [pyds.NvDsTargetMiscDataFrame(frame_num - k - 1, _rect(rng, cfg.width, cfg.height),
+                                                     rng.uniform(0.2, 0.99), k + 1)
+                        for k in range(cfg.past_frames)]
+                objs.append(pyds.NvDsTargetMiscDataObject(track_base + pad * 10000 + i, 0, "", past))
+            streams.append(pyds.NvDsTargetMiscDataStream(pad, objs))
+        batch_user.append(pyds.NvDsUserMeta(pyds.NvDsMetaType.NVDS_TRACKER_PAST_FRAME_META,
+                                            pyds.NvDsTargetMiscDataBatch(streams)))
+    return pyds.NvDsBatchMeta(frames, batch_user)
+
+
+def generate(cfg, batches):
+    # Yields (probe_info, batch_meta) with the batch already attached to a
+    # fresh fake buffer; callers release it with fake_pyds.release_batch_meta.
+    rng = random.Random(cfg.seed)
+    for n in range(int(batches)):
+        batch_meta = make_batch(cfg, n, rng, track_base=(n // 90) * cfg.objects)
+        buf = pyds.FakeBuffer(pts=n * 33333333)
+        pyds.attach_batch_meta(buf, batch_meta)
+        yield pyds.FakeProbeInfo(buf), batch_meta
+
+
+def pregenerate(cfg, batches):
+    return list(generate(cfg, batches))
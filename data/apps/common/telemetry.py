@@ -0,0 +1,229 @@
+import glob
+import os
+import threading
+import time
+
+# System telemetry for the MQTT heartbeat.
+#
+# TelemetrySampler reads, for one process:
+#   t.<thread>    CPU % of each thread since the previous sample (utime+stime
+#                 from /proc/<pid>/task/<tid>/stat; threads with the same name
+#                 are summed). Python threads are labelled with their
+#                 threading name, the main thread (GLib loop) as "main", and
+#                 native threads (GStreamer streaming threads, paho) with
+#                 their comm.
+#   rss_mb        resident set size (/proc/<pid>/statm)
+#   tz.<type>     thermal zones in degrees C (/sys/class/thermal)
+#   cpu<n>_mhz    current CPU frequencies (cpufreq scaling_cur_freq)
+#   gpu_mhz       GPU frequency (devfreq devices named gpu/gv11b/ga10b)
+#   q.<name>      registered gauges, e.g. pipeline queue depths
+#   cost_pct      CPU spent in sample() as % of one core
+#
+# Files are discovered once (threads again every rescan_s) and kept open;
+# each sample is one pread per file, so a 1 s interval costs well under 1%
+# of a core. delta() returns only the values that moved by more than their
+# threshold since the last delta(), removed keys as None, and a full set
+# every full_every calls so a late subscriber can rebuild the state.
+#
+#   tm = TelemetrySampler(root="/")      # root="/tmp/fake" for a fake tree
+#   tm.gauge("q_demux", lambda: q.get_property("current-level-buffers"))
+#   tm.sample()                          # at DS_TELEMETRY_INTERVAL_S
+#   hb["telemetry"] = tm.delta()         # {"seq": n, "full": bool, "v": {...}}
+
+GPU_DEVFREQ = ("gpu", "gv11b", "ga10b", "gp10b")
+THRESHOLDS = (("t.", 1.0), ("tz.", 0.5), ("rss_mb", 1.0), ("cost_pct", 0.05))
+
+
+def _threshold(key):
+    for prefix, th in THRESHOLDS:
+        if key.startswith(prefix):
+            return th
+    return 0
+
+
+class TelemetrySampler:
+    def __init__(self, root="/", pid=None, rescan_s=10.0, full_every=30, clock=time.monotonic):
+        self.root = root
+        self.pid = os.getpid() if pid is None else int(pid)
+        self.rescan_s = float(rescan_s)
+        self.full_every = max(1, int(full_every))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._fds = {}        # path -> fd
+        self._gauges = {}
+        self._threads = {}    # tid -> label
+        self._ticks = {}      # tid -> utime+stime at the previous sample
+        self._last_t = None
+        self._last_scan = None
+        self._cost = 0.0
+        self._cost_t = None
+        self.values = {}
+        self._sent = {}
+        self.seq = 0
+        self.samples = 0
+        self.errors = 0
+        self.hz = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.page_mb = (os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096) / float(1 << 20)
+        self._sysfs = self._discover()
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _discover(self):
+        # (key, path, scale) for every sysfs value worth reading.
+        found = []
+        for zone in sorted(glob.glob(self._path("sys/class/thermal/thermal_zone*"))):
+            name = self._read_text(os.path.join(zone, "type")) or os.path.basename(zone)
+            found.append(("tz." + name.strip(), os.path.join(zone, "temp"), 0.001))
+        for f in glob.glob(self._path("sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq")):
+            cpu = f.split(os.sep)[-3]
+            found.append((cpu + "_mhz", f, 0.001))
+        gpus = [d for d in sorted(glob.glob(self._path("sys/class/devfreq/*")))
+                if any(g in os.path.basename(d) for g in GPU_DEVFREQ)]
+        for i, d in enumerate(gpus):
+            found.append(("gpu_mhz" if i == 0 else "gpu%d_mhz" % i, os.path.join(d, "cur_freq"), 1e-6))
+        found.sort(key=lambda e: (len(e[0]), e[0]))
+        return found
+
+    def _read_text(self, path):
+        try:
+            with open(path, "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _pread(self, path):
+        fd = self._fds.get(path)
+        try:
+            if fd is None:
+                fd = self._fds[path] = os.open(path, os.O_RDONLY)
+            return os.pread(fd, 4096, 0)
+        except OSError:
+            self._close(path)
+            return None
+
+    def _close(self, path):
+        fd = self._fds.pop(path, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def gauge(self, name, fn):
+        # fn() -> number, called from the sampling thread.
+        self._gauges["q." + name] = fn
+
+    def _scan_threads(self):
+        task = self._path("proc", str(self.pid), "task")
+        try:
+            tids = set(int(t) for t in os.listdir(task) if t.isdigit())
+        except OSError:
+            tids = set()
+        py = {}
+        for t in threading.enumerate():
+            native = getattr(t, "native_id", None)
+            if native is not None:
+                py[native] = "main" if t is threading.main_thread() else t.name
+        for tid in list(self._threads):
+            if tid not in tids:
+                del self._threads[tid]
+                self._ticks.pop(tid, None)
+                self._close(os.path.join(task, str(tid), "stat"))
+        for tid in tids:
+            self._threads[tid] = py.get(tid) or ("main" if tid == self.pid else None)
+
+    def _thread_cpu(self, now, out):
+        task = self._path("proc", str(self.pid), "task")
+        dt = now - self._last_t if self._last_t is not None else None
+        for tid, label in list(self._threads.items()):
+            raw = self._pread(os.path.join(task, str(tid), "stat"))
+            if not raw:
+                continue
+            # comm may contain spaces and parentheses; fields follow the last ')'.
+            head, _, rest = raw.rpartition(b")")
+            fields = rest.split()
+            if len(fields) < 13:
+                continue
+            if label is None:
+                label = head.partition(b"(")[2].decode("utf-8", "replace") or str(tid)
+                self._threads[tid] = label
+            ticks = int(fields[11]) + int(fields[12])
+            prev = self._ticks.get(tid)
+            self._ticks[tid] = ticks
+            if prev is None or not dt:
+                continue
+            key = "t." + label
+            out[key] = out.get(key, 0.0) + (ticks - prev) * 100.0 / self.hz / dt
+
+    def sample(self):
+        c0 = time.thread_time()
+        now = self._clock()
+        out = {}
+        with self._lock:
+            if self._last_scan is None or now - self._last_scan >= self.rescan_s:
+                self._scan_threads()
+                self._last_scan = now
+            self._thread_cpu(now, out)
+            self._last_t = now
+            raw = self._pread(self._path("proc", str(self.pid), "statm"))
+            if raw:
+                out["rss_mb"] = int(raw.split()[1]) * self.page_mb
+            for key, path, scale in self._sysfs:
+                raw = self._pread(path)
+                try:
+                    out[key] = int(raw) * scale
+                except (TypeError, ValueError):
+                    pass
+            for key, fn in list(self._gauges.items()):
+                try:
+                    out[key] = fn()
+                except Exception:
+                    self.errors += 1
+            for k, v in out.items():
+                if isinstance(v, float):
+                    out[k] = round(v, 1)
+            self._cost += time.thread_time() - c0
+            if self._cost_t is None:
+                self._cost_t = now
+            elif now > self._cost_t:
+                out["cost_pct"] = round(self._cost * 100.0 / (now - self._cost_t), 2)
+            self.values = out
+            self.samples += 1
+        return out
+
+    def delta(self):
+        with self._lock:
+            self.seq += 1
+            full = self.seq % self.full_every == 1 or self.full_every == 1
+            if full:
+                changed = dict(self.values)
+            else:
+                changed = {}
+                for k, v in self.values.items():
+                    old = self._sent.get(k)
+                    th = _threshold(k)
+                    if old is None or (abs(v - old) > th if th else v != old):
+                        changed[k] = v
+                for k in self._sent:
+                    if k not in self.values:
+                        changed[k] = None
+            if full:
+                self._sent = dict(self.values)
+            else:
+                for k, v in changed.items():
+                    if v is None:
+                        self._sent.pop(k, None)
+                    else:
+                        self._sent[k] = v
+            return {"seq": self.seq, "full": full, "v": changed}
+
+    def close(self):
+        with self._lock:
+            for path in list(self._fds):
+                self._close(path)
+
+    def stats(self):
+        with self._lock:
+            return {"samples": self.samples, "threads": len(self._threads), "sysfs": len(self._sysfs),
+                    "gauges": len(self._gauges), "errors": self.errors}
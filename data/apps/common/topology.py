@@ -0,0 +1,169 @@
+# Pipeline topology planner for the USB/ROS app.
+#
+# Computes the logical element graph for a set of enabled features
+# (display, caption/snapshot, msgbroker, clip recording, inference) before
+# any GStreamer element is created, then prunes it:
+#   - branches whose feature is off are never added;
+#   - a tee with a single consumer is removed and its upstream linked
+#     straight to that consumer (the consumer's tee-decoupling queue goes too);
+#   - a tee with no consumer collapses into a fakesink so the stream still ends.
+# Pure Python: builders walk plan.nodes / plan.edges, and plan.describe() is
+# what gets printed at startup.
+
+
+def node_name(base, index):
+    # Camera 0 keeps the historical element names.
+    return base if index == 0 else "%s_%d" % (base, index)
+
+
+class Plan:
+    def __init__(self):
+        self.nodes = {}   # name -> factory
+        self.order = []
+        self.edges = []   # (src, dst)
+        self.tee_queues = set()
+        self.features = {}
+
+    def add(self, name, factory, tee_queue=False):
+        if name not in self.nodes:
+            self.nodes[name] = factory
+            self.order.append(name)
+        if tee_queue:
+            self.tee_queues.add(name)
+        return name
+
+    def chain(self, *names):
+        for a, b in zip(names, names[1:]):
+            self.edges.append((a, b))
+
+    def has(self, name):
+        return name in self.nodes
+
+    def consumers(self, name):
+        return [b for a, b in self.edges if a == name]
+
+    def producers(self, name):
+        return [a for a, b in self.edges if b == name]
+
+    def is_tee(self, name):
+        return self.nodes.get(name) == "tee"
+
+    def _remove(self, name):
+        self.nodes.pop(name, None)
+        self.order.remove(name)
+        self.tee_queues.discard(name)
+        self.edges = [(a, b) for a, b in self.edges if a != name and b != name]
+
+    def prune(self):
+        changed = True
+        while changed:
+            changed = False
+            for name in list(self.order):
+                if not self.is_tee(name):
+                    continue
+                outs = self.consumers(name)
+                ins = self.producers(name)
+                if not outs:
+                    sink = self.add(name.replace("tee", "fakesink", 1) if "tee" in name else name + "_fakesink", "fakesink")
+                    self.chain(name, sink)
+                    outs = [sink]
+                if len(outs) > 1:
+                    continue
+                target = outs[0]
+                if target in self.tee_queues:
+                    nxt = self.consumers(target)
+                    self._remove(target)
+                    target = nxt[0] if nxt else None
+                self._remove(name)
+                if target is not None:
+                    for a in ins:
+                        self.edges.append((a, target))
+                changed = True
+                break
+        return self
+
+    def describe(self):
+        feats = " ".join("%s=%s" % (k, v) for k, v in self.features.items())
+        lines = ["Pipeline plan (%s): %d elements" % (feats, len(self.nodes))]
+        for name in self.order:
+            outs = self.consumers(name)
+            if outs:
+                lines.append("  %s [%s] -> %s" % (name, self.nodes[name], ", ".join(outs)))
+            elif not self.producers(name):
+                lines.append("  %s [%s]" % (name, self.nodes[name]))
+        return "\n".join(lines)
+
+
+def _post_branch(plan, i, display, caption, msg, clip=False):
+    n = lambda base: node_name(base, i)
+    plan.add(n("convertor"), "nvvideoconvert")
+    plan.add(n("caps_rgba"), "capsfilter")
+    plan.add(n("tee_presave"), "tee")
+    plan.add(n("q_pre_osd"), "queue", tee_queue=True)
+    plan.add(n("onscreendisplay"), "nvdsosd")
+    plan.add(n("tee_postosd"), "tee")
+    plan.chain(n("convertor"), n("caps_rgba"), n("tee_presave"), n("q_pre_osd"), n("onscreendisplay"), n("tee_postosd"))
+    if caption:
+        for kind in ("clean", "osd"):
+            plan.add(n("conv_" + kind), "nvvideoconvert")
+            plan.add(n("caps_" + kind), "capsfilter")
+            plan.add(n("enc_" + kind), "jpegenc")
+            plan.add(n("sink_" + kind), "appsink")
+        plan.chain(n("tee_presave"), n("conv_clean"), n("caps_clean"), n("enc_clean"), n("sink_clean"))
+        plan.chain(n("tee_postosd"), n("conv_osd"), n("caps_osd"), n("enc_osd"), n("sink_osd"))
+    if display:
+        plan.add(n("q_post_display"), "queue", tee_queue=True)
+        plan.add(n("display_sink"), "display")
+        plan.chain(n("tee_postosd"), n("q_post_display"), n("display_sink"))
+    if clip:
+        plan.add(n("q_clip"), "queue", tee_queue=True)
+        plan.add(n("conv_clip"), "nvvideoconvert")
+        plan.add(n("caps_clip"), "capsfilter")
+        plan.add(n("enc_clip"), "nvv4l2h264enc")
+        plan.add(n("parse_clip"), "h264parse")
+        plan.add(n("caps_h264"), "capsfilter")
+        plan.add(n("sink_clip"), "appsink")
+        plan.chain(n("tee_postosd"), n("q_clip"), n("conv_clip"), n("caps_clip"), n("enc_clip"),
+                   n("parse_clip"), n("caps_h264"), n("sink_clip"))
+    if msg:
+        _msg_branch(plan, n("tee_postosd"))
+
+
+def _msg_branch(plan, tee):
+    plan.add("q_post_msg", "queue", tee_queue=True)
+    plan.add("nvmsg-converter", "nvmsgconv")
+    plan.add("nvmsg-broker", "nvmsgbroker")
+    plan.chain(tee, "q_post_msg", "nvmsg-converter", "nvmsg-broker")
+
+
+def plan_pipeline(num_cams=1, inference=True, display=True, caption=False, msgbroker=False,
+                  display_cam=0, clip=False, prune=True):
+    plan = Plan()
+    plan.features = {"cams": num_cams, "infer": inference, "display": display,
+                     "caption": caption, "msg": msgbroker, "clip": clip}
+    plan.add("Stream-muxer", "nvstreammux")
+    for i in range(num_cams):
+        src = plan.add(node_name("usb-cam-source", i), "v4l2src")
+        plan.chain(src, "Stream-muxer")
+    head = "Stream-muxer"
+    if inference:
+        plan.add("primary-inference", "nvinfer")
+        plan.chain(head, "primary-inference")
+        head = "primary-inference"
+    if num_cams == 1:
+        _post_branch(plan, 0, display, caption, msgbroker, clip)
+        plan.chain(head, "convertor")
+    else:
+        plan.add("tee_batch", "tee")
+        plan.add("q_demux", "queue")
+        plan.add("nvstreamdemux", "nvstreamdemux")
+        plan.chain(head, "tee_batch", "q_demux", "nvstreamdemux")
+        for i in range(num_cams):
+            q = plan.add("q_cam_%d" % i, "queue")
+            _post_branch(plan, i, display and i == display_cam, caption, False, clip)
+            plan.chain("nvstreamdemux", q, node_name("convertor", i))
+        if msgbroker:
+            _msg_branch(plan, "tee_batch")
+    if prune:
+        plan.prune()
+    return plan
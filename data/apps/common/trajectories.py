@@ -0,0 +1,400 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Track histories from nvtracker output, kept in preallocated ring arrays.
+#
+#   store = TrajectoryStore(capacity=1024, history=64, ttl_s=5.0, width=1920, height=1080)
+#   store.add_frame(stream, frame_num, uids, boxes, confs, classes, t=pts_s)   # current frame
+#   store.add_past(stream, uid, [(frameNum, left, top, width, height, confidence, age), ...],
+#                  class_id, label)                                           # past-frame meta
+#   store.get(stream, uid)       # {"frames", "t", "boxes", "conf", "age", "past", ...}, oldest first
+#   store.recent(within_s=1.0)   # [(stream, uid), ...] seen in the last second
+#   store.motion(window=8)       # [{"stream", "id", "speed", "dir_deg", "vx", "vy", ...}]
+#   store.heatmap(stream)        # (grid_h, grid_w) counts of box anchors
+#   store.save_heatmap(stream, "heat0.npy")   # `python3 trajectories.py heatmap heat0.npy`
+#   store.expire()               # drops tracks not seen for ttl_s
+#
+# Every track (stream, uniqueId) owns one slot of `capacity`; a slot is a
+# ring of `history` entries (frame, t, box, confidence, age, past flag), so
+# memory is fixed. A track is found with one dict access; a whole frame of
+# uids with one searchsorted over a per-stream sorted index. When all slots
+# are in use the least recently seen track is dropped (capacity must exceed
+# the objects in one frame).
+#
+# Current-frame objects are appended in O(1). Past-frame entries (frames in
+# which the tracker kept the target in shadow mode and reported it later)
+# are merged into the ring in frame order; an entry the ring already has for
+# that frame is kept. Their times are estimated from the stream's frame
+# period. A frame number that goes backwards (file looped, source restarted)
+# starts the track over.
+#
+# Motion is measured on the bottom centre of the box, from the oldest to
+# the newest of the last `window` entries: speed in pixels/s, dir_deg 0 =
+# right, 90 = down (image coordinates). The heatmap counts the same anchor
+# on a grid_w x grid_h grid over width x height.
+#
+# All methods take one lock, so the pad probe can write while the main loop
+# queries. `python3 trajectories.py bench` times the hot paths.
+
+
+class TrajectoryStore:
+    def __init__(self, capacity=1024, history=64, ttl_s=5.0, width=1920, height=1080,
+                 grid_w=64, grid_h=36, clock=time.monotonic):
+        c, h = int(capacity), int(history)
+        if c < 1 or h < 2:
+            raise ValueError("capacity must be >= 1 and history >= 2")
+        self.capacity = c
+        self.history = h
+        self.ttl_s = float(ttl_s)
+        self.width = float(width)
+        self.height = float(height)
+        self.grid_w = int(grid_w)
+        self.grid_h = int(grid_h)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # per slot
+        self.used = np.zeros(c, dtype=bool)
+        self.stream = np.zeros(c, dtype=np.int32)
+        self.uid = np.zeros(c, dtype=np.uint64)
+        self.cls = np.zeros(c, dtype=np.int32)
+        self.seen = np.zeros(c)
+        self.head = np.zeros(c, dtype=np.intp)     # next write position
+        self.n = np.zeros(c, dtype=np.intp)        # valid entries, <= history
+        self.labels = [""] * c
+        # per entry
+        self.frame = np.zeros((c, h), dtype=np.int64)
+        self.t = np.zeros((c, h))
+        self.box = np.zeros((c, h, 4), dtype=np.float32)
+        self.conf = np.zeros((c, h), dtype=np.float32)
+        self.age = np.zeros((c, h), dtype=np.int32)
+        self.past = np.zeros((c, h), dtype=bool)
+        self._slots = {}        # stream -> {uid: slot}
+        self._index = {}        # stream -> (sorted uids, their slots), rebuilt when stale
+        self._free = list(range(c - 1, -1, -1))
+        self._period = {}       # stream -> (frame, t, seconds per frame)
+        self._heat = {}         # stream -> (grid_h * grid_w,) uint32
+        self.added = 0
+        self.merged = 0
+        self.expired = 0
+        self.dropped = 0        # evicted because every slot was in use
+        self.restarted = 0
+
+    # --- writes -----------------------------------------------------------
+
+    def _slot(self, stream, uid, cls, now):
+        slots = self._slots.setdefault(stream, {})
+        s = slots.get(uid)
+        if s is not None:
+            return s
+        if not self._free:
+            # least recently seen track makes room
+            victim = int(np.argmin(np.where(self.used, self.seen, np.inf)))
+            self._release(victim)
+            self.dropped += 1
+        s = self._free.pop()
+        slots[uid] = s
+        self._index.pop(stream, None)
+        self.used[s] = True
+        self.stream[s] = stream
+        self.uid[s] = uid
+        self.cls[s] = cls
+        self.seen[s] = now
+        self.head[s] = 0
+        self.n[s] = 0
+        self.labels[s] = ""
+        return s
+
+    def _release(self, s):
+        stream = int(self.stream[s])
+        self._slots.get(stream, {}).pop(int(self.uid[s]), None)
+        self._index.pop(stream, None)
+        self.used[s] = False
+        self._free.append(int(s))
+
+    def _heat_add(self, stream, boxes):
+        hm = self._heat.get(stream)
+        if hm is None:
+            hm = self._heat[stream] = np.zeros(self.grid_h * self.grid_w, dtype=np.uint32)
+        x = boxes[:, 0] + boxes[:, 2] * 0.5
+        y = boxes[:, 1] + boxes[:, 3]
+        cx = np.clip((x * (self.grid_w / self.width)).astype(np.intp), 0, self.grid_w - 1)
+        cy = np.clip((y * (self.grid_h / self.height)).astype(np.intp), 0, self.grid_h - 1)
+        hm += np.bincount(cy * self.grid_w + cx, minlength=len(hm)).astype(np.uint32)
+
+    def add_frame(self, stream, frame_num, uids, boxes, confs=None, classes=None, t=None):
+        # One frame of one stream: uids (N,), boxes (N, 4) left/top/width/height.
+        now = self._clock()
+        t = now if t is None else float(t)
+        stream, frame_num = int(stream), int(frame_num)
+        n = len(uids)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.zeros(n, dtype=np.float32) if confs is None else np.asarray(confs, dtype=np.float32)
+        classes = np.zeros(n, dtype=np.int32) if classes is None else np.asarray(classes, dtype=np.int32)
+        with self._lock:
+            last = self._period.get(stream)
+            if last is not None and frame_num > last[0] and t > last[1]:
+                dt = (t - last[1]) / (frame_num - last[0])
+                period = dt if last[2] is None else last[2] * 0.9 + dt * 0.1
+            else:
+                period = last[2] if last is not None else None
+            self._period[stream] = (frame_num, t, period)
+            if not n:
+                return 0
+            slots = self._lookup(stream, uids, classes, now)
+            restart = (self.n[slots] > 0) & (self.frame[slots, (self.head[slots] - 1) % self.history] >= frame_num)
+            if restart.any():
+                self.n[slots[restart]] = 0
+                self.head[slots[restart]] = 0
+                self.restarted += int(restart.sum())
+            pos = self.head[slots]
+            self.frame[slots, pos] = frame_num
+            self.t[slots, pos] = t
+            self.box[slots, pos] = boxes
+            self.conf[slots, pos] = confs
+            self.age[slots, pos] = -1
+            self.past[slots, pos] = False
+            self.head[slots] = (pos + 1) % self.history
+            self.n[slots] = np.minimum(self.n[slots] + 1, self.history)
+            self.seen[slots] = now
+            self.cls[slots] = classes
+            self._heat_add(stream, boxes)
+            self.added += n
+        return n
+
+    def _lookup(self, stream, uids, classes, now):
+        # Slots for a frame's uids; known tracks without a Python loop.
+        uids = np.asarray(uids, dtype=np.uint64)
+        idx = self._index.get(stream)
+        if idx is None:
+            d = self._slots.get(stream, {})
+            keys = np.fromiter(d.keys(), dtype=np.uint64, count=len(d))
+            vals = np.fromiter(d.values(), dtype=np.intp, count=len(d))
+            order = np.argsort(keys)
+            idx = self._index[stream] = (keys[order], vals[order])
+        keys, vals = idx
+        if len(keys):
+            pos = np.minimum(np.searchsorted(keys, uids), len(keys) - 1)
+            slots = vals[pos]
+            miss = keys[pos] != uids
+        else:
+            slots = np.empty(len(uids), dtype=np.intp)
+            miss = np.ones(len(uids), dtype=bool)
+        if miss.any():
+            # tracks of this frame are not the least recently seen
+            self.seen[slots[~miss]] = now
+            for i in np.flatnonzero(miss).tolist():
+                slots[i] = self._slot(stream, int(uids[i]), int(classes[i]), now)
+        return slots
+
+    def add_past(self, stream, uid, entries, class_id=0, label=""):
+        # entries: [(frameNum, left, top, width, height, confidence, age), ...]
+        if not entries:
+            return 0
+        now = self._clock()
+        stream, uid = int(stream), int(uid)
+        e = np.asarray(entries, dtype=np.float64).reshape(-1, 7)
+        with self._lock:
+            s = self._slot(stream, uid, int(class_id), now)
+            if label:
+                self.labels[s] = label
+            frames, t, box, conf, age, past = self._ordered(s)
+            new = e[:, 0].astype(np.int64)
+            keep = ~np.isin(new, frames)
+            if not keep.any():
+                return 0
+            e, new = e[keep], new[keep]
+            last = self._period.get(stream)
+            if last is not None and last[2]:
+                new_t = last[1] - (last[0] - new) * last[2]
+            elif len(frames):
+                new_t = np.full(len(new), t[0])
+            else:
+                new_t = np.full(len(new), now)
+            frames = np.concatenate([frames, new])
+            order = np.argsort(frames, kind="stable")[-self.history:]
+            k = len(order)
+            self.frame[s, :k] = frames[order]
+            self.t[s, :k] = np.concatenate([t, new_t])[order]
+            self.box[s, :k] = np.concatenate([box, e[:, 1:5].astype(np.float32)])[order]
+            self.conf[s, :k] = np.concatenate([conf, e[:, 5].astype(np.float32)])[order]
+            self.age[s, :k] = np.concatenate([age, e[:, 6].astype(np.int32)])[order]
+            self.past[s, :k] = np.concatenate([past, np.ones(len(new), dtype=bool)])[order]
+            self.n[s] = k
+            self.head[s] = k % self.history
+            self.seen[s] = now
+            self._heat_add(stream, e[:, 1:5])
+            self.merged += len(new)
+        return len(new)
+
+    def expire(self, now=None):
+        now = self._clock() if now is None else now
+        with self._lock:
+            dead = np.flatnonzero(self.used & (self.seen < now - self.ttl_s))
+            for s in dead.tolist():
+                self._release(s)
+            self.expired += len(dead)
+        return len(dead)
+
+    # --- reads ------------------------------------------------------------
+
+    def _ordered(self, s):
+        # Entries of slot s, oldest first (copies).
+        n, h = int(self.n[s]), int(self.head[s])
+        idx = (np.arange(h - n, h)) % self.history
+        return (self.frame[s, idx], self.t[s, idx], self.box[s, idx], self.conf[s, idx],
+                self.age[s, idx], self.past[s, idx])
+
+    def get(self, stream, uid):
+        with self._lock:
+            s = self._slots.get(int(stream), {}).get(int(uid))
+            if s is None:
+                return None
+            frames, t, box, conf, age, past = self._ordered(s)
+            return {"stream": int(stream), "id": int(uid), "class_id": int(self.cls[s]),
+                    "label": self.labels[s], "frames": frames, "t": t, "boxes": box,
+                    "conf": conf, "age": age, "past": past}
+
+    def _select(self, stream, within_s):
+        m = self.used.copy()
+        if stream is not None:
+            m &= self.stream == int(stream)
+        if within_s is not None:
+            m &= self.seen >= self._clock() - within_s
+        return np.flatnonzero(m)
+
+    def recent(self, within_s=None, stream=None):
+        with self._lock:
+            sel = self._select(stream, within_s)
+            return list(zip(self.stream[sel].tolist(), self.uid[sel].tolist()))
+
+    def motion(self, stream=None, within_s=None, window=8, min_points=2):
+        # Speed and heading of every selected track over its last `window`
+        # entries, computed for all of them at once.
+        window = max(2, min(int(window), self.history))
+        with self._lock:
+            sel = self._select(stream, within_s)
+            sel = sel[self.n[sel] >= min_points]
+            if not len(sel):
+                return []
+            k = np.minimum(self.n[sel], window)
+            a = (self.head[sel] - k) % self.history
+            b = (self.head[sel] - 1) % self.history
+            ba, bb = self.box[sel, a], self.box[sel, b]
+            dt = self.t[sel, b] - self.t[sel, a]
+            df = self.frame[sel, b] - self.frame[sel, a]
+            streams, uids, cls = self.stream[sel], self.uid[sel], self.cls[sel]
+        dx = (bb[:, 0] + bb[:, 2] * 0.5) - (ba[:, 0] + ba[:, 2] * 0.5)
+        dy = (bb[:, 1] + bb[:, 3]) - (ba[:, 1] + ba[:, 3])
+        ok = dt > 0
+        inv = np.where(ok, 1.0 / np.where(ok, dt, 1.0), 0.0)
+        vx, vy = dx * inv, dy * inv
+        speed = np.hypot(vx, vy)
+        heading = np.degrees(np.arctan2(dy, dx)) % 360.0
+        moving = ok & (speed > 0)
+        speed = np.where(ok, speed.round(2), np.nan).tolist()
+        heading = np.where(moving, heading.round(1), np.nan).tolist()
+        return [{"stream": st, "id": u, "class_id": c, "points": p, "frames": f,
+                 "speed": None if sp != sp else sp, "dir_deg": None if hd != hd else hd,
+                 "vx": x, "vy": y}
+                for st, u, c, p, f, sp, hd, x, y in zip(
+                    streams.tolist(), uids.tolist(), cls.tolist(), k.tolist(), df.tolist(), speed, heading,
+                    vx.round(2).tolist(), vy.round(2).tolist())]
+
+    def heatmap(self, stream, reset=False):
+        with self._lock:
+            hm = self._heat.get(int(stream))
+            if hm is None:
+                return np.zeros((self.grid_h, self.grid_w), dtype=np.uint32)
+            out = hm.reshape(self.grid_h, self.grid_w).copy()
+            if reset:
+                hm[:] = 0
+        return out
+
+    def save_heatmap(self, stream, path):
+        tmp = path + ".tmp.npy"
+        np.save(tmp, self.heatmap(stream))
+        os.replace(tmp, path)
+
+    def streams(self):
+        with self._lock:
+            return sorted(self._heat)
+
+    def stats(self):
+        with self._lock:
+            per = {}
+            for s in np.unique(self.stream[self.used]).tolist():
+                per["stream_%d" % s] = int(np.count_nonzero(self.used & (self.stream == s)))
+            return {"active": int(np.count_nonzero(self.used)), "capacity": self.capacity, "history": self.history,
+                    "added": self.added, "merged": self.merged, "expired": self.expired,
+                    "dropped": self.dropped, "restarted": self.restarted, "streams": per}
+
+
+def _bench(args):
+    rng = np.random.default_rng(args.seed)
+    store = TrajectoryStore(capacity=args.capacity, history=args.history, ttl_s=2.0, clock=lambda: now[0])
+    now = [0.0]
+    pos = np.stack([rng.uniform(0, 1920, args.tracks), rng.uniform(0, 1080, args.tracks)], axis=1)
+    vel = rng.normal(0, 3, (args.tracks, 2))
+    size = np.tile([40.0, 90.0], (args.tracks, 1))
+    uids = np.arange(args.tracks) + 1
+    add_t, past_t = [], []
+    for f in range(args.frames):
+        now[0] = f / 30.0
+        pos = (pos + vel) % (1920, 1080)
+        boxes = np.concatenate([pos - size * (0.5, 1.0), size], axis=1)
+        live = rng.random(args.tracks) > 0.05      # 5% in shadow mode this frame
+        t0 = time.perf_counter()
+        store.add_frame(0, f, uids[live], boxes[live], np.full(live.sum(), 0.9), np.zeros(live.sum(), dtype=int),
+                        t=now[0])
+        add_t.append(time.perf_counter() - t0)
+        if f and f % 10 == 0:
+            t0 = time.perf_counter()
+            for u in uids[:10].tolist():
+                b = boxes[u - 1]
+                store.add_past(0, u, [(f - 3, b[0], b[1], b[2], b[3], 0.5, 7)])
+            past_t.append((time.perf_counter() - t0) / 10)
+    t0 = time.perf_counter()
+    for u in uids[:100].tolist():
+        store.get(0, u)
+    get_us = (time.perf_counter() - t0) / 100 * 1e6
+    t0 = time.perf_counter()
+    m = store.motion(window=8)
+    motion_us = (time.perf_counter() - t0) * 1e6
+    print(json.dumps({"tracks": args.tracks, "history": args.history, "frames": args.frames,
+                      "add_frame_us": round(float(np.mean(add_t)) * 1e6, 1),
+                      "add_past_us": round(float(np.mean(past_t)) * 1e6, 1) if past_t else None,
+                      "get_us": round(get_us, 1), "motion_all_us": round(motion_us, 1), "motion_tracks": len(m),
+                      "stats": store.stats()}))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="trajectory store tools")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="time add_frame/add_past/get/motion on random tracks")
+    b.add_argument("--tracks", type=int, default=200)
+    b.add_argument("--capacity", type=int, default=1024)
+    b.add_argument("--history", type=int, default=64)
+    b.add_argument("--frames", type=int, default=1000)
+    b.add_argument("--seed", type=int, default=1)
+    h = sub.add_parser("heatmap", help="print a saved heatmap (.npy) as text")
+    h.add_argument("path")
+    args = p.parse_args(argv)
+    if args.cmd == "bench":
+        _bench(args)
+    else:
+        hm = np.load(args.path)
+        top = max(int(hm.max()), 1)
+        ramp = " .:-=+*#%@"
+        for row in hm:
+            print("".join(ramp[min(len(ramp) - 1, int(v) * len(ramp) // (top + 1))] for v in row))
+        print(os.path.basename(args.path), "max", top)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -18,6 +18,7 @@
 ################################################################################
 
 import sys
+sys.path.append('../')
 import os
 import gi
 
@@ -25,6 +26,9 @@ gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 
 import pyds
+from common.applog import get_logger
+
+log = get_logger("deepstream-custom-binding-test")
 
 def bus_call(bus, message, loop):
     t = message.type
@@ -43,7 +47,7 @@ def bus_call(bus, message, loop):
 def streammux_src_pad_buffer_probe(pad, info, u_data):
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
@@ -63,7 +67,7 @@ def streammux_src_pad_buffer_probe(pad, info, u_data):
         user_meta = pyds.nvds_acquire_user_meta_from_pool(batch_meta)
 
         if user_meta:
-            print('adding user meta')
+            log.debug('adding user meta', key="add")
             test_string = 'test message ' + str(frame_number)
             data = pyds.alloc_custom_struct(user_meta)
             data.message = test_string
@@ -76,7 +80,7 @@ def streammux_src_pad_buffer_probe(pad, info, u_data):
 
             pyds.nvds_add_user_meta_to_frame(frame_meta, user_meta)
         else:
-            print('failed to acquire user meta')
+            log.error('failed to acquire user meta', key="acquire")
 
         try:
             l_frame = l_frame.next
@@ -90,7 +94,7 @@ def streammux_src_pad_buffer_probe(pad, info, u_data):
 def fakesink_sink_pad_buffer_probe(pad, info, u_data):
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
     batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
 
@@ -115,10 +119,11 @@ def fakesink_sink_pad_buffer_probe(pad, info, u_data):
 
             if user_meta.base_meta.meta_type == pyds.NvDsMetaType.NVDS_USER_META:
                 custom_msg_meta = pyds.CustomDataStruct.cast(user_meta.user_meta_data)
-                print(f'event msg meta, otherAttrs = {pyds.get_string(custom_msg_meta.message)}')
-                print('custom meta structId:: ', custom_msg_meta.structId)
-                print('custom meta msg:: ', pyds.get_string(custom_msg_meta.message))
-                print('custom meta sampleInt:: ', custom_msg_meta.sampleInt)
+                msg = pyds.get_string(custom_msg_meta.message)
+                log.info('custom meta structId=%d msg=%s sampleInt=%d', custom_msg_meta.structId, msg,
+                         custom_msg_meta.sampleInt, key="custom")
+                log.record("custom_meta", {"struct_id": custom_msg_meta.structId, "message": msg,
+                                           "sample_int": custom_msg_meta.sampleInt})
             try:
                 l_usr = l_usr.next
             except StopIteration:
@@ -34,10 +34,13 @@ import math
 import platform
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.FPS import PERF_DATA
 
 import pyds
 
+log = get_logger("deepstream-demux-multi-in-multi-out")
+
 no_display = False
 silent = False
 file_loop = False
@@ -78,7 +81,7 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
     num_rects = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
     # Retrieve batch metadata from the gst_buffer
     # Note that pyds.gst_buffer_get_nvds_batch_meta() expects the
@@ -116,16 +119,17 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
                 l_obj = l_obj.next
             except StopIteration:
                 break
-        print(
-            "Frame Number=",
+        log.info(
+            "Frame Number=%d stream id=%d Number of Objects=%d Vehicle_count=%d Person_count=%d",
             frame_number,
-            "Number of Objects=",
+            frame_meta.pad_index,
             num_rects,
-            "Vehicle_count=",
             obj_counter[PGIE_CLASS_ID_VEHICLE],
-            "Person_count=",
             obj_counter[PGIE_CLASS_ID_PERSON],
+            key=frame_meta.pad_index,
         )
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
 
         # Update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
@@ -29,6 +29,7 @@ import sys
 import math
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.FPS import PERF_DATA
 import pyds
 import argparse
@@ -36,6 +37,8 @@ import argparse
 import ctypes
 import cupy as cp
 
+log = get_logger("deepstream-imagedata-multistream-cupy")
+
 perf_data = None
 
 MAX_DISPLAY_LEN = 64
@@ -59,7 +62,7 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
     frame_number = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -121,7 +124,11 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
             n_frame_gpu[:, :, 0] = 0.5 * n_frame_gpu[:, :, 0] + 0.5
         stream.synchronize()
 
-        print("Frame Number=", frame_number, "Number of Objects=",num_rects,"Vehicle_count=",obj_counter[PGIE_CLASS_ID_VEHICLE],"Person_count=",obj_counter[PGIE_CLASS_ID_PERSON])
+        log.info("Frame Number=%d stream id=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", frame_number,
+                 frame_meta.pad_index, num_rects, obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON],
+                 key=frame_meta.pad_index)
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
         # Get frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
         global perf_data
@@ -33,6 +33,7 @@ import math
 import platform
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 
 from common.FPS import PERF_DATA
 import numpy as np
@@ -42,6 +43,8 @@ import os
 import os.path
 from os import path
 
+log = get_logger("deepstream-imagedata-multistream-redaction")
+
 perf_data = None
 frame_count = {}
 saved_count = {}
@@ -72,7 +75,7 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
     num_rects = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -151,8 +154,11 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
             except StopIteration:
                 break
 
-        print("Frame Number=", frame_number, "Number of Objects=", num_rects, "Face_count=",
-              obj_counter[PGIE_CLASS_ID_FACE], "Person_count=", obj_counter[PGIE_CLASS_ID_PERSON])
+        log.info("Frame Number=%d stream id=%d Number of Objects=%d Face_count=%d Person_count=%d", frame_number,
+                 frame_meta.pad_index, num_rects, obj_counter[PGIE_CLASS_ID_FACE], obj_counter[PGIE_CLASS_ID_PERSON],
+                 key=frame_meta.pad_index)
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                             "face": obj_counter[PGIE_CLASS_ID_FACE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
         # Update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
         global perf_data
@@ -30,10 +30,13 @@ import math
 import platform
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.FPS import PERF_DATA
 
 import pyds
 
+log = get_logger("deepstream-nvdsanalytics")
+
 perf_data = None
 
 MAX_DISPLAY_LEN=64
@@ -58,7 +61,7 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
     num_rects=0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -87,7 +90,6 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
         PGIE_CLASS_ID_BICYCLE:0,
         PGIE_CLASS_ID_ROADSIGN:0
         }
-        print("#"*50)
         while l_obj:
             try: 
                 # Note that l_obj.data needs a cast to pyds.NvDsObjectMeta
@@ -103,10 +105,16 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
                     user_meta = pyds.NvDsUserMeta.cast(l_user_meta.data)
                     if user_meta.base_meta.meta_type == pyds.NvDsMetaType.NVDS_OBJ_META_NVDSANALYTICS:             
                         user_meta_data = pyds.NvDsAnalyticsObjInfo.cast(user_meta.user_meta_data)
-                        if user_meta_data.dirStatus: print("Object {0} moving in direction: {1}".format(obj_meta.object_id, user_meta_data.dirStatus))                    
-                        if user_meta_data.lcStatus: print("Object {0} line crossing status: {1}".format(obj_meta.object_id, user_meta_data.lcStatus))
-                        if user_meta_data.ocStatus: print("Object {0} overcrowding status: {1}".format(obj_meta.object_id, user_meta_data.ocStatus))
-                        if user_meta_data.roiStatus: print("Object {0} roi status: {1}".format(obj_meta.object_id, user_meta_data.roiStatus))
+                        if user_meta_data.dirStatus: log.info("Object %d moving in direction: %s", obj_meta.object_id, user_meta_data.dirStatus, key="dir")
+                        if user_meta_data.lcStatus: log.info("Object %d line crossing status: %s", obj_meta.object_id, user_meta_data.lcStatus, key="lc")
+                        if user_meta_data.ocStatus: log.info("Object %d overcrowding status: %s", obj_meta.object_id, user_meta_data.ocStatus, key="oc")
+                        if user_meta_data.roiStatus: log.info("Object %d roi status: %s", obj_meta.object_id, user_meta_data.roiStatus, key="roi")
+                        if log.machine_enabled() and (user_meta_data.dirStatus or user_meta_data.lcStatus
+                                                      or user_meta_data.ocStatus or user_meta_data.roiStatus):
+                            log.record("object", {"stream": frame_meta.pad_index, "frame": frame_number,
+                                                  "id": obj_meta.object_id, "dir": user_meta_data.dirStatus,
+                                                  "lc": list(user_meta_data.lcStatus), "oc": list(user_meta_data.ocStatus),
+                                                  "roi": list(user_meta_data.roiStatus)})
                 except StopIteration:
                     break
 
@@ -126,10 +134,16 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
                 user_meta = pyds.NvDsUserMeta.cast(l_user.data)
                 if user_meta.base_meta.meta_type == pyds.NvDsMetaType.NVDS_FRAME_META_NVDSANALYTICS:
                     user_meta_data = pyds.NvDsAnalyticsFrameMeta.cast(user_meta.user_meta_data)
-                    if user_meta_data.objInROIcnt: print("Objs in ROI: {0}".format(user_meta_data.objInROIcnt))                    
-                    if user_meta_data.objLCCumCnt: print("Linecrossing Cumulative: {0}".format(user_meta_data.objLCCumCnt))
-                    if user_meta_data.objLCCurrCnt: print("Linecrossing Current Frame: {0}".format(user_meta_data.objLCCurrCnt))
-                    if user_meta_data.ocStatus: print("Overcrowding status: {0}".format(user_meta_data.ocStatus))
+                    if user_meta_data.objInROIcnt: log.info("Objs in ROI: %s", user_meta_data.objInROIcnt, key="roi_cnt")
+                    if user_meta_data.objLCCumCnt: log.info("Linecrossing Cumulative: %s", user_meta_data.objLCCumCnt, key="lc_cum")
+                    if user_meta_data.objLCCurrCnt: log.info("Linecrossing Current Frame: %s", user_meta_data.objLCCurrCnt, key="lc_cur")
+                    if user_meta_data.ocStatus: log.info("Overcrowding status: %s", user_meta_data.ocStatus, key="oc_frame")
+                    if log.machine_enabled():
+                        log.record("analytics", {"stream": frame_meta.pad_index, "frame": frame_number,
+                                                 "roi": dict(user_meta_data.objInROIcnt),
+                                                 "lc_cum": dict(user_meta_data.objLCCumCnt),
+                                                 "lc_cur": dict(user_meta_data.objLCCurrCnt),
+                                                 "oc": dict(user_meta_data.ocStatus)})
             except StopIteration:
                 break
             try:
@@ -137,7 +151,11 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
             except StopIteration:
                 break
         
-        print("Frame Number=", frame_number, "stream id=", frame_meta.pad_index, "Number of Objects=",num_rects,"Vehicle_count=",obj_counter[PGIE_CLASS_ID_VEHICLE],"Person_count=",obj_counter[PGIE_CLASS_ID_PERSON])
+        log.info("Frame Number=%d stream id=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", frame_number,
+                 frame_meta.pad_index, num_rects, obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON],
+                 key=frame_meta.pad_index)
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
         # Update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
         global perf_data
@@ -146,7 +164,6 @@ def nvanalytics_src_pad_buffer_probe(pad,info,u_data):
             l_frame=l_frame.next
         except StopIteration:
             break
-        print("#"*50)
 
     return Gst.PadProbeReturn.OK
 
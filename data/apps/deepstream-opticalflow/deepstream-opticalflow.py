@@ -28,6 +28,7 @@ from gi.repository import GLib, Gst
 import sys
 import math
 from common.bus_call import bus_call
+from common.applog import get_logger
 import os
 from os import path
 
@@ -36,6 +37,8 @@ import numpy as np
 
 import pyds
 
+log = get_logger("deepstream-opticalflow")
+
 
 MAX_DISPLAY_LEN = 64
 MUXER_OUTPUT_WIDTH = 1280
@@ -71,7 +74,7 @@ def ofvisual_queue_src_pad_buffer_probe(pad, info, u_data):
     frame_number = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -115,7 +118,8 @@ def ofvisual_queue_src_pad_buffer_probe(pad, info, u_data):
             except StopIteration:
                 break
 
-        print("Frame Number=", frame_number)
+        log.info("Frame Number=%d stream id=%d", frame_number, frame_meta.pad_index, key=frame_meta.pad_index)
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "flow": got_visual})
         if got_visual:
             img_path = "{}/stream_{}/frame_{}.jpg".format(folder_name, frame_meta.pad_index, frame_number)
             cv2.imwrite(img_path, flow_visual)
@@ -21,6 +21,7 @@ import sys
 
 sys.path.append("../")
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.platform_info import PlatformInfo
 import pyds
 import platform
@@ -38,6 +39,8 @@ import argparse
 
 from common.FPS import PERF_DATA
 
+log = get_logger("deepstream-preprocess-test")
+
 perf_data = None
 
 MAX_DISPLAY_LEN = 64
@@ -64,7 +67,7 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
     num_rects = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -106,16 +109,17 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
             except StopIteration:
                 break
 
-        print(
-            "Frame Number=",
+        log.info(
+            "Frame Number=%d stream id=%d Number of Objects=%d Vehicle_count=%d Person_count=%d",
             frame_number,
-            "Number of Objects=",
+            frame_meta.pad_index,
             num_rects,
-            "Vehicle_count=",
             obj_counter[PGIE_CLASS_ID_VEHICLE],
-            "Person_count=",
             obj_counter[PGIE_CLASS_ID_PERSON],
+            key=frame_meta.pad_index,
         )
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
 
         # update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
@@ -168,7 +172,8 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
                 txt_params.text_bg_clr.alpha = 0.5
 
                 pyds.nvds_add_display_meta_to_frame(roi_meta.frame_meta, display_meta)
-                print(f"frame {roi_meta.frame_meta.frame_num} src {roi_meta.frame_meta.source_id} roi {roi_cnt}")
+                log.debug("frame %d src %d roi %d", roi_meta.frame_meta.frame_num, roi_meta.frame_meta.source_id,
+                          roi_cnt, key="roi")
 
                 roi_cnt += 1
         try:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sys
+import time
+
+APPS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APPS_DIR)
+
+import numpy as np
+
+from common.snapshot_dedup import SnapshotDedup
+
+
+def _scenes(width, height, count, change_every, seed):
+    # A static background with sensor noise; every change_every frames an
+    # object moves far enough to count as a new scene.
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = ((xx * 255 // max(1, width - 1)) // 2 + (yy * 255 // max(1, height - 1)) // 2).astype(np.int16)
+    frames = []
+    for i in range(count):
+        img = base.copy()
+        k = i // change_every
+        x0 = (k * width // 7) % max(1, width - width // 4)
+        y0 = (k * height // 5) % max(1, height - height // 4)
+        img[y0:y0 + height // 4, x0:x0 + width // 4] = 255 - (k * 37) % 200
+        img += rng.integers(-4, 5, size=img.shape, dtype=np.int16)
+        frames.append(np.clip(img, 0, 255).astype(np.uint8))
+    return frames
+
+
+def _encode(frames, quality):
+    import cv2
+    out = []
+    for f in frames:
+        ok, jpg = cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        out.append(jpg.tobytes())
+    return out
+
+
+def _run(dedup, items, jpeg):
+    t0 = time.perf_counter()
+    for i, item in enumerate(items):
+        if jpeg:
+            dedup.is_duplicate(0, item, now=float(i))
+        else:
+            dedup.check_gray(0, item, now=float(i))
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dedup_benchmark",
+                                     description="Measure snapshot dedup throughput (hash + index lookup).")
+    parser.add_argument("-n", "--frames", type=int, default=600)
+    parser.add_argument("-W", "--width", type=int, default=1920)
+    parser.add_argument("-H", "--height", type=int, default=1080)
+    parser.add_argument("-m", "--method", default="phash", help="comma separated hash methods (dhash, phash)")
+    parser.add_argument("-d", "--max-dist", type=int, default=6)
+    parser.add_argument("--index-size", type=int, default=2048)
+    parser.add_argument("--change-every", type=int, default=30, help="frames per distinct scene")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the encoded snapshots")
+    parser.add_argument("--cpu", type=int, default=None, help="pin to this core (e.g. one A57/A78 core)")
+    parser.add_argument("--target", type=float, default=30.0, help="required hashes/s; exit 1 below it")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+
+    frames = _scenes(args.width, args.height, args.frames, args.change_every, args.seed)
+    try:
+        items, jpeg = _encode(frames, args.quality), True
+    except ImportError:
+        # Without OpenCV, hash the frame the 1/8 JPEG decode would produce.
+        items, jpeg = [f[::8, ::8].copy() for f in frames], False
+    expected = -(-args.frames // args.change_every)
+
+    results = []
+    print("%-8s %-6s %8s %12s %10s %8s %8s" % ("method", "input", "frames", "hashes/s", "us/hash", "kept", "expect"))
+    for method in [m.strip() for m in args.method.split(",") if m.strip()]:
+        dedup = SnapshotDedup(method, args.max_dist, args.index_size)
+        _run(SnapshotDedup(method, args.max_dist, args.index_size), items[:10], jpeg)  # warm up
+        elapsed = _run(dedup, items, jpeg)
+        s = dedup.stats()
+        r = {"method": method, "input": "jpeg" if jpeg else "gray", "frames": args.frames,
+             "hashes_per_s": args.frames / elapsed, "us_per_hash": elapsed * 1e6 / args.frames,
+             "kept": s["kept"], "skipped": s["skipped"], "expected_kept": expected}
+        results.append(r)
+        print("%-8s %-6s %8d %12.1f %10.1f %8d %8d" % (method, r["input"], args.frames, r["hashes_per_s"],
+                                                    r["us_per_hash"], r["kept"], expected))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu": args.cpu, "results": results}, f, indent=2)
+    slow = [r["method"] for r in results if r["hashes_per_s"] < args.target]
+    if slow:
+        print("below %.0f hashes/s: %s" % (args.target, ", ".join(slow)))
+    # Keeping fewer than one snapshot per scene means new scenes were dropped
+    # as duplicates; keeping more means noise defeats the dedup.
+    wrong = ["%s (%d)" % (r["method"], r["kept"]) for r in results if r["kept"] != expected]
+    if wrong:
+        print("kept != %d scenes: %s" % (expected, ", ".join(wrong)))
+    return 1 if slow or wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
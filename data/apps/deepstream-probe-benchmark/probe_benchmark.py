@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APPS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APPS_DIR)
+
+from common import fake_pyds
+from common import synthetic_meta
+
+fake_pyds.install()
+fake_pyds.install_platform_stubs()
+
+
+class _NoIGpu:
+    def is_integrated_gpu(self):
+        return False
+
+    def is_platform_aarch64(self):
+        return False
+
+
+def _setup_perf(mod, cfg, workdir):
+    from common.FPS import PERF_DATA
+    mod.perf_data = PERF_DATA(cfg.streams)
+
+
+def _setup_imagedata(mod, cfg, workdir):
+    _setup_perf(mod, cfg, workdir)
+    mod.folder_name = workdir
+    mod.platform_info = _NoIGpu()
+    for i in range(cfg.streams):
+        mod.saved_count["stream_{}".format(i)] = 0
+        os.makedirs(os.path.join(workdir, "stream_{}".format(i)), exist_ok=True)
+
+
+def _setup_segmentation(mod, cfg, workdir):
+    mod.folder_name = workdir
+
+
+def _setup_usb_ros(mod, cfg, workdir):
+    # main() builds the app's ConfigStore; without it the publish path bails out.
+    from common.app_config import ConfigStore
+    env = dict(os.environ)
+    env['DS_DETECTIONS_JSONL'] = os.path.join(workdir, "detections.jsonl")
+    mod.config = ConfigStore(mod.SETTINGS, env=env)
+
+
+# name: (app file relative to data/apps, probe function, scene overrides, setup, extra modules)
+PROBES = {
+    "test1.osd": ("deepstream-test1/deepstream_test_1.py", "osd_sink_pad_buffer_probe",
+                  {}, None, ()),
+    "test2.osd": ("deepstream-test2/deepstream_test_2.py", "osd_sink_pad_buffer_probe",
+                  {"past_frames": 2}, None, ()),
+    "usb_ros.osd": ("deepstream-test1-usbcam/deepstream_test_1_usb_ros.py", "osd_sink_pad_buffer_probe",
+                    {}, _setup_usb_ros, ()),
+    "test3.pgie": ("deepstream-test3/deepstream_test_3.py", "pgie_src_pad_buffer_probe",
+                   {}, _setup_perf, ()),
+    "preprocess.pgie": ("deepstream-preprocess-test/deepstream_preprocess_test.py", "pgie_src_pad_buffer_probe",
+                        {"preprocess_rois": 4}, _setup_perf, ()),
+    "imagedata.tiler": ("deepstream-imagedata-multistream/deepstream_imagedata-multistream.py",
+                        "tiler_sink_pad_buffer_probe", {}, _setup_imagedata, ("numpy", "cv2")),
+    "nvdsanalytics.src": ("deepstream-nvdsanalytics/deepstream_nvdsanalytics.py",
+                          "nvanalytics_src_pad_buffer_probe", {"analytics": True}, _setup_perf, ()),
+    "segmentation.src": ("deepstream-segmentation/deepstream_segmentation.py", "seg_src_pad_buffer_probe",
+                         {"segmentation": (64, 64)}, _setup_segmentation, ("numpy", "cv2")),
+}
+
+
+def _missing(modules):
+    out = []
+    for name in modules:
+        try:
+            __import__(name)
+        except Exception:
+            out.append(name)
+    return out
+
+
+def load_probe(name):
+    rel, func, _, _, _ = PROBES[name]
+    path = os.path.join(APPS_DIR, rel)
+    spec = importlib.util.spec_from_file_location("bench_" + name.replace('.', '_'), path)
+    mod = importlib.util.module_from_spec(spec)
+    cwd = os.getcwd()
+    try:
+        # Apps resolve '../' and local config files relative to their own dir.
+        os.chdir(os.path.dirname(path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(mod)
+    finally:
+        os.chdir(cwd)
+    return mod, getattr(mod, func)
+
+
+def _scene(name, args):
+    overrides = dict(PROBES[name][2])
+    kw = {"streams": args.streams, "objects": args.objects, "seed": args.seed}
+    kw.update(overrides)
+    return synthetic_meta.SceneConfig(**kw)
+
+
+def _run_pass(probe, batches):
+    sink = open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(sink):
+            t0 = time.perf_counter_ns()
+            for info, _ in batches:
+                probe(None, info, 0)
+            t1 = time.perf_counter_ns()
+    finally:
+        sink.close()
+        for info, _ in batches:
+            fake_pyds.release_batch_meta(info.get_buffer())
+    return t1 - t0
+
+
+def _alloc_pass(probe, batches):
+    sink = open(os.devnull, 'w')
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        with contextlib.redirect_stdout(sink):
+            for info, _ in batches:
+                probe(None, info, 0)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        sink.close()
+        for info, _ in batches:
+            fake_pyds.release_batch_meta(info.get_buffer())
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(max(0, s.count_diff) for s in stats)
+    retained = sum(s.size_diff for s in stats)
+    return peak - base, blocks, retained
+
+
+def bench_probe(name, args):
+    missing = _missing(PROBES[name][4])
+    if missing:
+        return {"probe": name, "skipped": "missing " + ",".join(missing)}
+    cfg = _scene(name, args)
+    mod, probe = load_probe(name)
+    setup = PROBES[name][3]
+    with tempfile.TemporaryDirectory(prefix="probe_bench_") as workdir:
+        if setup is not None:
+            setup(mod, cfg, workdir)
+        frames = args.batches * cfg.streams
+        _run_pass(probe, synthetic_meta.pregenerate(cfg, min(args.batches, 10)))
+        best = None
+        for _ in range(max(1, args.repeat)):
+            ns = _run_pass(probe, synthetic_meta.pregenerate(cfg, args.batches))
+            best = ns if best is None else min(best, ns)
+        peak, blocks, retained = _alloc_pass(probe, synthetic_meta.pregenerate(cfg, args.batches))
+    return {
+        "probe": name,
+        "frames": frames,
+        "streams": cfg.streams,
+        "objects": cfg.objects,
+        "us_per_frame": round(best / 1000.0 / frames, 3),
+        "alloc_peak_kib": round(peak / 1024.0, 1),
+        "alloc_blocks_per_frame": round(blocks / float(frames), 2),
+        "retained_bytes_per_frame": round(retained / float(frames), 1),
+    }
+
+
+def compare_baseline(results, baseline_path, max_regress):
+    with open(baseline_path) as f:
+        baseline = {r["probe"]: r for r in json.load(f).get("results", [])}
+    failures = []
+    for r in results:
+        b = baseline.get(r["probe"])
+        if not b or "us_per_frame" not in r or "us_per_frame" not in b:
+            continue
+        limit = b["us_per_frame"] * (1.0 + max_regress / 100.0)
+        if r["us_per_frame"] > limit:
+            failures.append("%s: %.3f us/frame > %.3f (baseline %.3f +%d%%)" % (
+                r["probe"], r["us_per_frame"], limit, b["us_per_frame"], max_regress))
+    return failures
+
+
+def print_table(results):
+    print("%-20s %8s %12s %12s %14s %14s" % ("probe", "frames", "us/frame", "peak KiB",
+                                             "blocks/frame", "retained B/fr"))
+    for r in results:
+        if "skipped" in r:
+            print("%-20s %s" % (r["probe"], "skipped (" + r["skipped"] + ")"))
+            continue
+        print("%-20s %8d %12.3f %12.1f %14.2f %14.1f" % (
+            r["probe"], r["frames"], r["us_per_frame"], r["alloc_peak_kib"],
+            r["alloc_blocks_per_frame"], r["retained_bytes_per_frame"]))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="probe_benchmark",
+                                     description="Replay synthetic batch metadata through the sample pad probes.")
+    parser.add_argument("-p", "--probes", default="all",
+                        help="Comma separated probe names, or 'all'. Known: " + ", ".join(sorted(PROBES)))
+    parser.add_argument("-b", "--batches", type=int, default=300, help="Batches per timed pass")
+    parser.add_argument("-s", "--streams", type=int, default=1, help="Frames per batch (sources)")
+    parser.add_argument("-o", "--objects", type=int, default=8, help="Objects per frame")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Timed passes, best is reported")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--stop-iteration", action="store_true",
+                        help="End GLists with StopIteration like older pyds bindings")
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON from a previous --json run to compare against")
+    parser.add_argument("--max-regress", type=int, default=25,
+                        help="Allowed us/frame regression vs baseline, percent")
+    return parser.parse_args(argv[1:])
+
+
+def main(argv):
+    args = parse_args(argv)
+    fake_pyds.RAISE_STOP_ITERATION = args.stop_iteration
+    names = sorted(PROBES) if args.probes == "all" else [p.strip() for p in args.probes.split(',') if p.strip()]
+    for name in names:
+        if name not in PROBES:
+            sys.stderr.write("unknown probe %s\n" % name)
+            return 2
+    results = [bench_probe(name, args) for name in names]
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"ts": int(time.time()), "python": sys.version.split()[0], "results": results}, f, indent=2)
+    if args.baseline:
+        failures = compare_baseline(results, args.baseline, args.max_regress)
+        for line in failures:
+            sys.stderr.write("REGRESSION " + line + "\n")
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import runpy
+import signal
+import sys
+import threading
+import types
+
+APPS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APPS_DIR)
+
+from common import fake_pyds
+from common import synthetic_meta
+
+fake_pyds.install()
+
+
+def _stub_platform_info():
+    # PlatformInfo needs the CUDA bindings; the CPU run answers "dGPU, x86".
+    from common import cpu_standins
+    mod = types.ModuleType("common.platform_info")
+    mod.PlatformInfo = cpu_standins.CpuPlatformInfo
+    sys.modules["common.platform_info"] = mod
+
+
+def _stop_after(seconds):
+    # Apps run GLib.MainLoop.run() inside try/except; SIGINT ends the loop and
+    # lets main() tear the pipeline down normally.
+    t = threading.Timer(seconds, lambda: os.kill(os.getpid(), signal.SIGINT))
+    t.daemon = True
+    t.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="run_headless",
+                                     description="Run a sample app on CPU stand-ins for the nv* elements.")
+    parser.add_argument("-t", "--seconds", type=float, default=20.0, help="stop the app after this long")
+    parser.add_argument("-o", "--objects", type=int, default=8, help="synthetic objects per frame")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    parser.add_argument("app", help="path to the app script, e.g. ../deepstream-test1/deepstream_test_1.py")
+    parser.add_argument("app_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    # USB cameras become videotestsrc, which cannot produce image/jpeg.
+    os.environ.setdefault("DS_CAM_CAPS", "video/x-raw")
+    _stub_platform_info()
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    Gst.init(None)
+    from common import cpu_standins
+    cfg = synthetic_meta.SceneConfig(streams=1, objects=args.objects, seed=args.seed)
+    cpu_standins.install(Gst, cfg)
+
+    script = os.path.abspath(args.app)
+    app_dir = os.path.dirname(script)
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    sys.argv = [script] + list(args.app_args)
+    _stop_after(args.seconds)
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit:
+        pass
+    except KeyboardInterrupt:
+        pass
+
+    report = cpu_standins.stats.report()
+    report["app"] = os.path.relpath(script, APPS_DIR)
+    print("\n**HEADLESS: " + json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,7 @@
 import sys
 sys.path.append("../")
 from common.bus_call import bus_call
+from common.applog import get_logger, INFO
 from common.platform_info import PlatformInfo
 import pyds
 import platform
@@ -34,6 +35,8 @@ import datetime
 
 import argparse
 
+log = get_logger("deepstream-rtsp-in-rtsp-out")
+
 MAX_DISPLAY_LEN = 64
 PGIE_CLASS_ID_VEHICLE = 0
 PGIE_CLASS_ID_BICYCLE = 1
@@ -58,7 +61,7 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
     num_rects = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -78,13 +81,14 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
             break
 
         frame_number = frame_meta.frame_num
-        print(
-            "Frame Number=",
-            frame_number
-        )
+        log.info("Frame Number=%d stream id=%d", frame_number, frame_meta.pad_index, key=frame_meta.pad_index)
         if ts_from_rtsp:
             ts = frame_meta.ntp_timestamp/1000000000 # Retrieve timestamp, put decimal in proper position for Unix format
-            print("RTSP Timestamp:",datetime.datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')) # Convert timestamp to UTC
+            if log.enabled(INFO):
+                log.info("RTSP Timestamp: %s", datetime.datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'), key="ntp") # Convert timestamp to UTC
+            log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "ntp_ts": ts})
+        else:
+            log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number})
 
         try:
             l_frame = l_frame.next
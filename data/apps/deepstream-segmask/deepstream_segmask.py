@@ -33,9 +33,12 @@ import math
 import platform
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.FPS import PERF_DATA
 import numpy as np
 import pyds
+
+log = get_logger("deepstream-segmask")
 import cv2
 import os
 import os.path
@@ -59,7 +62,7 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
     num_rects = 0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -104,7 +107,9 @@ def tiler_sink_pad_buffer_probe(pad, info, u_data):
             except StopIteration:
                 break
 
-        print("Frame Number=", frame_number, "Number of Objects=", num_rects)
+        log.info("Frame Number=%d stream id=%d Number of Objects=%d", frame_number, frame_meta.pad_index, num_rects,
+                 key=frame_meta.pad_index)
+        log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects})
         # update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
         global perf_data
@@ -27,12 +27,15 @@ gi.require_version('Gst', '1.0')
 from gi.repository import GLib, Gst
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 import cv2
 import pyds
 import numpy as np
 import os.path
 from os import path
 
+log = get_logger("deepstream-segmentation")
+
 MAX_DISPLAY_LEN = 64
 MUXER_OUTPUT_WIDTH = 1920
 MUXER_OUTPUT_HEIGHT = 1080
@@ -62,7 +65,7 @@ def map_mask_as_display_bgr(mask):
 def seg_src_pad_buffer_probe(pad, info, u_data):
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -111,7 +114,8 @@ def seg_src_pad_buffer_probe(pad, info, u_data):
                 masks = np.array(masks, copy=True, order='C')
                 # map the obtained masks to colors of 2 classes.
                 frame_image = map_mask_as_display_bgr(masks)
-                print("Frame Number = ", frame_number, " Mask shape = ", masks.shape)
+                log.info("Frame Number = %d Mask shape = %s", frame_number, masks.shape, key="frame")
+                log.record("frame", {"frame": frame_number, "mask_shape": list(masks.shape)})
                 cv2.imwrite(folder_name + "/" + str(frame_number) + ".jpg", frame_image)
             try:
                 l_user = l_user.next
@@ -0,0 +1,154 @@
+import queue
+import threading
+
+# OpenCV -> appsrc feeder for --opencv_appsrc.
+#
+# A reader thread decodes ahead into a small prefetch queue so need-data
+# never waits on cap.read(). Frames are decoded straight into buffers taken
+# from a bounded Gst.BufferPool: the pooled buffer is mapped writable,
+# wrapped as a numpy array, and cap.read() fills it in place. No tobytes()
+# copy is made and no buffer is allocated per frame; buffers return to the
+# pool once the encoder releases them. If the installed gst-python cannot
+# map writable, each frame is copied into the pooled buffer with a single
+# fill() instead.
+
+
+class AppsrcFeeder:
+    def __init__(self, Gst, cap, caps, width, height, fps, prefetch=4, loop=False, on_loop=None, np=None):
+        self.Gst = Gst
+        self.cap = cap
+        self.np = np
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.dur = int(Gst.SECOND / int(fps or 30))
+        self.loop = loop
+        self.on_loop = on_loop
+        self.ready = queue.Queue(maxsize=max(1, prefetch))
+        self.ts = 0
+        self.frames = 0
+        self.copies = 0
+        self.starved = 0
+        self._stop = threading.Event()
+        self.pool = Gst.BufferPool.new()
+        cfg = self.pool.get_config()
+        # prefetch queued + one in need-data + a few held by queue/encoder
+        Gst.BufferPool.config_set_params(cfg, caps, self.frame_size, 2, prefetch + 6)
+        self.pool.set_config(cfg)
+        self.pool.set_active(True)
+        self._thread = threading.Thread(target=self._reader, name="appsrc-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.pool.set_active(False)
+        except Exception:
+            pass
+
+    def _read_into(self, buf):
+        # Decode directly into the pooled buffer's memory when possible.
+        Gst = self.Gst
+        if self.np is not None:
+            try:
+                ok, info = buf.map(Gst.MapFlags.WRITE)
+            except Exception:
+                ok = False
+            if ok:
+                try:
+                    arr = self.np.ndarray((self.height, self.width, 3), dtype=self.np.uint8, buffer=info.data)
+                    if arr.flags.writeable:
+                        ret, frame = self.cap.read(arr)
+                        if ret and frame is not None and frame.shape == arr.shape and frame.ctypes.data != arr.ctypes.data:
+                            arr[...] = frame
+                            self.copies += 1
+                        return ret
+                    # read-only memoryview from this gst-python build
+                    self.np = None
+                except Exception:
+                    # TypeError/ValueError wrapping the mapping, cv2.error
+                    # when cap.read() refuses the array: use the copy path
+                    self.np = None
+                finally:
+                    buf.unmap(info)
+        ret, frame = self.cap.read()
+        if ret:
+            try:
+                buf.fill(0, frame.data)
+            except TypeError:
+                buf.fill(0, frame.tobytes())
+            self.copies += 1
+        return ret
+
+    def _reader(self):
+        Gst = self.Gst
+        while not self._stop.is_set():
+            try:
+                res, buf = self.pool.acquire_buffer(None)
+            except Exception:
+                break
+            if res != Gst.FlowReturn.OK or buf is None:
+                break
+            ret = False
+            try:
+                ret = self._read_into(buf)
+                if not ret and self.loop:
+                    self.cap.set(1, 0)  # cv2.CAP_PROP_POS_FRAMES
+                    ret = self._read_into(buf)
+                    if ret and self.on_loop is not None:
+                        self.on_loop()
+            except Exception:
+                ret = False
+            if not ret:
+                break
+            if not self._put(buf):
+                return
+        self._put(None)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.ready.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def need_data(self, src, length):
+        try:
+            buf = self.ready.get_nowait()
+        except queue.Empty:
+            self.starved += 1
+            buf = None
+            # Bounded waits, so a reader that died or was stopped ends the
+            # stream instead of blocking the streaming thread forever.
+            while not self._stop.is_set() and self._thread.is_alive():
+                try:
+                    buf = self.ready.get(timeout=0.5)
+                    break
+                except queue.Empty:
+                    pass
+            else:
+                try:
+                    buf = self.ready.get_nowait()
+                except queue.Empty:
+                    pass
+        if buf is None:
+            try:
+                src.end_of_stream()
+            except Exception:
+                pass
+            return
+        buf.pts = self.ts
+        buf.dts = self.ts
+        buf.duration = self.dur
+        self.ts += self.dur
+        src.emit("push-buffer", buf)
+        self.frames += 1
+        if (self.frames % 60) == 0:
+            try:
+                print("APP_SRC_FRAMES", self.frames, "starved", self.starved, "copies", self.copies)
+            except Exception:
+                pass
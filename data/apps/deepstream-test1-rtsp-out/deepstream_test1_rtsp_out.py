@@ -29,9 +29,12 @@ gi.require_version('GstRtspServer', '1.0')
 from gi.repository import GLib, Gst, GstRtspServer
 import platform
 from common.bus_call import bus_call
+from common.applog import get_logger
 
 import pyds
 
+log = get_logger("deepstream-test1-rtsp-out")
+
 PGIE_CLASS_ID_VEHICLE = 0
 PGIE_CLASS_ID_BICYCLE = 1
 PGIE_CLASS_ID_PERSON = 2
@@ -57,7 +60,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
 
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -118,8 +121,12 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
         py_nvosd_text_params.set_bg_clr = 1
         # set(red, green, blue, alpha); set to Black
         py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 1.0)
-        # Using pyds.get_string() to get display_text as string
-        print(pyds.get_string(py_nvosd_text_params.display_text))
+        # Rate-limited per key (DS_LOG_RATE); the full record goes to the
+        # machine channel when DS_LOG_MACHINE is set.
+        log.info("Frame Number=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", frame_number, num_rects,
+                 obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON], key="frame")
+        log.record("frame", {"frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
         pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
         try:
             l_frame=l_frame.next
@@ -13,6 +13,8 @@ try:
     import cv2
 except Exception:
     cv2 = None
+from preconvert import PreconvertJob
+from appsrc_feeder import AppsrcFeeder
 def bus_call(bus, message, loop):
     t = message.type
     if t == Gst.MessageType.EOS:
@@ -337,44 +339,22 @@ def build_pipeline(stream_path, codec, bitrate, enc_type, width_hint, height_hin
         q1.link(mux)
         mux.link(q2)
         q2.link(sink)
-        ts = 0
-        dur = int(Gst.SECOND / int(fps or 30))
-        fcnt = 0
-        def _need_data(src, length):
-            nonlocal ts
-            nonlocal fcnt
+        def _on_loop():
+            loop_stats["seek_loops"] += 1
             try:
-                ret, frame = cap.read()
+                print("LOOP_SEEK", loop_stats["seek_loops"], "rebuilds", loop_stats["rebuilds"])
             except Exception:
-                ret = False
-                frame = None
-            if not ret:
-                try:
-                    src.end_of_stream()
-                except Exception:
-                    pass
-                return
-            try:
-                data = frame.tobytes()
-                buf = Gst.Buffer.new_allocate(None, len(data), None)
-                buf.fill(0, data)
-                buf.pts = ts
-                buf.dts = ts
-                buf.duration = dur
-                ts += dur
-                src.emit("push-buffer", buf)
-                fcnt += 1
-                if (fcnt % 60) == 0:
-                    try:
-                        print("APP_SRC_FRAMES", fcnt)
-                    except Exception:
-                        pass
-            except Exception:
-                try:
-                    src.end_of_stream()
-                except Exception:
-                    pass
-        appsrc.connect("need-data", _need_data)
+                pass
+        try:
+            import numpy as np
+        except Exception:
+            np = None
+        feeder = AppsrcFeeder(Gst, cap, appsrc.get_property("caps"), w, h, fps,
+                              loop=(loop_forever and loop_mode == 'seek'), on_loop=_on_loop, np=np)
+        feeder.start()
+        appsrc.connect("need-data", feeder.need_data)
+        global active_feeder
+        active_feeder = feeder
     else:
         if demux is not None:
             qdemux = Gst.ElementFactory.make("queue", "demux_q")
@@ -428,16 +408,95 @@ def build_pipeline(stream_path, codec, bitrate, enc_type, width_hint, height_hin
     return pipeline
 
 
+loop_stats = {"seek_loops": 0, "rebuilds": 0}
+preconvert_job = None
+active_feeder = None
+preconvert_state = {"switch": False, "loop": None}
+
+def _preconvert_poll():
+    # Reports background transcode progress; once the output is complete the
+    # next loop boundary rebuilds the pipeline on it. A looping appsrc feeder
+    # rewinds in place and never reaches a boundary, so quit the loop here.
+    global stream_path, codec
+    if preconvert_job is None:
+        return False
+    out = preconvert_job.output()
+    if out:
+        print("PRECONVERT_READY", out)
+        stream_path = out
+        codec = "H264"
+        preconvert_state["switch"] = True
+        if active_feeder is not None and active_feeder.loop and preconvert_state["loop"] is not None:
+            try:
+                preconvert_state["loop"].quit()
+            except Exception:
+                pass
+        return False
+    print(preconvert_job.status_line())
+    if not preconvert_job.running():
+        print("PRECONVERT_FAILED, staying on the original input")
+        return False
+    return True
+
+def _segment_seek(pipeline, flush):
+    # Segment seeks end each pass with SEGMENT_DONE instead of EOS, and the
+    # non-flushing re-seek keeps running time (and so the mpegtsmux/hlssink
+    # PTS) continuous across passes.
+    flags = Gst.SeekFlags.SEGMENT
+    if flush:
+        flags |= Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT
+    try:
+        return bool(pipeline.seek(1.0, Gst.Format.TIME, flags, Gst.SeekType.SET, 0, Gst.SeekType.NONE, -1))
+    except Exception:
+        return False
+
+def _make_loop_bus_call(pipeline):
+    def _loop_bus_call(bus, message, loop):
+        if message.type == Gst.MessageType.SEGMENT_DONE:
+            if not preconvert_state["switch"] and _segment_seek(pipeline, False):
+                loop_stats["seek_loops"] += 1
+                try:
+                    print("LOOP_SEEK", loop_stats["seek_loops"], "rebuilds", loop_stats["rebuilds"])
+                except Exception:
+                    pass
+                return True
+            try:
+                loop.quit()
+            except Exception:
+                pass
+            return True
+        return bus_call(bus, message, loop)
+    return _loop_bus_call
+
 def main(args):
     Gst.init(None)
     width_hint = None
     height_hint = None
     loop = GLib.MainLoop()
+    preconvert_state["loop"] = loop
+    seek_mode = loop_forever and loop_mode == 'seek'
+    if preconvert_job is not None and preconvert_job.output() != stream_path:
+        GLib.timeout_add(2000, _preconvert_poll)
     while True:
         pipeline = build_pipeline(stream_path, codec, bitrate, enc_type, width_hint, height_hint)
         bus = pipeline.get_bus()
         bus.add_signal_watch()
-        bus.connect("message", bus_call, loop)
+        # The appsrc feeder rewinds its capture itself, so only the demuxer
+        # paths need the pipeline-level segment seek.
+        if seek_mode and not (opencv_appsrc and cv2 is not None):
+            bus.connect("message", _make_loop_bus_call(pipeline), loop)
+            pipeline.set_state(Gst.State.PAUSED)
+            try:
+                pipeline.get_state(5 * Gst.SECOND)
+            except Exception:
+                pass
+            if not _segment_seek(pipeline, True):
+                try:
+                    print("LOOP_SEEK unsupported, falling back to rebuild")
+                except Exception:
+                    pass
+        else:
+            bus.connect("message", bus_call, loop)
         pipeline.set_state(Gst.State.PLAYING)
         try:
             print("PIPELINE_PLAYING")
@@ -451,8 +510,16 @@ def main(args):
             pipeline.set_state(Gst.State.NULL)
         except Exception:
             pass
+        if active_feeder is not None:
+            active_feeder.stop()
         if not loop_forever:
             break
+        preconvert_state["switch"] = False
+        loop_stats["rebuilds"] += 1
+        try:
+            print("LOOP_REBUILD", loop_stats["rebuilds"], "seek_loops", loop_stats["seek_loops"])
+        except Exception:
+            pass
         try:
             GLib.usleep(100000)
         except Exception:
@@ -469,6 +536,7 @@ def parse_args():
     parser.add_argument("-b", "--bitrate", default=4000000, type=int)
     parser.add_argument("-e", "--enc_type", default=0, choices=[0, 1], type=int)
     parser.add_argument("--loop", default=True, action='store_true')
+    parser.add_argument("--loop_mode", default="seek", choices=['seek', 'rebuild'])
     parser.add_argument("--hls_time", default=2, type=int)
     parser.add_argument("--hls_list_size", default=5, type=int)
     parser.add_argument("--opencv_preconvert", default=False, action='store_true')
@@ -478,12 +546,13 @@ def parse_args():
         parser.print_help(sys.stderr)
         sys.exit(1)
     args = parser.parse_args()
-    global codec, bitrate, stream_path, enc_type, loop_forever, hls_time, hls_list_size, opencv_appsrc, simple_hls
+    global codec, bitrate, stream_path, enc_type, loop_forever, loop_mode, hls_time, hls_list_size, opencv_appsrc, simple_hls
     codec = args.codec
     bitrate = args.bitrate
     stream_path = args.input
     enc_type = args.enc_type
     loop_forever = bool(args.loop)
+    loop_mode = args.loop_mode
     hls_time = int(args.hls_time)
     hls_list_size = int(args.hls_list_size)
     opencv_appsrc = bool(args.opencv_appsrc)
@@ -494,45 +563,21 @@ def parse_args():
     except Exception:
         need_convert = False
     if need_convert:
+        # Cached by content; a miss starts a background transcode and playback
+        # begins on the original right away (see preconvert.py).
+        global preconvert_job
         try:
-            cap = cv2.VideoCapture(stream_path)
-            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-            w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 1920)
-            h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 1080)
-            fourcc = None
-            try:
-                fourcc = cv2.VideoWriter_fourcc(*'H264')
-            except Exception:
-                pass
-            if not fourcc:
-                try:
-                    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-                except Exception:
-                    fourcc = 0
-            out_path_raw = "/data/videos/_preconvert.h264"
-            out_path_mp4 = "/data/videos/_preconvert.mp4"
-            dst_path = out_path_raw
-            writer = cv2.VideoWriter(dst_path, fourcc, fps, (w, h))
-            if not writer.isOpened():
-                dst_path = out_path_mp4
-                writer = cv2.VideoWriter(dst_path, fourcc, fps, (w, h))
-            ok_total = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                writer.write(frame)
-                ok_total += 1
-            try:
-                writer.release()
-                cap.release()
-            except Exception:
-                pass
-            if ok_total > 0:
-                stream_path = dst_path
+            preconvert_job = PreconvertJob(stream_path)
+            out = preconvert_job.output()
+            if out:
+                print("PRECONVERT_CACHED", out)
+                stream_path = out
                 codec = "H264"
+            else:
+                preconvert_job.start()
+                print(preconvert_job.status_line())
         except Exception:
-            pass
+            preconvert_job = None
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sys
+import subprocess
+import time
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# Cached, content-addressed --opencv_preconvert stage.
+#
+# The transcode runs in a separate process and writes into
+#   <cache>/<key>/          key = sha1(abspath | mtime_ns | size)[:16]
+#     progress.json         frames, total, segments, done, output
+#     seg_00000.h264 ...    finished raw H.264 segments (resume points)
+#     out.h264 | out.mp4    final output once done
+# Raw Annex-B segments are byte-concatenable, so an interrupted transcode
+# resumes from the last finished segment. If the OpenCV build cannot write
+# raw H.264 the whole file is written as one mp4 instead.
+#
+#   python3 preconvert.py <input> [<cache-dir>]   (what PreconvertJob.start runs)
+
+CACHE_ROOT = os.environ.get('DS_PRECONVERT_CACHE', '/data/videos/.preconvert')
+SEGMENT_S = int(os.environ.get('DS_PRECONVERT_SEGMENT_S', '10'))
+
+
+def cache_key(path):
+    st = os.stat(path)
+    ident = "%s|%d|%d" % (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except Exception:
+        return False
+
+
+class PreconvertJob:
+    def __init__(self, src, cache_root=CACHE_ROOT):
+        self.src = src
+        self.key = cache_key(src)
+        self.dir = os.path.join(cache_root, self.key)
+        self.proc = None
+
+    def progress(self):
+        return _read_json(os.path.join(self.dir, "progress.json"))
+
+    def output(self):
+        p = self.progress()
+        out = p.get("output")
+        if p.get("done") and out and os.path.isfile(out):
+            return out
+        return None
+
+    def running(self):
+        if self.proc is not None and self.proc.poll() is None:
+            return True
+        lock = _read_json(os.path.join(self.dir, "lock.json"))
+        return bool(lock.get("pid")) and _pid_alive(lock["pid"])
+
+    def start(self):
+        # No-op when the output is cached or another launch is converting.
+        if self.output() or self.running():
+            return False
+        os.makedirs(self.dir, exist_ok=True)
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.src, self.dir],
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return True
+
+    def status_line(self):
+        p = self.progress()
+        total = p.get("total") or 0
+        frames = p.get("frames") or 0
+        pct = (100.0 * frames / total) if total else 0.0
+        return "PRECONVERT_PROGRESS key=%s frames=%d/%d (%.1f%%) segments=%d" % (
+            self.key, frames, total, pct, p.get("segments", 0))
+
+
+def _fourcc():
+    for code in ('H264', 'avc1'):
+        try:
+            f = cv2.VideoWriter_fourcc(*code)
+            if f:
+                return f
+        except Exception:
+            pass
+    return 0
+
+
+def _open_writer(path, fourcc, fps, size):
+    w = cv2.VideoWriter(path, fourcc, fps, size)
+    if not w.isOpened():
+        return None
+    return w
+
+
+def _segments(out_dir, ext):
+    n = 0
+    while os.path.isfile(os.path.join(out_dir, "seg_%05d.%s" % (n, ext))):
+        n += 1
+    return n
+
+
+def run(src, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    lock_path = os.path.join(out_dir, "lock.json")
+    _write_json(lock_path, {"pid": os.getpid(), "started": time.time()})
+    prog_path = os.path.join(out_dir, "progress.json")
+    try:
+        cap = cv2.VideoCapture(src)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 1920)
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 1080)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fourcc = _fourcc()
+        ext = "h264"
+        probe = os.path.join(out_dir, "probe.h264")
+        pw = _open_writer(probe, fourcc, fps, (w, h))
+        if pw is None:
+            ext = "mp4"
+        else:
+            pw.release()
+        try:
+            os.remove(probe)
+        except Exception:
+            pass
+        seg_frames = int(fps * SEGMENT_S) if ext == "h264" else 0
+        done_segs = _segments(out_dir, ext) if seg_frames else 0
+        frames = done_segs * seg_frames
+        if frames:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frames)
+        state = {"src": src, "fps": fps, "width": w, "height": h, "total": total, "ext": ext,
+                 "frames": frames, "segments": done_segs, "done": False, "output": None}
+        _write_json(prog_path, state)
+        seg = done_segs
+        while True:
+            # The writer picks its container from the extension, so it stays last.
+            part = os.path.join(out_dir, "seg_%05d.part.%s" % (seg, ext))
+            writer = _open_writer(part, fourcc, fps, (w, h))
+            if writer is None:
+                break
+            n = 0
+            while not seg_frames or n < seg_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                n += 1
+                frames += 1
+                if (frames % 30) == 0:
+                    state["frames"] = frames
+                    _write_json(prog_path, state)
+            writer.release()
+            if n == 0:
+                os.remove(part)
+                break
+            os.replace(part, os.path.join(out_dir, "seg_%05d.%s" % (seg, ext)))
+            seg += 1
+            state["frames"] = frames
+            state["segments"] = seg
+            _write_json(prog_path, state)
+            if seg_frames and n < seg_frames:
+                break
+            if not seg_frames:
+                break
+        cap.release()
+        if seg == 0:
+            return 1
+        out = os.path.join(out_dir, "out." + ext)
+        if ext == "h264":
+            with open(out + ".part", "wb") as dst:
+                for i in range(seg):
+                    with open(os.path.join(out_dir, "seg_%05d.h264" % i), "rb") as f:
+                        while True:
+                            chunk = f.read(1 << 20)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+            os.replace(out + ".part", out)
+        else:
+            os.replace(os.path.join(out_dir, "seg_00000.mp4"), out)
+        state["done"] = True
+        state["output"] = out
+        _write_json(prog_path, state)
+        return 0
+    finally:
+        try:
+            os.remove(lock_path)
+        except Exception:
+            pass
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or cv2 is None:
+        sys.stderr.write("usage: %s <input> [<cache-dir>] (needs cv2)\n" % sys.argv[0])
+        sys.exit(1)
+    src = sys.argv[1]
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(CACHE_ROOT, cache_key(src))
+    sys.exit(run(src, out_dir))
@@ -43,6 +43,11 @@ except Exception:
             return True
     platform_info = _PI()
 from common.bus_call import bus_call
+from common.applog import get_logger
+try:
+    from common.snapshot_catalog import SnapshotCatalog, default_db
+except Exception:
+    SnapshotCatalog = None
 
 try:
     import pyds as pyds
@@ -57,6 +62,8 @@ try:
 except Exception:
     roslibpy = None
 
+log = get_logger("deepstream-test1-usb")
+
 PGIE_CLASS_ID_VEHICLE = 0
 PGIE_CLASS_ID_BICYCLE = 1
 PGIE_CLASS_ID_PERSON = 2
@@ -79,7 +86,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
 
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return Gst.PadProbeReturn.OK
 
     # Retrieve batch metadata from the gst_buffer
@@ -142,8 +149,9 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
         py_nvosd_text_params.set_bg_clr = 1
         # set(red, green, blue, alpha); set to Black
         py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 1.0)
-        # Using pyds.get_string() to get display_text as string
-        print(pyds.get_string(py_nvosd_text_params.display_text))
+        log.info("Frame Number=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", frame_number, num_rects,
+                 obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON], key="frame")
+        log.record("detections", {"frame": frame_number, "detections": dets})
         pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
         try:
             _publish_detections(frame_number, dets)
@@ -178,6 +186,15 @@ def main(args):
     snap_period_ms = {"value": 1000}
     last_snap = {"ts": 0}
     out_dir = {"path": "/data/ds/datasets/autocap"}
+    # Same catalog as deepstream_test_1_usb_ros.py, so jetson-web can keep
+    # listing the directory from it; DS_SNAPSHOT_CATALOG=0 turns it off.
+    snap_catalog = None
+    if SnapshotCatalog is not None and os.getenv('DS_SNAPSHOT_CATALOG', '') != '0':
+        try:
+            os.makedirs(out_dir["path"], exist_ok=True)
+            snap_catalog = SnapshotCatalog(default_db(out_dir["path"]), out_dir["path"])
+        except Exception as e:
+            sys.stderr.write("Snapshot catalog disabled: %s\n" % e)
     def _on_start(_):
         snap_enabled["value"] = True
     def _on_stop(_):
@@ -227,6 +244,16 @@ def main(args):
         _write_file(os.path.join(out_dir["path"], base_name + "_clean.jpg"), clean_bytes)
         _write_file(os.path.join(out_dir["path"], base_name + "_osd.jpg"), osd_bytes)
         _write_file(os.path.join(out_dir["path"], base_name + "_meta.json"), meta_json.encode("utf-8"))
+        if snap_catalog is None:
+            return
+        try:
+            meta = __import__("json").loads(meta_json)
+            for kind, suffix in (("clean", "_clean.jpg"), ("osd", "_osd.jpg"), ("meta", "_meta.json")):
+                path = os.path.join(out_dir["path"], base_name + suffix)
+                if os.path.exists(path):
+                    snap_catalog.add(path, kind, int(base_name), 0, None, meta.get("frame"), meta.get("detections"))
+        except Exception as e:
+            sys.stderr.write("Snapshot catalog: %s\n" % e)
 
     det_buf = {"frame": 0, "dets": []}
     def _publish_detections(frame_num, dets):
@@ -24,6 +24,7 @@ import sys
 import os
 import time
 import threading
+import signal
 sys.path.insert(0, '/data/ds')
 sys.path.insert(0, '/data/ds/common')
 sys.path.insert(0, '/opt/nvidia/deepstream/deepstream/lib/python')
@@ -45,6 +46,32 @@ except Exception:
     platform_info = _PI()
 from common.bus_call import bus_call
 from common.utils import long_to_uint64
+from common.FPS import PERF_DATA
+from common.decode_select import GstFactory, DecodeTimer, build_decode_chain
+from common.snapshot_gate import SnapshotGate
+from common.snapshot_policy import SnapshotPolicy
+from common.snapshot_catalog import SnapshotCatalog, default_db
+from common.retention import RetentionManager
+from common.mqtt_spool import SegmentSpool
+from common.mqtt_transport import MqttTransport
+from common.relay import RelayClient, RelayServer
+from common.telemetry import TelemetrySampler
+from common.stack_profiler import StackProfiler
+from common.frame_ring import FrameRing
+from common.sched_plan import ThreadPlanner, auto_policy, parse_policy
+from common.applog import get_logger
+from common.app_config import Setting, ConfigStore, ConfigError
+try:
+    from common.snapshot_dedup import SnapshotDedup
+except Exception:
+    SnapshotDedup = None
+try:
+    from common.zones import ZoneEngine
+except Exception:
+    ZoneEngine = None
+from common.topology import plan_pipeline
+from common.clip_recorder import (UNTRACKED_OBJECT_ID, EncodedRing, TriggerRules, ClipRecorder,
+                                  GstClipWriter, frame_from_sample)
 
 try:
     import pyds_ext as pyds
@@ -70,105 +97,430 @@ PGIE_CLASS_ID_ROADSIGN = 3
 MUXER_BATCH_TIMEOUT_USEC = 33000
 MAX_TIME_STAMP_LEN = 32
 
+# Every DS_* setting of this app, parsed once at startup (common/app_config.py).
+# reload=True settings can be changed at run time through DS_CONFIG_FILE
+# (file change or SIGHUP); the rest need a restart. Per-camera DS_CAM<i>_*
+# keys are read through Config.raw().
+SETTINGS = [
+    Setting('DS_OUTPUT_MODE', str, 'display'),
+    Setting('DS_DISABLE_INFER', bool, False),
+    Setting('DS_PGIE_CONFIG', str, ''),
+    Setting('DS_MUX_WIDTH', int, 0, min=0),
+    Setting('DS_MUX_HEIGHT', int, 0, min=0),
+    Setting('DS_DISPLAY_CAM', int, 0, min=0),
+    Setting('DS_USE_EGL', bool, False),
+    Setting('DS_ENABLE_CAPTION', bool, False),
+    Setting('DS_MJPEG_DECODER', str, 'auto', choices=('auto', 'nvv4l2decoder', 'nvjpegdec', 'jpegdec')),
+    Setting('DS_PERF_INTERVAL_MS', int, 5000, min=0),
+    Setting('DS_DETECTIONS_JSONL', str, '/tmp/ds_usb_detections.jsonl'),
+    Setting('DS_ROS_HOST', str, 'localhost'),
+    Setting('DS_ROS_PORT', int, 9090, min=1, max=65535),
+    Setting('DS_SNAPSHOT_DIR', str, '/data/ds/datasets/autocap'),
+    Setting('DS_SNAPSHOT_PERIOD_MS', int, 0, reload=True, min=0),
+    Setting('DS_SNAPSHOT_POLICY', str, '', reload=True),
+    Setting('DS_SNAPSHOT_CATALOG', str, ''),
+    Setting('DS_SNAPSHOT_DEDUP', str, '0'),
+    Setting('DS_SNAPSHOT_DEDUP_DIST', int, 6, min=0),
+    Setting('DS_SNAPSHOT_DEDUP_SIZE', int, 2048, min=1),
+    Setting('DS_SNAPSHOT_DEDUP_MAX_AGE_S', float, 0.0, min=0),
+    Setting('DS_RETENTION_MAX_GB', float, 0.0, min=0),
+    Setting('DS_RETENTION_MAX_FILES', int, 0, min=0),
+    Setting('DS_RETENTION_MAX_AGE_H', float, 0.0, min=0),
+    Setting('DS_RETENTION_MIN_FREE_GB', float, 0.0, min=0),
+    Setting('DS_RETENTION_INTERVAL_S', float, 10.0, min=0.1),
+    Setting('DS_CLIP_ENABLE', bool, False),
+    Setting('DS_CLIP_DIR', str, '/data/ds/datasets/clips'),
+    Setting('DS_CLIP_CONTAINER', str, 'mp4'),
+    Setting('DS_CLIP_BITRATE', int, 4000000, min=1),
+    Setting('DS_CLIP_GOP', int, 30, min=1),
+    Setting('DS_CLIP_RING_S', float, 20.0, min=0),
+    Setting('DS_CLIP_RING_MB', int, 64, min=1),
+    Setting('DS_CLIP_PRE_S', float, 5.0, min=0),
+    Setting('DS_CLIP_POST_S', float, 5.0, min=0),
+    Setting('DS_CLIP_MAX_S', float, 120.0, min=0),
+    # Trigger rules; TriggerRules.from_env() reads them through Config.raw().
+    Setting('DS_CLIP_CLASSES', str, ''),
+    Setting('DS_CLIP_MIN_COUNT', int, 0, min=0),
+    Setting('DS_CLIP_COUNT_CLASS', str, ''),
+    Setting('DS_CLIP_NEW_TRACK', bool, False),
+    Setting('DS_MQTT_HOST', str, '127.0.0.1'),
+    Setting('DS_MQTT_PORT', int, 1883, min=1, max=65535),
+    Setting('DS_MQTT_TOPIC', str, 'deepstream/detections', reload=True),
+    Setting('DS_MQTT_SNAP_TOPIC', str, 'deepstream/snap', reload=True),
+    Setting('DS_MQTT_QOS', int, 0, choices=(0, 1, 2)),
+    Setting('DS_MQTT_DET_QUEUE', int, 512, min=1),
+    Setting('DS_MQTT_SNAP_QUEUE', int, 4, min=1),
+    Setting('DS_MQTT_INFLIGHT', int, 20, min=1),
+    Setting('DS_MQTT_REPLAY_RATE', float, 200.0, reload=True, min=0),
+    Setting('DS_MQTT_SPOOL_DIR', str, '/data/ds/spool/mqtt'),
+    Setting('DS_MQTT_SPOOL_SEGMENT_MB', float, 4.0, min=0.001),
+    Setting('DS_MQTT_SPOOL_MB', float, 256.0, min=0),
+    Setting('DS_MQTT_HEARTBEAT_S', float, 1.0, min=0.05),
+    Setting('DS_ENABLE_MSG', bool, True),
+    Setting('DS_MQTT_PROTO_LIB', str, '/opt/nvidia/deepstream/deepstream-6.0/lib/libnvds_mqtt_proto.so'),
+    Setting('DS_MQTT_CONN_STR', str, '127.0.0.1;1883'),
+    Setting('DS_MSGCONV_CONFIG', str, '/app/share/dstest4_msgconv_config.txt'),
+    Setting('DS_MSGCONV_PAYLOAD_TYPE', int, 0, min=0),
+    Setting('DS_TELEMETRY', bool, True),
+    Setting('DS_TELEMETRY_ROOT', str, '/'),
+    Setting('DS_TELEMETRY_INTERVAL_S', float, 1.0, min=0.05),
+    Setting('DS_TELEMETRY_FULL_EVERY', int, 30, min=1),
+    Setting('DS_PROFILE', bool, False),
+    Setting('DS_PROFILE_INTERVAL_MS', float, 20.0, min=1),
+    Setting('DS_PROFILE_MAX_OVERHEAD_PCT', float, 1.0, min=0),
+    Setting('DS_PROFILE_DIR', str, '/data/ds/profiles'),
+    Setting('DS_FRAME_RING', str, ''),
+    Setting('DS_FRAME_RING_SLOTS', int, 8, min=2),
+    Setting('DS_FRAME_RING_SLOT_KB', int, 1024, min=16),
+    Setting('DS_CONFIG_WATCH_S', float, 2.0, min=0),
+    Setting('DS_SCHED_POLICY', str, ''),
+    Setting('DS_PUBLISH_SOCK', str, ''),
+    Setting('DS_WORKER_ID', str, ''),
+    Setting('DS_ROI_FILE', str, '/data/ds/configs/roi.json'),
+    Setting('DS_ROI_ANCHOR', str, 'bottom', reload=True, choices=('bottom', 'center')),
+    Setting('DS_ROI_TTL_S', float, 2.0, reload=True, min=0),
+]
+
 det_buf = {"frame": 0, "dets": []}
+det_bufs = {0: det_buf}
 det_pub = None
-mqtt_client = None
-mqtt_side = None
-def _mqtt_publish(topic, payload):
-    if mqtt_client is None:
+img_b64_pub = None
+det_pubs = {}
+img_b64_pubs = {}
+cams = []
+# Detections go to the machine channel, on stdout by default so the web
+# Output tab and replay_session.py keep reading them from the app log.
+log = get_logger("deepstream-test1-usbcam", machine="-")
+perf_data = None
+decode_timers = {}
+clip_recorders = {}
+clip_rules = {}
+snap_dedup = None
+snap_catalog = None
+snap_retention = None
+telemetry = None
+profiler = None
+frame_ring = None
+mqtt_out = None
+relay_server = None
+sched_plan = None
+zone_engine = None
+worker_id = ""  # set under deepstream_usb_supervisor.py with several workers
+config = None   # ConfigStore; hot paths read config.current once per call
+def _mqtt_publish(topic, payload, channel="detections"):
+    if mqtt_out is None:
         return
     try:
-        mqtt_client.publish(topic, payload, qos=0, retain=False)
+        mqtt_out.publish(channel, topic, payload)
     except Exception:
         pass
-def _mqtt_heartbeat_start():
-    if mqtt_client is None:
+def _mqtt_heartbeat():
+    # Runs on the MQTT transport thread every DS_MQTT_HEARTBEAT_S.
+    hb = {'type':'heartbeat','ts':int(time.time()*1000)}
+    if snap_retention is not None:
+        hb['storage'] = snap_retention.stats()
+    hb['mqtt'] = mqtt_out.stats()
+    if telemetry is not None:
+        hb['telemetry'] = telemetry.delta()
+    if profiler is not None and profiler.running():
+        hb['profiler'] = profiler.stats()
+    if frame_ring is not None:
+        hb['frame_ring'] = frame_ring.stats()
+    if relay_server is not None:
+        hb['relay'] = relay_server.stats()
+    if zone_engine is not None:
+        hb['zones'] = zone_engine.stats()
+    hb['config'] = config.stats()
+    _mqtt_publish(_cam_topic(config.current.mqtt_topic), __import__("json").dumps(hb), "heartbeat")
+def _publish_channels(out, spool=None, heartbeat_queue=2):
+    cfg = config.current
+    out.channel("heartbeat", priority=0, max_queue=heartbeat_queue)
+    out.channel("detections", priority=1, qos=cfg.mqtt_qos,
+                max_queue=cfg.mqtt_det_queue, spool=spool,
+                inflight=cfg.mqtt_inflight,
+                replay_rate=cfg.mqtt_replay_rate)
+    out.channel("snapshots", priority=2, max_queue=cfg.mqtt_snap_queue)
+    if telemetry is not None:
+        out.every(cfg.telemetry_interval_s, telemetry.sample)
+    out.every(cfg.mqtt_heartbeat_s, _mqtt_heartbeat)
+    return out.start()
+def _mqtt_start(host, port, heartbeat_queue=2):
+    # One connection and one thread for heartbeat, detections and snapshots
+    # (common/mqtt_transport.py). Detections are spooled to disk while the
+    # broker is unreachable unless DS_MQTT_SPOOL_DIR=0.
+    transport = MqttTransport(mqtt.Client(), host, port)
+    cfg = config.current
+    spool = None
+    if cfg.mqtt_spool_dir not in ('', '0'):
+        try:
+            mb = 1 << 20
+            spool = SegmentSpool(cfg.mqtt_spool_dir,
+                                 segment_bytes=cfg.mqtt_spool_segment_mb * mb,
+                                 max_bytes=cfg.mqtt_spool_mb * mb)
+        except Exception as e:
+            sys.stderr.write("MQTT spool disabled: %s\n" % e)
+    return _publish_channels(transport, spool, heartbeat_queue)
+def _relay_start(path, name):
+    # Under the supervisor: the same channels, sent to the publisher process
+    # over a unix socket (common/relay.py), which owns the broker connection.
+    return _publish_channels(RelayClient(path, name))
+
+def publisher_main(args):
+    # deepstream_test_1_usb_ros.py --publisher: no pipeline; forwards what the
+    # workers send on DS_PUBLISH_SOCK to one MQTT connection.
+    global config, mqtt_out, relay_server
+    try:
+        config = ConfigStore(SETTINGS, path=os.getenv('DS_CONFIG_FILE'))
+    except ConfigError as e:
+        sys.stderr.write("Invalid configuration:\n%s\n" % e)
+        return 2
+    cfg = config.current
+    if mqtt is None:
+        sys.stderr.write("publisher needs paho-mqtt\n")
+        return 2
+    if not cfg.publish_sock:
+        sys.stderr.write("publisher needs DS_PUBLISH_SOCK\n")
+        return 2
+    mqtt_out = _mqtt_start(cfg.mqtt_host, cfg.mqtt_port, heartbeat_queue=16)
+    relay_server = RelayServer(cfg.publish_sock, lambda peer, ch, topic, payload: mqtt_out.publish(ch, topic, payload))
+    relay_server.start()
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    report_s = cfg.perf_interval_ms / 1000.0 if cfg.perf_interval_ms > 0 else 5.0
+    while not stop.wait(report_s):
+        print("PUBLISHER", __import__("json").dumps({"relay": relay_server.stats(), "mqtt": mqtt_out.stats()}), flush=True)
+    relay_server.stop()
+    mqtt_out.stop()
+    return 0
+
+def _on_profile(cmd):
+    # "start [interval_ms]", "stop" (also dumps), "dump [name]", "reset", "status".
+    # Driven by SIGUSR2 (toggle) and /deepstream/profiler.
+    if profiler is None:
         return
-    topic = os.getenv('DS_MQTT_TOPIC', 'deepstream/detections')
-    stop_flag = {'v': False}
-    def _run():
-        import json
-        while not stop_flag['v']:
-            try:
-                _mqtt_publish(topic, json.dumps({'type':'heartbeat','ts':int(time.time()*1000)}))
-            except Exception:
-                pass
-            time.sleep(1)
+    words = (cmd or "").split()
+    op = words[0] if words else "toggle"
     try:
-        t = threading.Thread(target=_run, daemon=True)
-        t.start()
-    except Exception:
-        pass
+        result = None
+        if op == "toggle":
+            result = profiler.toggle()
+        elif op == "start":
+            profiler.start(int(words[1]) / 1000.0 if len(words) > 1 else None)
+        elif op == "stop":
+            if profiler.stop():
+                result = profiler.dump()
+        elif op == "dump":
+            path = None
+            if len(words) > 1:
+                # The topic is unauthenticated: only a file name, kept under
+                # DS_PROFILE_DIR.
+                name = words[1]
+                if name in ('.', '..') or '/' in name or '\\' in name or '\0' in name:
+                    raise ValueError("dump takes a file name, not a path")
+                path = os.path.join(profiler.out_dir, name)
+            result = profiler.dump(path)
+        elif op == "reset":
+            profiler.reset()
+        elif op != "status":
+            raise ValueError("unknown command")
+        out = profiler.stats()
+        if result:
+            out["path"] = result
+        print("PROFILE", __import__("json").dumps(out))
+    except Exception as e:
+        sys.stderr.write("Ignoring profiler command %r: %s\n" % (cmd, e))
+
+def _on_roi(data):
+    # /deepstream/roi (the /api/roi payload of jetson-web, see common/zones.py);
+    # the new zones apply from the next frame and are saved to DS_ROI_FILE.
+    if zone_engine is None:
+        sys.stderr.write("Ignoring roi update: zones need numpy\n")
+        return
+    j = __import__("json")
+    try:
+        payload = j.loads(data) if isinstance(data, str) else data
+        if isinstance(payload, dict) and payload.get("worker") not in (None, worker_id):
+            return
+        done = zone_engine.update(payload)
+        path = config.current.roi_file
+        if path not in ('', '0'):
+            zone_engine.save(path)
+        print("ROI", j.dumps({"version": zone_engine.version, "applied": done}))
+    except Exception as e:
+        sys.stderr.write("Ignoring roi update %r: %s\n" % (data, e))
+
+def _on_sigusr2():
+    _on_profile("toggle")
+    return GLib.SOURCE_CONTINUE
 snap_state = {"base": None, "deadline": 0, "meta": "", "meta_saved": False, "saved_kinds": set()}
-def _publish_snap_mqtt(image_bytes, ts_ms, suffix):
+
+def _cam_env(index, key, default):
+    # DS_CAM<i>_<KEY> overrides DS_CAM_<KEY> for camera i.
+    cfg = config.current
+    v = cfg.raw('DS_CAM%d_%s' % (index, key))
+    if v is None or v == '':
+        v = cfg.raw('DS_CAM_%s' % key, default)
+    return v
+
+def _cam_settings(index, device):
+    return {
+        "index": index,
+        "device": device,
+        "caps": _cam_env(index, 'CAPS', 'video/x-raw'),
+        "width": int(_cam_env(index, 'WIDTH', '1280')),
+        "height": int(_cam_env(index, 'HEIGHT', '720')),
+        "fps": _cam_env(index, 'FPS', '30/1'),
+    }
+
+def _multi_cam():
+    return len(cams) > 1
+
+def _cam_topic(base, cam=None):
+    if worker_id:
+        base = "%s/%s" % (base, worker_id)
+    if cam is None or not _multi_cam():
+        return base
+    return "%s/cam%d" % (base, cam)
+
+def _det_buf(cam):
+    b = det_bufs.get(cam)
+    if b is None:
+        b = {"frame": 0, "dets": []}
+        det_bufs[cam] = b
+    return b
+
+def _publish_snap_mqtt(image_bytes, ts_ms, suffix, cam=0):
     try:
-        if mqtt_side is None:
+        if mqtt_out is None:
             return
         if suffix != "osd":
             return
         import base64
         j = __import__("json")
-        cam = {
-            "device": os.getenv('DS_CAM_DEVICE', '/dev/video0'),
-            "width": int(os.getenv('DS_CAM_WIDTH', '640')),
-            "height": int(os.getenv('DS_CAM_HEIGHT', '480')),
-            "fps": os.getenv('DS_CAM_FPS', '30/1'),
-            "caps": os.getenv('DS_CAM_CAPS', 'image/jpeg')
-        }
+        if cam < len(cams):
+            c = cams[cam]
+            cam_info = {"device": c["device"], "width": c["width"], "height": c["height"], "fps": c["fps"], "caps": c["caps"]}
+        else:
+            cfg = config.current
+            cam_info = {
+                "device": cfg.raw('DS_CAM_DEVICE', '/dev/video0'),
+                "width": int(cfg.raw('DS_CAM_WIDTH', '640')),
+                "height": int(cfg.raw('DS_CAM_HEIGHT', '480')),
+                "fps": cfg.raw('DS_CAM_FPS', '30/1'),
+                "caps": cfg.raw('DS_CAM_CAPS', 'image/jpeg')
+            }
+        if _multi_cam():
+            cam_info["index"] = cam
+        buf = _det_buf(cam)
         payload = {
             "ts_ms": int(ts_ms),
-            "frame_id": int(det_buf["frame"]),
-            "cam": cam,
+            "frame_id": int(buf["frame"]),
+            "cam": cam_info,
             "image_b64": base64.b64encode(image_bytes).decode("ascii"),
-            "detections": det_buf["dets"],
+            "detections": buf["dets"],
             "meta": {"osd": True}
         }
-        topic = os.getenv('DS_MQTT_SNAP_TOPIC', 'deepstream/snap')
-        mqtt_side.publish(topic, j.dumps(payload), qos=0, retain=False)
+        topic = _cam_topic(config.current.mqtt_snap_topic, cam)
+        _mqtt_publish(topic, j.dumps(payload), "snapshots")
     except Exception:
         pass
 
-def _publish_detections(frame_num, dets):
-    det_buf["frame"] = int(frame_num)
-    det_buf["dets"] = dets
-    payload = {"frame": det_buf["frame"], "detections": det_buf["dets"]}
+def _publish_detections(frame_num, dets, cam=0, zones=None):
+    cfg = config.current
+    buf = _det_buf(cam)
+    buf["frame"] = int(frame_num)
+    buf["dets"] = dets
+    payload = {"frame": buf["frame"], "detections": buf["dets"]}
+    if _multi_cam():
+        payload["cam"] = cam
+    if zones is not None:
+        payload["zones"] = zones
     try:
-        det_pub.publish(roslibpy.Message({"data": __import__("json").dumps(payload)}))
+        pub = det_pubs.get(cam, det_pub if cam == 0 else None)
+        pub.publish(roslibpy.Message({"data": __import__("json").dumps(payload)}))
     except Exception:
         pass
     try:
         j = __import__("json").dumps(payload)
-        print(j, flush=True)
-        print("JSON_DET:" + j, flush=True)
-        if mqtt_client is not None:
-            try:
-                mqtt_client.publish(os.getenv('DS_MQTT_TOPIC', 'deepstream/detections'), j, qos=0, retain=False)
-            except Exception:
-                pass
+        log.record("detections", payload)
+        _mqtt_publish(_cam_topic(cfg.mqtt_topic, cam), j)
     except Exception:
         pass
     try:
         line = __import__("json").dumps(payload) + "\n"
-        with open("/tmp/ds_usb_detections.jsonl", "a") as f:
+        with open(cfg.detections_jsonl, "a") as f:
             f.write(line)
     except Exception:
         pass
 
+def _publish_img_b64(data_bytes, stamp, suffix, cam=0):
+    pub = img_b64_pubs.get(cam, img_b64_pub if cam == 0 else None)
+    if pub is None:
+        return
+    import base64
+    payload = {"stamp": int(stamp*1000), "kind": suffix, "data_b64": base64.b64encode(data_bytes).decode("ascii")}
+    if _multi_cam():
+        payload["cam"] = cam
+    try:
+        pub.publish(roslibpy.Message({"data": __import__("json").dumps(payload)}))
+    except Exception:
+        pass
+
+def _ensure_dir(path):
+    try:
+        os.makedirs(path, exist_ok=True)
+    except Exception:
+        pass
+
+def _write_file(path, data_bytes):
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data_bytes)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        return False
+
+def _obj_det(obj_meta):
+    r = obj_meta.rect_params
+    det = {"class_id": int(obj_meta.class_id), "left": float(r.left), "top": float(r.top), "width": float(r.width), "height": float(r.height), "confidence": float(obj_meta.confidence)}
+    if obj_meta.object_id != UNTRACKED_OBJECT_ID:
+        det["object_id"] = int(obj_meta.object_id)
+    return det
+
+def _buffer_dets(gst_buffer):
+    # Detections of the first frame in the buffer's batch (post-demux branches
+    # carry one frame); None when no batch meta is available.
+    if pyds is None or gst_buffer is None:
+        return None
+    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
+    if batch_meta is None or batch_meta.frame_meta_list is None:
+        return None
+    try:
+        frame_meta = pyds.NvDsFrameMeta.cast(batch_meta.frame_meta_list.data)
+    except StopIteration:
+        return None
+    dets = []
+    l_obj = frame_meta.obj_meta_list
+    while l_obj is not None:
+        try:
+            dets.append(_obj_det(pyds.NvDsObjectMeta.cast(l_obj.data)))
+            l_obj = l_obj.next
+        except StopIteration:
+            break
+    return dets
+
 def osd_sink_pad_buffer_probe(pad,info,u_data):
     frame_number=0
-    obj_counter = {
-        PGIE_CLASS_ID_VEHICLE:0,
-        PGIE_CLASS_ID_PERSON:0,
-        PGIE_CLASS_ID_BICYCLE:0,
-        PGIE_CLASS_ID_ROADSIGN:0
-    }
     num_rects=0
     if pyds is None:
         return Gst.PadProbeReturn.OK
 
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return Gst.PadProbeReturn.OK
 
     batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
@@ -181,6 +533,15 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
 
         frame_number=frame_meta.frame_num
         num_rects = frame_meta.num_obj_meta
+        cam_index = frame_meta.pad_index
+        if perf_data is not None:
+            perf_data.update_fps("stream{0}".format(cam_index))
+        obj_counter = {
+            PGIE_CLASS_ID_VEHICLE:0,
+            PGIE_CLASS_ID_PERSON:0,
+            PGIE_CLASS_ID_BICYCLE:0,
+            PGIE_CLASS_ID_ROADSIGN:0
+        }
         dets = []
         l_obj=frame_meta.obj_meta_list
         while l_obj is not None:
@@ -189,8 +550,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             except StopIteration:
                 break
             obj_counter[obj_meta.class_id] += 1
-            r = obj_meta.rect_params
-            dets.append({"class_id": int(obj_meta.class_id), "left": float(r.left), "top": float(r.top), "width": float(r.width), "height": float(r.height), "confidence": float(obj_meta.confidence)})
+            dets.append(_obj_det(obj_meta))
             try: 
                 l_obj=l_obj.next
             except StopIteration:
@@ -216,10 +576,10 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
                         msg_meta.trackingId = long_to_uint64(obj_meta.object_id)
                         msg_meta.confidence = obj_meta.confidence
                         meta = pyds.NvDsEventMsgMeta.cast(msg_meta)
-                        meta.sensorId = 0
+                        meta.sensorId = cam_index
                         meta.placeId = 0
                         meta.moduleId = 0
-                        meta.sensorStr = "sensor-0"
+                        meta.sensorStr = "sensor-%d" % cam_index
                         meta.ts = pyds.alloc_buffer(MAX_TIME_STAMP_LEN + 1)
                         pyds.generate_ts_rfc3339(meta.ts, MAX_TIME_STAMP_LEN)
                         if obj_meta.class_id == PGIE_CLASS_ID_VEHICLE:
@@ -271,10 +631,22 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
         py_nvosd_text_params.font_params.font_color.set(1.0, 1.0, 1.0, 1.0)
         py_nvosd_text_params.set_bg_clr = 1
         py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 1.0)
-        print(pyds.get_string(py_nvosd_text_params.display_text))
+        log.info("cam %d Frame Number=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", cam_index, frame_number,
+                 num_rects, obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON], key=cam_index)
         pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
+        zones = None
+        if zone_engine is not None:
+            try:
+                zones = zone_engine.process(cam_index, dets)
+            except Exception as e:
+                log.error("zones: %s", e, key="zones")
         try:
-            _publish_detections(frame_number, dets)
+            _publish_detections(frame_number, dets, cam_index, zones)
+            rec = clip_recorders.get(cam_index)
+            if rec is not None:
+                reason = clip_rules[cam_index].evaluate(dets)
+                if reason:
+                    rec.trigger(frame_meta.buf_pts, reason)
         except Exception:
             pass
         try:
@@ -285,11 +657,291 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
     return Gst.PadProbeReturn.OK 
 
 
+def _elem_name(base, index):
+    # Camera 0 keeps the historical element names.
+    return base if index == 0 else "%s_%d" % (base, index)
+
+def _make_source_branch(pipeline, cam, streammux):
+    i = cam["index"]
+    source = Gst.ElementFactory.make("v4l2src", _elem_name("usb-cam-source", i))
+    if not source:
+        sys.stderr.write(" Unable to create Source \n")
+    caps_v4l2src = Gst.ElementFactory.make("capsfilter", _elem_name("v4l2src_caps", i))
+    if not caps_v4l2src:
+        sys.stderr.write(" Unable to create v4l2src capsfilter \n")
+    nvvidconvsrc = Gst.ElementFactory.make("nvvideoconvert", _elem_name("convertor_src2", i))
+    if not nvvidconvsrc:
+        sys.stderr.write(" Unable to create Nvvideoconvert \n")
+    caps_vidconvsrc = Gst.ElementFactory.make("capsfilter", _elem_name("nvmm_caps", i))
+    if not caps_vidconvsrc:
+        sys.stderr.write(" Unable to create capsfilter \n")
+    try:
+        caps_v4l2src.set_property('caps', Gst.Caps.from_string(f"{cam['caps']}, width={cam['width']}, height={cam['height']}, framerate={cam['fps']}"))
+    except Exception:
+        caps_v4l2src.set_property('caps', Gst.Caps.from_string("video/x-raw, framerate=30/1"))
+    caps_vidconvsrc.set_property('caps', Gst.Caps.from_string("video/x-raw(memory:NVMM), format=NV12"))
+    source.set_property('device', cam["device"])
+    try:
+        source.set_property('do-timestamp', True)
+    except Exception:
+        pass
+    pipeline.add(source)
+    pipeline.add(caps_v4l2src)
+    # MJPEG goes through the hardware JPEG decoder when one is usable so frames
+    # land in NVMM without a CPU decode + videoconvert; DS_MJPEG_DECODER
+    # (auto|nvv4l2decoder|nvjpegdec|jpegdec) overrides the probe order.
+    dec_names = {"jpegparse": "mjpg_parse", "nvv4l2decoder": "mjpg_dec", "nvjpegdec": "mjpg_dec",
+                 "jpegdec": "mjpg_dec", "videoconvert": "convertor_src1"}
+    path, dec_chain = build_decode_chain(pipeline, cam["caps"], GstFactory(Gst),
+                                         lambda f: _elem_name(dec_names.get(f, f), i),
+                                         config.current.mjpeg_decoder)
+    if not dec_chain:
+        sys.stderr.write(" Unable to create decode chain \n")
+    else:
+        print("Camera %d decode path: %s" % (i, path.name))
+    pipeline.add(nvvidconvsrc)
+    pipeline.add(caps_vidconvsrc)
+    source.link(caps_v4l2src)
+    if dec_chain:
+        caps_v4l2src.link(dec_chain[0])
+        dec_chain[-1].link(nvvidconvsrc)
+    else:
+        caps_v4l2src.link(nvvidconvsrc)
+    nvvidconvsrc.link(caps_vidconvsrc)
+    if dec_chain:
+        timer = DecodeTimer(path.name)
+        timer.attach(Gst, dec_chain[0].get_static_pad("sink"), caps_vidconvsrc.get_static_pad("src"))
+        decode_timers[i] = timer
+    sinkpad = streammux.get_request_pad("sink_%d" % i)
+    if not sinkpad:
+        sys.stderr.write(" Unable to get the sink pad of streammux \n")
+    srcpad = caps_vidconvsrc.get_static_pad("src")
+    if not srcpad:
+        sys.stderr.write(" Unable to get source pad of caps_vidconvsrc \n")
+    srcpad.link(sinkpad)
+    return source
+
+def _perf_print_callback():
+    # Same "**PERF:" line as the other apps, with each camera's decode path
+    # and its average per-frame cost (v4l2src caps -> NVMM NV12) appended.
+    stats = {}
+    for key, stream in perf_data.all_stream_fps.items():
+        entry = {"fps": stream.get_fps()}
+        timer = decode_timers.get(stream.stream_id)
+        if timer is not None:
+            entry.update(timer.snapshot())
+        stats[key] = entry
+    perf_data.perf_dict = stats
+    print("\n**PERF: ", stats, "\n")
+    if snap_dedup is not None and snap_dedup.checked:
+        print("SNAP_DEDUP", __import__("json").dumps(snap_dedup.stats()))
+    if snap_retention is not None:
+        print("RETENTION", __import__("json").dumps(snap_retention.stats()))
+    if telemetry is not None and telemetry.values:
+        print("TELEMETRY", __import__("json").dumps(telemetry.values))
+    if sched_plan is not None:
+        print("SCHED", __import__("json").dumps(sched_plan.report()))
+    return True
+
+def _sched_tick():
+    sched_plan.scan()
+    sched_plan.apply()
+    return True
+
+def _on_stream_status(bus, message):
+    # Sync handler: runs on the streaming thread that is starting.
+    kind, owner = message.parse_stream_status()
+    if kind == Gst.StreamStatusType.ENTER and owner is not None:
+        sched_plan.on_stream_status(owner.get_name())
+
+def _make_display_sink():
+    if config.current.use_egl:
+        sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
+    else:
+        if platform_info.is_integrated_gpu():
+            sink = Gst.ElementFactory.make("nv3dsink", "nv3d-sink")
+            if not sink:
+                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
+        else:
+            if platform_info.is_platform_aarch64():
+                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
+            else:
+                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
+    if not sink:
+        sys.stderr.write(" Unable to create display sink \n")
+    sink.set_property('sync', False)
+    try:
+        sink.set_property('async', False)
+    except Exception:
+        pass
+    try:
+        sink.set_property('qos', 0)
+    except Exception:
+        pass
+    return sink
+
+POST_BRANCH_ELEMENTS = ("convertor", "caps_rgba", "tee_presave", "q_pre_osd", "onscreendisplay",
+                        "tee_postosd", "q_post_display", "display_sink", "fakesink_postosd",
+                        "conv_clean", "caps_clean", "enc_clean", "sink_clean",
+                        "conv_osd", "caps_osd", "enc_osd", "sink_osd",
+                        "q_clip", "conv_clip", "caps_clip", "enc_clip", "parse_clip", "caps_h264", "sink_clip")
+
+def _make_plan_element(pipeline, plan, name):
+    factory = plan.nodes[name]
+    if factory == "display":
+        sink = _make_display_sink()
+        pipeline.add(sink)
+        if sink.get_name() == "nv3d-sink":
+            return sink
+        egltransform = Gst.ElementFactory.make("nvegltransform", "egl_xform")
+        pipeline.add(egltransform)
+        egltransform.link(sink)
+        return (egltransform, sink)
+    el = Gst.ElementFactory.make(factory, name)
+    if not el:
+        sys.stderr.write(" Unable to create %s \n" % name)
+        return None
+    pipeline.add(el)
+    return el
+
+def _configure_post_element(base, el):
+    if base == "caps_rgba":
+        el.set_property('caps', Gst.Caps.from_string("video/x-raw(memory:NVMM), format=RGBA"))
+    elif base == "onscreendisplay":
+        try:
+            el.set_property('process-mode', 0)
+            el.set_property('display-text', 1)
+            el.set_property('display-bbox', 1)
+            el.set_property('border-width', 3)
+        except Exception:
+            pass
+    elif base in ("q_pre_osd", "q_post_display"):
+        try:
+            el.set_property('leaky', 2)
+            el.set_property('max-size-buffers', 1)
+        except Exception:
+            pass
+    elif base in ("caps_clean", "caps_osd"):
+        el.set_property('caps', Gst.Caps.from_string("video/x-raw, format=BGR"))
+    elif base in ("sink_clean", "sink_osd"):
+        el.set_property("emit-signals", True)
+        try:
+            el.set_property("max-buffers", 1)
+            el.set_property("drop", True)
+        except Exception:
+            pass
+    elif base == "q_clip":
+        try:
+            el.set_property('leaky', 2)
+            el.set_property('max-size-buffers', 4)
+        except Exception:
+            pass
+    elif base == "caps_clip":
+        el.set_property('caps', Gst.Caps.from_string("video/x-raw(memory:NVMM), format=I420"))
+    elif base == "enc_clip":
+        el.set_property('bitrate', config.current.clip_bitrate)
+        try:
+            el.set_property('iframeinterval', config.current.clip_gop)
+            el.set_property('insert-sps-pps', 1)
+            if platform_info.is_integrated_gpu():
+                el.set_property('preset-level', 1)
+        except Exception:
+            pass
+    elif base == "parse_clip":
+        try:
+            el.set_property('config-interval', -1)
+        except Exception:
+            pass
+    elif base == "caps_h264":
+        el.set_property('caps', Gst.Caps.from_string("video/x-h264, stream-format=byte-stream, alignment=au"))
+    elif base == "sink_clip":
+        el.set_property("emit-signals", True)
+        el.set_property("sync", False)
+        try:
+            el.set_property("drop", False)
+        except Exception:
+            pass
+    elif base == "fakesink_postosd":
+        try:
+            el.set_property('sync', False)
+            el.set_property('async', False)
+        except Exception:
+            pass
+
+def _make_post_branch(pipeline, index, plan):
+    # nvvidconv -> RGBA -> [tee_presave] -> (clean jpeg) / nvosd -> [tee_postosd]
+    # -> (display) / (osd jpeg) / (msg). Only the elements the plan kept are
+    # created; _link_plan wires them. Returns the elements callers link against.
+    elements = {}
+    for base in POST_BRANCH_ELEMENTS:
+        name = _elem_name(base, index)
+        if not plan.has(name):
+            continue
+        el = _make_plan_element(pipeline, plan, name)
+        if el is not None and not isinstance(el, tuple):
+            _configure_post_element(base, el)
+        elements[name] = el
+    get = lambda base: elements.get(_elem_name(base, index))
+    return {"index": index, "elements": elements, "nvvidconv": get("convertor"), "caps_rgba": get("caps_rgba"),
+            "nvosd": get("onscreendisplay"), "conv_clean": get("conv_clean"), "conv_osd": get("conv_osd"),
+            "sink_clean": get("sink_clean"), "sink_osd": get("sink_osd"), "sink_clip": get("sink_clip")}
+
+def _link_plan(plan, elements):
+    # Links every planned edge except the source branches (linked by
+    # _make_source_branch) and nvstreamdemux, whose src pads are per camera.
+    for a, b in plan.edges:
+        if plan.nodes.get(a) == "v4l2src":
+            continue
+        src = elements.get(a)
+        dst = elements.get(b)
+        if src is None or dst is None:
+            continue
+        if isinstance(src, tuple):
+            src = src[-1]
+        if isinstance(dst, tuple):
+            dst = dst[0]
+        if plan.nodes[a] == "tee":
+            src.get_request_pad('src_%u').link(dst.get_static_pad('sink'))
+        elif plan.nodes[a] == "nvstreamdemux":
+            i = int(b.rsplit("_", 1)[1])
+            demuxsrcpad = src.get_request_pad("src_%u" % i)
+            if not demuxsrcpad:
+                sys.stderr.write("Unable to create demux src pad \n")
+            demuxsrcpad.link(dst.get_static_pad("sink"))
+        elif not src.link(dst):
+            sys.stderr.write(" Unable to link %s -> %s \n" % (a, b))
+
 def main(args):
-    if len(args) != 2:
-        sys.stderr.write("usage: %s <v4l2-device-path>\n" % args[0])
+    if len(args) >= 2 and args[1] == "--publisher":
+        return publisher_main(args)
+    if len(args) < 2:
+        sys.stderr.write("usage: %s <v4l2-device-path> [<v4l2-device-path> ...]\n" % args[0])
         sys.exit(1)
 
+    global config
+    try:
+        config = ConfigStore(SETTINGS, path=os.getenv('DS_CONFIG_FILE'))
+    except ConfigError as e:
+        sys.stderr.write("Invalid configuration:\n%s\n" % e)
+        return 2
+    cfg = config.current
+    global worker_id, sched_plan
+    worker_id = cfg.worker_id
+    # Thread placement (common/sched_plan.py): "auto" spreads the roles over
+    # the CPUs this process may use, "report" only classifies and reports.
+    if cfg.sched_policy not in ('', '0'):
+        try:
+            if cfg.sched_policy == 'auto':
+                policy = auto_policy(os.sched_getaffinity(0))
+            elif cfg.sched_policy == 'report':
+                policy = {}
+            else:
+                policy = parse_policy(cfg.sched_policy)
+        except ValueError as e:
+            sys.stderr.write("Invalid DS_SCHED_POLICY %r: %s\n" % (cfg.sched_policy, e))
+            return 2
+        sched_plan = ThreadPlanner(policy)
+
     global platform_info
     try:
         platform_info = PlatformInfo()
@@ -297,67 +949,122 @@ def main(args):
         pass
     Gst.init(None)
 
-    global ros, det_pub, img_b64_pub
+    global ros, det_pub, img_b64_pub, cams
     ros = None
     img_b64_pub = None
+    cams = [_cam_settings(i, dev) for i, dev in enumerate(args[1:])]
+    num_cams = len(cams)
     snap_enabled = {"value": False}
     snap_period_ms = {"value": 1000}
-    last_snap = {"ts": 0}
-    snap_dir_env = os.getenv('DS_SNAPSHOT_DIR', '/data/ds/datasets/autocap')
+    last_snap = {}
+    snap_reason = {}
+    snap_states = {0: snap_state}
+    snap_gates = {}
+    snap_dir_env = os.path.join(cfg.snapshot_dir, worker_id) if worker_id else cfg.snapshot_dir
     out_dir = {"path": snap_dir_env}
+    snap_period_ms["value"] = cfg.snapshot_period_ms
+    snap_enabled["value"] = snap_period_ms["value"] > 0
+    # DS_SNAPSHOT_POLICY replaces the fixed period with detection-driven rules
+    # (see common/snapshot_policy.py); without it the policy is just the period.
+    policy_spec = cfg.snapshot_policy
     try:
-        env_ms = int(os.getenv('DS_SNAPSHOT_PERIOD_MS', '0'))
-        snap_period_ms["value"] = max(0, env_ms)
-        snap_enabled["value"] = snap_period_ms["value"] > 0
-    except Exception:
-        pass
+        policy = SnapshotPolicy(policy_spec or "period=%d" % snap_period_ms["value"])
+    except Exception as e:
+        sys.stderr.write("Invalid DS_SNAPSHOT_POLICY %r: %s\n" % (policy_spec, e))
+        policy = SnapshotPolicy("period=%d" % snap_period_ms["value"])
+        policy_spec = ''
+    if policy_spec:
+        snap_enabled["value"] = True
+    global snap_dedup, snap_catalog, snap_retention
+    # Files are recorded in <dir>/catalog.sqlite3 as they are written;
+    # DS_SNAPSHOT_CATALOG=0 turns that off.
+    if cfg.snapshot_catalog != '0':
+        try:
+            _ensure_dir(snap_dir_env)
+            snap_catalog = SnapshotCatalog(default_db(snap_dir_env), snap_dir_env)
+        except Exception as e:
+            sys.stderr.write("Snapshot catalog disabled: %s\n" % e)
+    # Quotas for the snapshot directory (0/unset = off). Oldest clean/osd/meta
+    # sets are deleted first; see common/retention.py.
+    try:
+        gb = 1 << 30
+        retention = RetentionManager(snap_dir_env,
+                                     max_bytes=cfg.retention_max_gb * gb,
+                                     max_files=cfg.retention_max_files,
+                                     max_age_s=cfg.retention_max_age_h * 3600,
+                                     min_free_bytes=cfg.retention_min_free_gb * gb,
+                                     interval_s=cfg.retention_interval_s,
+                                     catalog=snap_catalog)
+        if retention.enabled():
+            retention.start()
+            snap_retention = retention
+    except Exception as e:
+        sys.stderr.write("Snapshot retention disabled: %s\n" % e)
+    dedup_method = cfg.snapshot_dedup
+    if dedup_method not in ('', '0') and SnapshotDedup is None:
+        sys.stderr.write("Snapshot dedup needs numpy and opencv-python; disabled\n")
+    elif dedup_method not in ('', '0'):
+        try:
+            snap_dedup = SnapshotDedup("phash" if dedup_method == '1' else dedup_method,
+                                       max_dist=cfg.snapshot_dedup_dist,
+                                       max_size=cfg.snapshot_dedup_size,
+                                       max_age_s=cfg.snapshot_dedup_max_age_s)
+        except Exception as e:
+            sys.stderr.write("Snapshot dedup disabled: %s\n" % e)
+    policy.enabled = snap_enabled["value"]
     def _on_start(_):
         snap_enabled["value"] = True
+        policy.enabled = True
     def _on_stop(_):
         snap_enabled["value"] = False
+        policy.enabled = False
     def _on_period(msg):
         try:
             v = int(msg.data)
             snap_period_ms["value"] = max(0, v)
+            policy.set_period(snap_period_ms["value"])
         except Exception:
             pass
-    def _publish_img_b64(data_bytes, stamp, suffix):
-        if img_b64_pub is None:
-            return
-        import base64
-        payload = {"stamp": int(stamp*1000), "kind": suffix, "data_b64": base64.b64encode(data_bytes).decode("ascii")}
+    def _on_policy(spec):
         try:
-            img_b64_pub.publish(roslibpy.Message({"data": __import__("json").dumps(payload)}))
-        except Exception:
-            pass
-    def _ensure_dir(path):
-        try:
-            os.makedirs(path, exist_ok=True)
-        except Exception:
-            pass
+            cfg = policy.configure(spec)
+            print("SNAPSHOT_POLICY", __import__("json").dumps(cfg))
+        except Exception as e:
+            sys.stderr.write("Ignoring snapshot policy %r: %s\n" % (spec, e))
     def _now():
         return time.time()
-    def _should_snap():
-        if not snap_enabled["value"]:
-            return False
+    def _should_snap(cam=0, dets=None):
+        if dets is None:
+            dets = _det_buf(cam)["dets"]
         t = _now()
-        if snap_period_ms["value"] == 0:
+        reason = policy.should_snap(cam, dets, t*1000)
+        if reason is None:
             return False
-        if t*1000 - last_snap["ts"] >= snap_period_ms["value"]:
-            last_snap["ts"] = t*1000
-            return True
-        return False
-    def _write_file(path, data_bytes):
+        last_snap[cam] = t*1000
+        snap_reason[cam] = reason
+        return True
+    def _cam_dir(cam):
+        # Multi-camera runs keep each camera's snapshots in <dir>/cam<i>.
+        if num_cams > 1:
+            return os.path.join(out_dir["path"], "cam%d" % cam)
+        return out_dir["path"]
+    def _save_meta_once(base_name, meta_json, cam=0):
+        _ensure_dir(_cam_dir(cam))
+        path = os.path.join(_cam_dir(cam), base_name + "_meta.json")
+        data = meta_json.encode("utf-8")
+        if _write_file(path, data):
+            _record_snap_file(path, "meta", base_name, len(data), meta_json, cam)
+    def _record_snap_file(path, kind, base_name, size, meta_json, cam):
+        if snap_retention is not None:
+            snap_retention.record(path, size)
+        if snap_catalog is None:
+            return
         try:
-            tmp = path + ".tmp"
-            with open(tmp, "wb") as f:
-                f.write(data_bytes)
-            os.replace(tmp, path)
-        except Exception:
-            pass
-    def _save_meta_once(base_name, meta_json):
-        _ensure_dir(out_dir["path"])
-        _write_file(os.path.join(out_dir["path"], base_name + "_meta.json"), meta_json.encode("utf-8"))
+            meta = __import__("json").loads(meta_json) if meta_json else {}
+            snap_catalog.add(path, kind, int(base_name), cam, size, meta.get("frame"),
+                             meta.get("detections"), meta.get("snapshot_reason"))
+        except Exception as e:
+            sys.stderr.write("Snapshot catalog: %s\n" % e)
 
 
     print("Creating Pipeline \n ")
@@ -366,100 +1073,41 @@ def main(args):
     if not pipeline:
         sys.stderr.write(" Unable to create Pipeline \n")
 
-    print("Creating Source \n ")
-    source = Gst.ElementFactory.make("v4l2src", "usb-cam-source")
-    if not source:
-        sys.stderr.write(" Unable to create Source \n")
-
-    caps_v4l2src = Gst.ElementFactory.make("capsfilter", "v4l2src_caps")
-    if not caps_v4l2src:
-        sys.stderr.write(" Unable to create v4l2src capsfilter \n")
-
-    print("Creating Video Converter \n")
-
-    vidconvsrc = Gst.ElementFactory.make("videoconvert", "convertor_src1")
-    if not vidconvsrc:
-        sys.stderr.write(" Unable to create videoconvert \n")
-
-    nvvidconvsrc = Gst.ElementFactory.make("nvvideoconvert", "convertor_src2")
-    if not nvvidconvsrc:
-        sys.stderr.write(" Unable to create Nvvideoconvert \n")
-
-    caps_vidconvsrc = Gst.ElementFactory.make("capsfilter", "nvmm_caps")
-    if not caps_vidconvsrc:
-        sys.stderr.write(" Unable to create capsfilter \n")
-
     streammux = Gst.ElementFactory.make("nvstreammux", "Stream-muxer")
     if not streammux:
         sys.stderr.write(" Unable to create NvStreamMux \n")
 
-    use_infer = os.getenv('DS_DISABLE_INFER', '0') != '1'
+    use_infer = not cfg.disable_infer
     pgie = None
     if use_infer:
         pgie = Gst.ElementFactory.make("nvinfer", "primary-inference")
         if not pgie:
             sys.stderr.write(" Unable to create pgie \n")
 
-    nvvidconv = Gst.ElementFactory.make("nvvideoconvert", "convertor")
-    if not nvvidconv:
-        sys.stderr.write(" Unable to create nvvidconv \n")
-    caps_rgba = Gst.ElementFactory.make("capsfilter", "caps_rgba")
-    if not caps_rgba:
-        sys.stderr.write(" Unable to create RGBA capsfilter \n")
-
-    nvosd = Gst.ElementFactory.make("nvdsosd", "onscreendisplay")
-    if not nvosd:
-        sys.stderr.write(" Unable to create nvosd \n")
-    try:
-        nvosd.set_property('process-mode', 0)
-        nvosd.set_property('display-text', 1)
-        nvosd.set_property('display-bbox', 1)
-        nvosd.set_property('border-width', 3)
-    except Exception:
-        pass
-
-    use_egl = os.getenv('DS_USE_EGL', '0') == '1'
-    if use_egl:
-        sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
-    else:
-        if platform_info.is_integrated_gpu():
-            sink = Gst.ElementFactory.make("nv3dsink", "nv3d-sink")
-            if not sink:
-                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
-        else:
-            if platform_info.is_platform_aarch64():
-                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
-            else:
-                sink = Gst.ElementFactory.make("nveglglessink", "nvvideo-renderer")
-    if not sink:
-        sys.stderr.write(" Unable to create display sink \n")
-
-    print("Playing cam %s " %args[1])
-    cam_caps = os.getenv('DS_CAM_CAPS', 'video/x-raw')
-    out_mode = os.getenv('DS_OUTPUT_MODE', 'display').strip().lower()
+    out_mode = cfg.output_mode.lower()
     enable_display = (out_mode == 'display')
-    enable_caption = (out_mode == 'ros_caption') or (os.getenv('DS_ENABLE_CAPTION', '0') == '1') or (int(os.getenv('DS_SNAPSHOT_PERIOD_MS', '0') or '0') > 0)
-    cam_w = int(os.getenv('DS_CAM_WIDTH', '1280'))
-    cam_h = int(os.getenv('DS_CAM_HEIGHT', '720'))
-    cam_fps = os.getenv('DS_CAM_FPS', '30/1')
-    try:
-        caps_v4l2src.set_property('caps', Gst.Caps.from_string(f"{cam_caps}, width={cam_w}, height={cam_h}, framerate={cam_fps}"))
-    except Exception:
-        caps_v4l2src.set_property('caps', Gst.Caps.from_string("video/x-raw, framerate=30/1"))
-    caps_vidconvsrc.set_property('caps', Gst.Caps.from_string("video/x-raw(memory:NVMM), format=NV12"))
-    caps_rgba.set_property('caps', Gst.Caps.from_string("video/x-raw(memory:NVMM), format=RGBA"))
-    source.set_property('device', args[1])
-    try:
-        source.set_property('do-timestamp', True)
-    except Exception:
-        pass
+    enable_caption = (out_mode == 'ros_caption') or cfg.enable_caption or (cfg.snapshot_period_ms > 0) or bool(cfg.snapshot_policy)
+    cam_w = cfg.mux_width or cams[0]["width"]
+    cam_h = cfg.mux_height or cams[0]["height"]
+    display_cam = cfg.display_cam
     try:
         streammux.set_property('width', cam_w)
         streammux.set_property('height', cam_h)
     except Exception:
         streammux.set_property('width', 1920)
         streammux.set_property('height', 1080)
-    streammux.set_property('batch-size', 1)
+    # Zones/lines in streammux pixels (common/zones.py), set through
+    # /deepstream/roi and kept in DS_ROI_FILE across restarts.
+    global zone_engine
+    if ZoneEngine is not None:
+        zone_engine = ZoneEngine(anchor=cfg.roi_anchor, ttl_s=cfg.roi_ttl_s, width=cam_w, height=cam_h)
+        if cfg.roi_file not in ('', '0') and os.path.exists(cfg.roi_file):
+            try:
+                zone_engine.load(cfg.roi_file)
+                print("ROI", __import__("json").dumps(zone_engine.stats()["streams"]))
+            except Exception as e:
+                sys.stderr.write("Ignoring DS_ROI_FILE %s: %s\n" % (cfg.roi_file, e))
+    streammux.set_property('batch-size', num_cams)
     streammux.set_property('batched-push-timeout', MUXER_BATCH_TIMEOUT_USEC)
     streammux.set_property('live-source', 1)
     try:
@@ -469,95 +1117,29 @@ def main(args):
         pass
     sample_pgie = "/opt/nvidia/deepstream/deepstream-6.0/samples/configs/deepstream-app/config_infer_primary.txt"
     default_pgie = sample_pgie if os.path.exists(sample_pgie) else "dstest1_pgie_config.txt"
-    pgie_config = os.getenv('DS_PGIE_CONFIG', default_pgie)
+    pgie_config = cfg.pgie_config or default_pgie
     if use_infer and pgie is not None:
         pgie.set_property('config-file-path', pgie_config)
-    sink.set_property('sync', False)
-    try:
-        sink.set_property('async', False)
-    except Exception:
-        pass
-    try:
-        sink.set_property('qos', 0)
-    except Exception:
-        pass
+        if num_cams > 1:
+            try:
+                if pgie.get_property('batch-size') != num_cams:
+                    print("WARNING: Overriding infer-config batch-size", pgie.get_property('batch-size'), " with number of sources ", num_cams, " \n")
+                pgie.set_property('batch-size', num_cams)
+            except Exception:
+                pass
 
     print("Adding elements to Pipeline \n")
-    pipeline.add(source)
-    pipeline.add(caps_v4l2src)
-    mjpg_dec = None
-    if 'image/jpeg' in cam_caps:
-        mjpg_dec = Gst.ElementFactory.make("jpegdec", "mjpg_dec")
-        if mjpg_dec:
-            pipeline.add(mjpg_dec)
-    pipeline.add(vidconvsrc)
-    pipeline.add(nvvidconvsrc)
-    pipeline.add(caps_vidconvsrc)
     pipeline.add(streammux)
     if use_infer and pgie is not None:
         pipeline.add(pgie)
-    pipeline.add(nvvidconv)
-    pipeline.add(caps_rgba)
-    pipeline.add(nvosd)
-    tee_presave = Gst.ElementFactory.make("tee", "tee_presave")
-    tee_postosd = Gst.ElementFactory.make("tee", "tee_postosd")
-    q_pre_osd = Gst.ElementFactory.make("queue", "q_pre_osd")
-    try:
-        q_pre_osd.set_property('leaky', 2)
-        q_pre_osd.set_property('max-size-buffers', 1)
-    except Exception:
-        pass
-    q_pre_clean = Gst.ElementFactory.make("queue", "q_pre_clean")
-    q_post_display = Gst.ElementFactory.make("queue", "q_post_display")
-    try:
-        q_post_display.set_property('leaky', 2)
-        q_post_display.set_property('max-size-buffers', 1)
-    except Exception:
-        pass
-    q_post_osd = Gst.ElementFactory.make("queue", "q_post_osd")
-    conv_clean = Gst.ElementFactory.make("nvvideoconvert", "conv_clean")
-    caps_clean = Gst.ElementFactory.make("capsfilter", "caps_clean")
-    caps_clean.set_property('caps', Gst.Caps.from_string("video/x-raw, format=BGR"))
-    enc_clean = Gst.ElementFactory.make("jpegenc", "enc_clean")
-    sink_clean = Gst.ElementFactory.make("appsink", "sink_clean")
-    sink_clean.set_property("emit-signals", True)
-    try:
-        sink_clean.set_property("max-buffers", 1)
-        sink_clean.set_property("drop", True)
-    except Exception:
-        pass
-    conv_osd = Gst.ElementFactory.make("nvvideoconvert", "conv_osd")
-    caps_osd = Gst.ElementFactory.make("capsfilter", "caps_osd")
-    caps_osd.set_property('caps', Gst.Caps.from_string("video/x-raw, format=BGR"))
-    enc_osd = Gst.ElementFactory.make("jpegenc", "enc_osd")
-    sink_osd = Gst.ElementFactory.make("appsink", "sink_osd")
-    sink_osd.set_property("emit-signals", True)
-    try:
-        sink_osd.set_property("max-buffers", 1)
-        sink_osd.set_property("drop", True)
-    except Exception:
-        pass
-    egltransform = Gst.ElementFactory.make("nvegltransform", "egl_xform")
-    pipeline.add(egltransform)
-    pipeline.add(sink)
-    pipeline.add(tee_presave)
-    pipeline.add(tee_postosd)
-    pipeline.add(q_pre_osd)
-    pipeline.add(q_pre_clean)
-    pipeline.add(conv_clean)
-    pipeline.add(caps_clean)
-    pipeline.add(enc_clean)
-    pipeline.add(sink_clean)
-    pipeline.add(q_post_osd)
-    pipeline.add(conv_osd)
-    pipeline.add(caps_osd)
-    pipeline.add(enc_osd)
-    pipeline.add(q_post_display)
-    pipeline.add(sink_osd)
-    enable_msg = os.getenv('DS_ENABLE_MSG', '1') != '0'
+    for cam in cams:
+        print("Playing cam %s " % cam["device"])
+        _make_source_branch(pipeline, cam, streammux)
+
+    enable_msg = cfg.enable_msg
     if enable_msg:
         try:
-            proto_lib_path = os.getenv('DS_MQTT_PROTO_LIB', '/opt/nvidia/deepstream/deepstream-6.0/lib/libnvds_mqtt_proto.so')
+            proto_lib_path = cfg.mqtt_proto_lib
             dep_ok = False
             exists_ok = False
             try:
@@ -574,73 +1156,69 @@ def main(args):
                 enable_msg = False
         except Exception:
             enable_msg = False
-    if enable_msg:
-        msgconv = Gst.ElementFactory.make("nvmsgconv", "nvmsg-converter")
-        msgbroker = Gst.ElementFactory.make("nvmsgbroker", "nvmsg-broker")
-        q_post_msg = Gst.ElementFactory.make("queue", "q_post_msg")
-        pipeline.add(q_post_msg)
-        pipeline.add(msgconv)
-        pipeline.add(msgbroker)
+    # Only the branches the enabled features need are built; see
+    # common/topology.py for the pruning rules.
+    enable_clip = cfg.clip_enable
+    plan = plan_pipeline(num_cams, inference=(use_infer and pgie is not None), display=enable_display,
+                         caption=enable_caption, msgbroker=enable_msg, display_cam=display_cam,
+                         clip=enable_clip)
+    print(plan.describe())
+    elements = {"Stream-muxer": streammux}
+    if use_infer and pgie is not None:
+        elements["primary-inference"] = pgie
+    for name in ("q_post_msg", "nvmsg-converter", "nvmsg-broker", "tee_batch", "q_demux", "nvstreamdemux"):
+        if plan.has(name):
+            elements[name] = _make_plan_element(pipeline, plan, name)
+    msgconv = elements.get("nvmsg-converter")
+    msgbroker = elements.get("nvmsg-broker")
+    if num_cams > 1 and not elements.get("nvstreamdemux"):
+        sys.stderr.write(" Unable to create nvstreamdemux \n")
+    branches = []
+    for cam in cams:
+        i = cam["index"]
+        branch = _make_post_branch(pipeline, i, plan)
+        branches.append(branch)
+        elements.update(branch["elements"])
+        if num_cams > 1:
+            elements["q_cam_%d" % i] = _make_plan_element(pipeline, plan, "q_cam_%d" % i)
 
     print("Linking elements in the Pipeline \n")
-    source.link(caps_v4l2src)
-    if mjpg_dec is not None:
-        caps_v4l2src.link(mjpg_dec)
-        mjpg_dec.link(vidconvsrc)
+    _link_plan(plan, elements)
+    infer_name = "primary-inference" if plan.has("primary-inference") else "Stream-muxer"
+    if num_cams == 1:
+        probe_pad = branches[0]["nvosd"].get_static_pad("sink")
     else:
-        caps_v4l2src.link(vidconvsrc)
-    vidconvsrc.link(nvvidconvsrc)
-    nvvidconvsrc.link(caps_vidconvsrc)
+        # The probe runs on the batch ahead of the demux so event meta reaches
+        # nvmsgconv for every camera.
+        probe_pad = elements[plan.consumers(infer_name)[0]].get_static_pad("sink")
 
-    sinkpad = streammux.get_request_pad("sink_0")
-    if not sinkpad:
-        sys.stderr.write(" Unable to get the sink pad of streammux \n")
-    srcpad = caps_vidconvsrc.get_static_pad("src")
-    if not srcpad:
-        sys.stderr.write(" Unable to get source pad of caps_vidconvsrc \n")
-    srcpad.link(sinkpad)
-    if use_infer and pgie is not None:
-        streammux.link(pgie)
-        pgie.link(nvvidconv)
-    else:
-        streammux.link(nvvidconv)
-    nvvidconv.link(caps_rgba)
-    caps_rgba.link(tee_presave)
-    tp_src1 = tee_presave.get_request_pad('src_%u')
-    tp_sink1 = q_pre_osd.get_static_pad('sink')
-    tp_src1.link(tp_sink1)
-    q_pre_osd.link(nvosd)
-    tp_src2 = tee_presave.get_request_pad('src_%u')
-    tp_sink2 = conv_clean.get_static_pad('sink')
-    tp_src2.link(tp_sink2)
-    conv_clean.link(caps_clean)
-    caps_clean.link(enc_clean)
-    enc_clean.link(sink_clean)
-
-    nvosd.link(tee_postosd)
-    tpo_src1 = tee_postosd.get_request_pad('src_%u')
-    tpo_sink1 = q_post_display.get_static_pad('sink')
-    tpo_src1.link(tpo_sink1)
-    if sink.get_name() == "nv3d-sink":
-        q_post_display.link(sink)
-    else:
-        q_post_display.link(egltransform)
-        egltransform.link(sink)
-    tpo_src2 = tee_postosd.get_request_pad('src_%u')
-    tpo_sink2 = conv_osd.get_static_pad('sink')
-    tpo_src2.link(tpo_sink2)
-    conv_osd.link(caps_osd)
-    caps_osd.link(enc_osd)
-    enc_osd.link(sink_osd)
-
-    if enable_msg:
-        tpo_src3 = tee_postosd.get_request_pad('src_%u')
-        tpo_sink3 = q_post_msg.get_static_pad('sink')
-        tpo_src3.link(tpo_sink3)
-        q_post_msg.link(msgconv)
-        msgconv.link(msgbroker)
-
-    def _on_new_sample(sink, kind):
+    def _snap_state(cam):
+        state = snap_states.get(cam)
+        if state is None:
+            state = {"base": None, "deadline": 0, "meta": "", "meta_saved": False, "saved_kinds": set(),
+                     "dup": None, "pending": {}}
+            snap_states[cam] = state
+        return state
+    def _det_json(cam, reason=None):
+        cam_buf = _det_buf(cam)
+        meta = {"frame": cam_buf["frame"], "detections": cam_buf["dets"]}
+        if num_cams > 1:
+            meta["cam"] = cam
+        if reason:
+            meta["snapshot_reason"] = reason
+        return __import__("json").dumps(meta)
+    def _on_snap_armed(cam):
+        # Runs on the streaming thread when the gate opens; the two gated
+        # appsinks then each see exactly this frame.
+        state = _snap_state(cam)
+        state["base"] = str(int(last_snap[cam]))
+        state["deadline"] = int(time.time()*1000) + 500
+        state["meta"] = ""
+        state["meta_saved"] = False
+        state["saved_kinds"] = set()
+        state["dup"] = None
+        state["pending"] = {}
+    def _on_new_sample(sink, kind, cam=0):
         global snap_state
         sample = sink.emit("pull-sample")
         if sample is None:
@@ -652,110 +1230,212 @@ def main(args):
         data = mapinfo.data
         buf.unmap(mapinfo)
         ts_ms = int(time.time()*1000)
-        meta_json = __import__("json").dumps({"frame": det_buf["frame"], "detections": det_buf["dets"]})
-        try:
-            print(meta_json, flush=True)
-            print("JSON_DET:" + meta_json, flush=True)
-        except Exception:
-            pass
-        triggered = _should_snap()
-        if triggered:
-            snap_state["base"] = str(int(last_snap["ts"]))
-            snap_state["deadline"] = ts_ms + 500
-            snap_state["meta"] = meta_json
-            snap_state["meta_saved"] = False
-            snap_state["saved_kinds"] = set()
-        if snap_state["base"] is None or ts_ms > snap_state["deadline"]:
+        state = _snap_state(cam)
+        if state["base"] is None or ts_ms > state["deadline"]:
             return Gst.FlowReturn.OK
-        base = snap_state["base"]
-        _ensure_dir(out_dir["path"])
-        _write_file(os.path.join(out_dir["path"], base + f"_{kind}.jpg"), data)
-        if not snap_state["meta_saved"]:
-            _save_meta_once(base, snap_state["meta"]) 
-            snap_state["meta_saved"] = True
-        snap_state["saved_kinds"].add(kind)
+        if snap_dedup is not None and state["dup"] is None:
+            # The clean frame decides for the pair; an OSD frame that arrives
+            # first waits for it.
+            if kind != "clean":
+                state["pending"][kind] = (data, ts_ms)
+                return Gst.FlowReturn.OK
+            state["dup"] = snap_dedup.is_duplicate(cam, bytes(data))
+            if state["dup"]:
+                state["base"] = None
+                state["pending"] = {}
+                return Gst.FlowReturn.OK
+        _save_snap(state, kind, data, ts_ms, cam)
+        for k, (d, t) in list(state["pending"].items()):
+            del state["pending"][k]
+            _save_snap(state, k, d, t, cam)
+        return Gst.FlowReturn.OK
+
+    def _save_snap(state, kind, data, ts_ms, cam):
+        if state["base"] is None:
+            return
+        if not state["meta"]:
+            state["meta"] = _det_json(cam, snap_reason.get(cam))
+        base = state["base"]
+        _ensure_dir(_cam_dir(cam))
+        path = os.path.join(_cam_dir(cam), base + f"_{kind}.jpg")
+        if _write_file(path, data):
+            _record_snap_file(path, kind, base, len(data), state["meta"], cam)
+        if not state["meta_saved"]:
+            _save_meta_once(base, state["meta"], cam)
+            state["meta_saved"] = True
+        state["saved_kinds"].add(kind)
+        if frame_ring is not None:
+            frame_ring.put(data, state["meta"].encode("utf-8"), cam, _det_buf(cam)["frame"], kind, ts_ms)
         try:
-            _publish_img_b64(data, ts_ms/1000.0, kind)
+            _publish_img_b64(data, ts_ms/1000.0, kind, cam)
         except Exception:
             pass
         try:
-            _publish_snap_mqtt(data, ts_ms, kind)
+            _publish_snap_mqtt(data, ts_ms, kind, cam)
         except Exception:
             pass
-        if "clean" in snap_state["saved_kinds"] and "osd" in snap_state["saved_kinds"]:
-            snap_state["base"] = None
-        return Gst.FlowReturn.OK
+        if "clean" in state["saved_kinds"] and "osd" in state["saved_kinds"]:
+            state["base"] = None
 
-    def _osd_cb(sink):
-        return _on_new_sample(sink, "osd")
     if enable_caption:
-        sink_osd.connect("new-sample", _osd_cb)
-        try:
-            def _clean_cb_bridge(sink):
-                return _on_new_sample(sink, "clean")
-            sink_clean.connect("new-sample", _clean_cb_bridge)
-        except Exception:
-            pass
+        for branch in branches:
+            cam_i = branch["index"]
+            # Both JPEG branches stay closed until _should_snap fires, so the
+            # BGR conversions and jpegenc run once per snapshot, not per frame.
+            gate = SnapshotGate(("clean", "osd"))
+            snap_gates[cam_i] = gate
+            gate.attach_trigger(Gst, branch["caps_rgba"].get_static_pad("src"),
+                                lambda buf, c=cam_i: _should_snap(c, _buffer_dets(buf)), lambda c=cam_i: _on_snap_armed(c))
+            gate.attach(Gst, branch["conv_clean"].get_static_pad("sink"), "clean")
+            gate.attach(Gst, branch["conv_osd"].get_static_pad("sink"), "osd")
+            branch["sink_osd"].connect("new-sample", lambda sink, c=cam_i: _on_new_sample(sink, "osd", c))
+            try:
+                branch["sink_clean"].connect("new-sample", lambda sink, c=cam_i: _on_new_sample(sink, "clean", c))
+            except Exception:
+                pass
+
+    if enable_clip:
+        # Encoded pre-roll ring per camera; detection rules in the probe
+        # trigger clips, which are muxed off the streaming thread.
+        clip_dir = os.path.join(cfg.clip_dir, worker_id) if worker_id else cfg.clip_dir
+        for branch in branches:
+            cam_i = branch["index"]
+            writer = GstClipWriter(Gst, os.path.join(clip_dir, "cam%d" % cam_i) if num_cams > 1 else clip_dir,
+                                   cfg.clip_container)
+            ring = EncodedRing(cfg.clip_ring_s, cfg.clip_ring_mb * 1024 * 1024)
+            clip_recorders[cam_i] = ClipRecorder(ring, cfg.clip_pre_s, cfg.clip_post_s, cfg.clip_max_s,
+                                                 on_clip=writer.write_async)
+            clip_rules[cam_i] = TriggerRules.from_env(getenv=cfg.raw)
+            def _on_clip_sample(sink, c=cam_i):
+                sample = sink.emit("pull-sample")
+                if sample is not None:
+                    frame = frame_from_sample(Gst, sample)
+                    if frame is not None:
+                        clip_recorders[c].push(frame)
+                return Gst.FlowReturn.OK
+            branch["sink_clip"].connect("new-sample", _on_clip_sample)
+
+    global perf_data
+    perf_data = PERF_DATA(num_cams)
+    perf_ms = cfg.perf_interval_ms
+    if perf_ms > 0:
+        GLib.timeout_add(perf_ms, _perf_print_callback)
 
     loop = GLib.MainLoop()
     bus = pipeline.get_bus()
     bus.add_signal_watch()
     bus.connect ("message", bus_call, loop)
+    if sched_plan is not None:
+        bus.enable_sync_message_emission()
+        bus.connect("sync-message::stream-status", _on_stream_status)
+        # Python threads (MQTT, ROS, logging) have no stream-status message.
+        GLib.timeout_add(2000, _sched_tick)
 
-    osdsinkpad = nvosd.get_static_pad("sink")
-    if not osdsinkpad:
+    if not probe_pad:
         sys.stderr.write(" Unable to get sink pad of nvosd \n")
 
-    osdsinkpad.add_probe(Gst.PadProbeType.BUFFER, osd_sink_pad_buffer_probe, 0)
+    probe_pad.add_probe(Gst.PadProbeType.BUFFER, osd_sink_pad_buffer_probe, 0)
 
     print("Starting pipeline \n")
     if roslibpy is not None:
         try:
-            ros_host = os.getenv('DS_ROS_HOST', 'localhost')
-            ros_port = int(os.getenv('DS_ROS_PORT', '9090'))
-            ros = roslibpy.Ros(host=ros_host, port=ros_port)
+            ros = roslibpy.Ros(host=cfg.ros_host, port=cfg.ros_port)
             ros.run()
             det_pub = roslibpy.Topic(ros, '/deepstream/detections_json', 'std_msgs/String')
             img_b64_pub = roslibpy.Topic(ros, '/deepstream/image_osd_jpeg_b64', 'std_msgs/String')
             det_pub.advertise()
             img_b64_pub.advertise()
+            if num_cams > 1:
+                for cam in cams:
+                    i = cam["index"]
+                    det_pubs[i] = roslibpy.Topic(ros, '/deepstream/cam%d/detections_json' % i, 'std_msgs/String')
+                    img_b64_pubs[i] = roslibpy.Topic(ros, '/deepstream/cam%d/image_osd_jpeg_b64' % i, 'std_msgs/String')
+                    det_pubs[i].advertise()
+                    img_b64_pubs[i].advertise()
             sub_start = roslibpy.Topic(ros, '/deepstream/snapshot/start', 'std_msgs/Empty')
             sub_stop = roslibpy.Topic(ros, '/deepstream/snapshot/stop', 'std_msgs/Empty')
             sub_period = roslibpy.Topic(ros, '/deepstream/snapshot/period_ms', 'std_msgs/Int32')
             sub_start.subscribe(lambda msg: _on_start(None))
             sub_stop.subscribe(lambda msg: _on_stop(None))
             sub_period.subscribe(lambda msg: _on_period(type('M', (), {'data': msg.get('data', 0)})()))
+            sub_policy = roslibpy.Topic(ros, '/deepstream/snapshot/policy', 'std_msgs/String')
+            sub_policy.subscribe(lambda msg: _on_policy(msg.get('data', '')))
+            sub_profile = roslibpy.Topic(ros, '/deepstream/profiler', 'std_msgs/String')
+            sub_profile.subscribe(lambda msg: _on_profile(msg.get('data', '')))
+            sub_roi = roslibpy.Topic(ros, '/deepstream/roi', 'std_msgs/String')
+            sub_roi.subscribe(lambda msg: _on_roi(msg.get('data', '')))
         except Exception:
             pass
-    global mqtt_client, mqtt_side
-    if mqtt is not None:
+    global telemetry, profiler, mqtt_out, frame_ring
+    if cfg.frame_ring:
+        # Snapshots for sidecar processes; see common/frame_ring.py.
         try:
-            host = os.getenv('DS_MQTT_HOST', '127.0.0.1')
-            port = int(os.getenv('DS_MQTT_PORT', '1883'))
-            client = mqtt.Client()
-            client.connect(host, port, 60)
-            client.loop_start()
-            mqtt_client = client
-            _mqtt_heartbeat_start()
-            side = mqtt.Client()
-            side.connect(host, port, 60)
-            side.loop_start()
-            mqtt_side = side
-        except Exception:
-            mqtt_client = None
-            mqtt_side = None
+            ring_name = "%s_%s" % (cfg.frame_ring, worker_id) if worker_id else cfg.frame_ring
+            frame_ring = FrameRing.create(ring_name, cfg.frame_ring_slots, cfg.frame_ring_slot_kb * 1024)
+        except Exception as e:
+            sys.stderr.write("Frame ring disabled: %s\n" % e)
+    # Costs nothing until started; see common/stack_profiler.py.
+    profiler = StackProfiler(interval_s=cfg.profile_interval_ms / 1000.0,
+                             max_overhead=cfg.profile_max_overhead_pct / 100.0,
+                             out_dir=cfg.profile_dir)
+    if cfg.profile:
+        profiler.start()
+    try:
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR2, _on_sigusr2)
+    except Exception:
+        pass
+    def _on_config(old, new, changed):
+        # Applies the reloadable settings; topics are read per message.
+        if 'snapshot_policy' in changed:
+            _on_policy(new.snapshot_policy or "period=%d" % new.snapshot_period_ms)
+        if 'snapshot_period_ms' in changed:
+            snap_period_ms["value"] = new.snapshot_period_ms
+            policy.set_period(snap_period_ms["value"])
+        if not new.snapshot_policy and ('snapshot_period_ms' in changed or 'snapshot_policy' in changed):
+            snap_enabled["value"] = policy.enabled = snap_period_ms["value"] > 0
+        if zone_engine is not None:
+            zone_engine.anchor = new.roi_anchor
+            zone_engine.ttl_s = new.roi_ttl_s
+        if 'mqtt_replay_rate' in changed and mqtt_out is not None:
+            ch = mqtt_out.channels.get("detections")
+            if getattr(ch, "replayer", None) is not None:
+                ch.replayer.set_rate(new.mqtt_replay_rate)
+        print("CONFIG", __import__("json").dumps({"version": new.version, "changed": changed}))
+    def _on_sighup():
+        if config.reload() is None:
+            sys.stderr.write("Config reload failed, keeping version %d:\n%s\n"
+                             % (config.current.version, config.last_error))
+        if config.pending_restart:
+            sys.stderr.write("Config: restart needed for %s\n" % ", ".join(config.pending_restart))
+        return GLib.SOURCE_CONTINUE
+    config.subscribe(_on_config)
+    try:
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGHUP, _on_sighup)
+    except Exception:
+        pass
+    if cfg.config_watch_s > 0:
+        config.watch(cfg.config_watch_s)
+    if cfg.telemetry:
+        # Sampled on the MQTT transport thread; see common/telemetry.py.
+        telemetry = TelemetrySampler(root=cfg.telemetry_root, full_every=cfg.telemetry_full_every)
+        for name, el in elements.items():
+            if plan.nodes.get(name) == "queue" and el is not None:
+                telemetry.gauge(name, lambda e=el: e.get_property('current-level-buffers'))
+    if cfg.publish_sock:
+        mqtt_out = _relay_start(cfg.publish_sock, worker_id or "main")
+    elif mqtt is not None:
+        try:
+            mqtt_out = _mqtt_start(cfg.mqtt_host, cfg.mqtt_port)
+        except Exception as e:
+            sys.stderr.write("MQTT disabled: %s\n" % e)
+            mqtt_out = None
     if enable_msg:
-        mcfg = os.getenv('DS_MSGCONV_CONFIG', '/app/share/dstest4_msgconv_config.txt')
-        pload = int(os.getenv('DS_MSGCONV_PAYLOAD_TYPE', '0'))
-        proto_lib = os.getenv('DS_MQTT_PROTO_LIB', '/opt/nvidia/deepstream/deepstream-6.0/lib/libnvds_mqtt_proto.so')
-        conn_str = os.getenv('DS_MQTT_CONN_STR', '127.0.0.1;1883')
-        topic = os.getenv('DS_MQTT_TOPIC', 'deepstream/detections')
         try:
-            msgconv.set_property('config', mcfg)
-            msgconv.set_property('payload-type', pload)
-            msgbroker.set_property('proto-lib', proto_lib)
-            msgbroker.set_property('conn-str', conn_str)
-            msgbroker.set_property('topic', topic)
+            msgconv.set_property('config', cfg.msgconv_config)
+            msgconv.set_property('payload-type', cfg.msgconv_payload_type)
+            msgbroker.set_property('proto-lib', cfg.mqtt_proto_lib)
+            msgbroker.set_property('conn-str', cfg.mqtt_conn_str)
+            msgbroker.set_property('topic', cfg.mqtt_topic)
             msgbroker.set_property('sync', False)
         except Exception:
             pass
@@ -765,6 +1445,12 @@ def main(args):
     except:
         pass
     pipeline.set_state(Gst.State.NULL)
+    if profiler.running():
+        _on_profile("stop")
+    if mqtt_out is not None:
+        mqtt_out.stop()
+    if frame_ring is not None:
+        frame_ring.close()
 
 if __name__ == '__main__':
     sys.exit(main(sys.argv))
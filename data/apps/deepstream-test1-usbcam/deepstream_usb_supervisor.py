@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Runs deepstream_test_1_usb_ros.py as one worker process per camera group
+# plus one publisher process that owns the MQTT connection.
+#
+#   python3 deepstream_usb_supervisor.py /dev/video0,/dev/video1 /dev/video2@4-5
+#
+# Each argument is a camera group: comma separated devices, optionally
+# followed by @<cpus> ("2", "2-3", "2,4") to pin that worker. Workers publish
+# through DS_PUBLISH_SOCK (common/relay.py); the publisher forwards to the
+# broker. With more than one group every worker gets DS_WORKER_ID=w<i>, which
+# puts its topics under <topic>/w<i> and its snapshots, clips and frame ring
+# under per-worker names. Crashed workers are restarted with backoff (see
+# common/supervisor.py); "SUPERVISOR {...}" lines report state, restarts and
+# FPS per worker.
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, '/data/ds')
+from common.app_config import Setting, ConfigStore, ConfigError
+from common.supervisor import Worker, Supervisor
+from common.sched_plan import parse_cpus, plan_workers
+
+SETTINGS = [
+    Setting('DS_PUBLISH_SOCK', str, '/tmp/ds_publish.sock'),
+    Setting('DS_SUPERVISOR_PUBLISHER', bool, True),
+    Setting('DS_SUPERVISOR_REPORT_S', float, 10.0, min=0),
+    Setting('DS_SUPERVISOR_BACKOFF_MAX_S', float, 60.0, min=1),
+    Setting('DS_SUPERVISOR_STABLE_S', float, 30.0, min=0),
+    Setting('DS_SUPERVISOR_PLACE', bool, False),
+]
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deepstream_test_1_usb_ros.py")
+
+
+def parse_group(arg):
+    devices, _, cpus = arg.partition("@")
+    devices = [d for d in devices.split(",") if d]
+    if not devices:
+        raise ValueError("empty camera group %r" % arg)
+    return devices, parse_cpus(cpus)
+
+
+def build_workers(groups, cfg):
+    workers = []
+    pub_cpus, auto_cpus = None, [None] * len(groups)
+    if cfg.supervisor_place and hasattr(os, "sched_getaffinity"):
+        # Groups without @cpus get a share of the allowed CPUs; the
+        # publisher gets the first one.
+        pub_cpus, auto_cpus = plan_workers(len(groups), os.sched_getaffinity(0), cfg.supervisor_publisher)
+    if cfg.supervisor_publisher:
+        workers.append(Worker("publisher", [sys.executable, APP, "--publisher"],
+                              env={"DS_PUBLISH_SOCK": cfg.publish_sock}, cpus=pub_cpus, last=True))
+    for i, (devices, cpus) in enumerate(groups):
+        cpus = cpus or auto_cpus[i]
+        env = {"DS_PUBLISH_SOCK": cfg.publish_sock}
+        name = "w%d" % i
+        if len(groups) > 1:
+            env["DS_WORKER_ID"] = name
+        workers.append(Worker(name, [sys.executable, APP] + devices, env=env, cpus=cpus))
+    return workers
+
+
+def main(args):
+    if len(args) < 2:
+        sys.stderr.write("usage: %s <dev[,dev...][@cpus]> [<dev[,dev...][@cpus]> ...]\n" % args[0])
+        return 1
+    try:
+        cfg = ConfigStore(SETTINGS, path=os.getenv('DS_CONFIG_FILE')).current
+        groups = [parse_group(a) for a in args[1:]]
+    except (ConfigError, ValueError) as e:
+        sys.stderr.write("%s\n" % e)
+        return 2
+    sup = Supervisor(build_workers(groups, cfg), backoff_max_s=cfg.supervisor_backoff_max_s,
+                     stable_s=cfg.supervisor_stable_s, report_s=cfg.supervisor_report_s)
+    sup.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
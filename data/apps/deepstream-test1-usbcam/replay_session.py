@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+import argparse
+import calendar
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append('../')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.pacing import Pacer
+from common.app_config import ConfigStore
+from common.mqtt_transport import MqttTransport
+from common import applog
+
+# Replays recorded detections (JSON_DET: stdout lines, docker json-file logs,
+# or /tmp/ds_usb_detections.jsonl) and optionally autocap JPEGs through the
+# publishing functions of deepstream_test_1_usb_ros, at 1x-100x speed.
+
+_DOCKER_TS = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?Z\s+(.*)$')
+_SNAP_NAME = re.compile(r'^(\d+)_(clean|osd)\.jpg$')
+_CAM_DIR = re.compile(r'^cam(\d+)$')
+
+
+def _parse_iso(base, frac):
+    ts = calendar.timegm(time.strptime(base, "%Y-%m-%dT%H:%M:%S"))
+    if frac:
+        ts += float("0" + frac[:10])
+    return float(ts)
+
+
+def parse_line(line):
+    # Returns (ts_s or None, payload dict) or None for lines without detections.
+    line = line.strip()
+    if not line:
+        return None
+    ts = None
+    if line.startswith('{"log"'):
+        try:
+            rec = json.loads(line)
+        except Exception:
+            return None
+        m = _DOCKER_TS.match(rec.get("time", "") + " x")
+        if m:
+            ts = _parse_iso(m.group(1), m.group(2))
+        line = rec.get("log", "").strip()
+    else:
+        m = _DOCKER_TS.match(line)
+        if m:
+            ts = _parse_iso(m.group(1), m.group(2))
+            line = m.group(3).strip()
+    if line.startswith("JSON_DET:"):
+        line = line[len("JSON_DET:"):]
+    elif not line.startswith("{"):
+        return None
+    try:
+        payload = json.loads(line)
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or "detections" not in payload:
+        return None
+    if ts is None and "ts_ms" in payload:
+        try:
+            ts = int(payload["ts_ms"]) / 1000.0
+        except Exception:
+            ts = None
+    return ts, payload
+
+
+def load_detections(path, fps):
+    # A live app may still be appending to the file, so stop at its current size.
+    limit = os.path.getsize(path)
+    events = []
+    last_frame = None
+    last_key = None
+    synth_ts = 0.0
+    with open(path, "r", errors="ignore") as f:
+        read = 0
+        for line in f:
+            read += len(line)
+            if read > limit:
+                break
+            rec = parse_line(line)
+            if rec is None:
+                continue
+            ts, payload = rec
+            frame = payload.get("frame")
+            # The app prints every frame more than once (plain, JSON_DET: and
+            # again from the appsink callback); keep the first copy.
+            key = (frame, payload.get("cam"))
+            if frame is not None and key == last_key:
+                continue
+            last_key = key
+            if ts is None:
+                delta = int(frame) - last_frame if (frame is not None and last_frame is not None) else -1
+                if delta >= 0:
+                    # Same frame number from another camera shares its time.
+                    synth_ts += delta / float(fps)
+                else:
+                    synth_ts += 1.0 / float(fps)
+            if frame is not None:
+                last_frame = int(frame)
+            events.append([ts, "det", payload, synth_ts])
+    absolute = bool(events) and all(e[0] is not None for e in events)
+    for e in events:
+        if not absolute:
+            e[0] = e[3]
+        del e[3]
+    return events, absolute
+
+
+def load_snapshots(snap_dir, kinds):
+    # Multi-camera runs store snapshots under <dir>/cam<i>.
+    events = []
+    dirs = [(0, snap_dir)]
+    try:
+        for name in os.listdir(snap_dir):
+            m = _CAM_DIR.match(name)
+            if m and os.path.isdir(os.path.join(snap_dir, name)):
+                dirs.append((int(m.group(1)), os.path.join(snap_dir, name)))
+    except Exception:
+        return events
+    for cam, d in dirs:
+        try:
+            names = os.listdir(d)
+        except Exception:
+            continue
+        for name in names:
+            m = _SNAP_NAME.match(name)
+            if not m or m.group(2) not in kinds:
+                continue
+            events.append([int(m.group(1)) / 1000.0, "snap", (m.group(2), os.path.join(d, name), cam)])
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def camera_count(events):
+    n = 1
+    for _, kind, data in events:
+        cam = data.get("cam", 0) if kind == "det" else data[2]
+        try:
+            n = max(n, int(cam) + 1)
+        except Exception:
+            pass
+    return n
+
+
+def merge_timelines(dets, dets_absolute, snaps):
+    if snaps and not dets_absolute and dets:
+        # Detections only have frame-relative time; line snapshots up with them.
+        shift = snaps[0][0] - dets[0][0]
+        for e in snaps:
+            e[0] -= shift
+    events = dets + snaps
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def load_app():
+    try:
+        import gi  # noqa: F401
+    except Exception:
+        from common import fake_pyds
+        fake_pyds.install_platform_stubs()
+    import deepstream_test_1_usb_ros as app
+    return app
+
+
+def connect_transport(app, args):
+    # The same single-connection transport and channels the app runs with;
+    # the transport thread connects the client itself.
+    if args.broker == "fake":
+        from common import fake_mqtt
+        broker = fake_mqtt.FakeBroker(latency_s=args.fake_latency_ms / 1000.0)
+        client = fake_mqtt.FakeClient("replay", broker=broker)
+    else:
+        import paho.mqtt.client as mqtt
+        broker = None
+        client = mqtt.Client()
+        client.max_queued_messages_set(args.max_queued)
+    return broker, app._publish_channels(MqttTransport(client, args.host, args.port))
+
+
+def connect_ros(args):
+    import roslibpy
+    ros = roslibpy.Ros(host=args.ros_host, port=args.ros_port)
+    ros.run()
+    det_pub = roslibpy.Topic(ros, '/deepstream/detections_json', 'std_msgs/String')
+    img_pub = roslibpy.Topic(ros, '/deepstream/image_osd_jpeg_b64', 'std_msgs/String')
+    det_pub.advertise()
+    img_pub.advertise()
+    return ros, det_pub, img_pub
+
+
+class Reporter:
+    def __init__(self, interval_s, events_total):
+        self.interval_s = interval_s
+        self.events_total = events_total
+        self.sent = {"det": 0, "snap": 0}
+        self.bytes = 0
+        self._last = time.perf_counter()
+        self._last_sent = 0
+
+    def tick(self, pacer, backlog):
+        now = time.perf_counter()
+        if now - self._last < self.interval_s:
+            return
+        total = self.sent["det"] + self.sent["snap"]
+        rate = (total - self._last_sent) / (now - self._last)
+        self._last = now
+        self._last_sent = total
+        sys.stderr.write("REPLAY %d/%d events %.1f ev/s lag=%.1fms backlog=%d\n" % (
+            total, self.events_total, rate, pacer.stats()["max_lag_ms"], backlog))
+
+
+def replay(app, events, args, out=None):
+    pacer = Pacer(speed=args.speed if args.speed > 0 else 1.0)
+    rep = Reporter(args.report_interval, len(events))
+    sink = open(os.devnull, "w") if not args.echo else None
+    redirect = contextlib.redirect_stdout(sink) if sink is not None else contextlib.nullcontext()
+    with redirect:
+        pacer.start(events[0][0] if events else 0.0)
+        i = 0
+        n = len(events)
+        due_idx = 0
+        while i < n:
+            ts, kind, data = events[i]
+            if args.speed > 0:
+                pacer.wait(ts)
+            if kind == "det":
+                payload = data
+                app._publish_detections(payload.get("frame", 0), payload.get("detections", []), int(payload.get("cam", 0)))
+                rep.sent["det"] += 1
+            else:
+                suffix, path, cam = data
+                try:
+                    with open(path, "rb") as fh:
+                        img = fh.read()
+                except Exception:
+                    img = None
+                if img is not None:
+                    ts_ms = int(ts * 1000)
+                    app._publish_img_b64(img, ts_ms / 1000.0, suffix, cam)
+                    app._publish_snap_mqtt(img, ts_ms, suffix, cam)
+                    if out is not None:
+                        d = os.path.join(out, "cam%d" % cam) if app._multi_cam() else out
+                        app._ensure_dir(d)
+                        app._write_file(os.path.join(d, "%d_%s.jpg" % (ts_ms, suffix)), img)
+                    rep.sent["snap"] += 1
+                    rep.bytes += len(img)
+            i += 1
+            backlog = 0
+            if args.speed > 0:
+                due_idx = max(due_idx, i)
+                while due_idx < n and pacer.overdue(events[due_idx][0]):
+                    due_idx += 1
+                backlog = due_idx - i
+            rep.tick(pacer, backlog)
+        # The app's log sinks write on a flush thread; drain them while
+        # stdout is still redirected.
+        applog.flush()
+    if sink is not None:
+        sink.close()
+    elapsed = pacer.elapsed()
+    span = (events[-1][0] - events[0][0]) if len(events) > 1 else 0.0
+    total = rep.sent["det"] + rep.sent["snap"]
+    result = {
+        "events": total,
+        "detections": rep.sent["det"],
+        "snapshots": rep.sent["snap"],
+        "snapshot_bytes": rep.bytes,
+        "recorded_span_s": round(span, 3),
+        "speed": args.speed,
+        "elapsed_s": round(elapsed, 3),
+        "target_ev_per_s": round(total / (span / args.speed), 1) if span > 0 and args.speed > 0 else None,
+        "achieved_ev_per_s": round(total / elapsed, 1) if elapsed > 0 else None,
+    }
+    result.update(pacer.stats())
+    return result
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="replay_session",
+                                     description="Replay recorded detections/snapshots through the USB/ROS publishers.")
+    parser.add_argument("-i", "--input", required=True,
+                        help="JSON_DET log, docker json-file log or ds_usb_detections.jsonl")
+    parser.add_argument("--snap-dir", default=None, help="Autocap directory with <ts>_osd.jpg / <ts>_clean.jpg")
+    parser.add_argument("--snap-kinds", default="osd,clean")
+    parser.add_argument("--snap-out", default=None, help="Also write replayed snapshots to this directory")
+    parser.add_argument("-s", "--speed", type=float, default=1.0,
+                        help="Replay speed factor (1-100 typical); 0 replays unpaced")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate used when records carry no timestamps")
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--broker", choices=["mqtt", "fake"], default="mqtt")
+    parser.add_argument("--host", default=os.getenv('DS_MQTT_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('DS_MQTT_PORT', '1883')))
+    parser.add_argument("--max-queued", type=int, default=0, help="paho outgoing queue bound, 0 = unbounded")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ros", action="store_true", help="Also publish to rosbridge")
+    parser.add_argument("--ros-host", default=os.getenv('DS_ROS_HOST', 'localhost'))
+    parser.add_argument("--ros-port", type=int, default=int(os.getenv('DS_ROS_PORT', '9090')))
+    parser.add_argument("--jsonl-out", default=os.devnull,
+                        help="Where the app's detection jsonl append goes during replay")
+    parser.add_argument("--report-interval", type=float, default=2.0)
+    parser.add_argument("--echo", action="store_true", help="Keep the app's per-frame stdout")
+    parser.add_argument("--json", default=None, help="Write the summary to this file")
+    args = parser.parse_args(argv[1:])
+    if args.speed < 0 or args.speed > 1000:
+        parser.error("--speed must be between 0 and 1000")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    dets, absolute = load_detections(args.input, args.fps)
+    snaps = load_snapshots(args.snap_dir, set(args.snap_kinds.split(','))) if args.snap_dir else []
+    events = merge_timelines(dets, absolute, snaps)
+    if not events:
+        sys.stderr.write("no replayable records in %s\n" % args.input)
+        return 1
+    if not args.echo and os.getenv('DS_LOG_MACHINE', '-') == '-':
+        # The app sends one detection record per frame to stdout, which
+        # would end up next to the summary JSON.
+        os.environ['DS_LOG_MACHINE'] = '0'
+    app = load_app()
+    # The app reads its settings from app.config, which main() would build.
+    env = dict(os.environ)
+    env['DS_DETECTIONS_JSONL'] = args.jsonl_out
+    app.config = ConfigStore(app.SETTINGS, env=env, path=os.getenv('DS_CONFIG_FILE'))
+    ncams = camera_count(events)
+    if ncams > 1:
+        app.cams = [app._cam_settings(i, "/dev/video%d" % i) for i in range(ncams)]
+    broker, app.mqtt_out = connect_transport(app, args)
+    ros = None
+    if args.ros:
+        ros, app.det_pub, app.img_b64_pub = connect_ros(args)
+        app.roslibpy = sys.modules.get('roslibpy')
+    if args.snap_out:
+        app._ensure_dir(args.snap_out)
+    results = []
+    try:
+        for _ in range(max(1, args.loops)):
+            results.append(replay(app, events, args, out=args.snap_out))
+    finally:
+        app.mqtt_out.stop()
+        if ros is not None:
+            try:
+                ros.terminate()
+            except Exception:
+                pass
+    summary = {"runs": results, "mqtt": app.mqtt_out.stats()}
+    if broker is not None:
+        summary["broker"] = broker.stats()
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
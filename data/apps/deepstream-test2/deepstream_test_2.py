@@ -19,6 +19,7 @@
 
 import sys
 sys.path.append('../')
+import os
 import platform
 import configparser
 
@@ -27,9 +28,20 @@ gi.require_version('Gst', '1.0')
 from gi.repository import GLib, Gst
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger, DEBUG
+from common.clip_recorder import UNTRACKED_OBJECT_ID
+try:
+    from common.trajectories import TrajectoryStore
+except Exception:
+    TrajectoryStore = None
 
 import pyds
 
+log = get_logger("deepstream-test2")
+# Track histories from the tracker's current and past-frame output
+# (common/trajectories.py); None when DS_TRACKS=0 or numpy is missing.
+tracks = None
+
 PGIE_CLASS_ID_VEHICLE = 0
 PGIE_CLASS_ID_BICYCLE = 1
 PGIE_CLASS_ID_PERSON = 2
@@ -48,7 +60,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
     num_rects=0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -69,6 +81,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
 
         frame_number=frame_meta.frame_num
         num_rects = frame_meta.num_obj_meta
+        uids, boxes, confs, classes = [], [], [], []
         l_obj=frame_meta.obj_meta_list
         while l_obj is not None:
             try:
@@ -77,10 +90,18 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             except StopIteration:
                 break
             obj_counter[obj_meta.class_id] += 1
+            if tracks is not None and obj_meta.object_id != UNTRACKED_OBJECT_ID:
+                r = obj_meta.rect_params
+                uids.append(obj_meta.object_id)
+                boxes.append((r.left, r.top, r.width, r.height))
+                confs.append(obj_meta.tracker_confidence)
+                classes.append(obj_meta.class_id)
             try: 
                 l_obj=l_obj.next
             except StopIteration:
                 break
+        if tracks is not None:
+            tracks.add_frame(frame_meta.pad_index, frame_number, uids, boxes, confs, classes)
 
         # Acquiring a display meta object. The memory ownership remains in
         # the C code so downstream plugins can still access it. Otherwise
@@ -109,14 +130,20 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
         py_nvosd_text_params.set_bg_clr = 1
         # set(red, green, blue, alpha); set to Black
         py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 1.0)
-        # Using pyds.get_string() to get display_text as string
-        print(pyds.get_string(py_nvosd_text_params.display_text))
+        # Rate-limited per key (DS_LOG_RATE); the full record goes to the
+        # machine channel when DS_LOG_MACHINE is set.
+        log.info("Frame Number=%d Number of Objects=%d Vehicle_count=%d Person_count=%d", frame_number, num_rects,
+                 obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON], key="frame")
+        log.record("frame", {"frame": frame_number, "objects": num_rects,
+                             "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE], "person": obj_counter[PGIE_CLASS_ID_PERSON]})
         pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
         try:
             l_frame=l_frame.next
         except StopIteration:
             break
-    #past tracking meta data
+    #past tracking meta data; only walked when someone will see it
+    past_wanted = log.enabled(DEBUG) or log.machine_enabled()
+    past_walk = past_wanted or tracks is not None
     l_user=batch_meta.batch_user_meta_list
     while l_user is not None:
         try:
@@ -128,7 +155,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             user_meta=pyds.NvDsUserMeta.cast(l_user.data)
         except StopIteration:
             break
-        if(user_meta and user_meta.base_meta.meta_type==pyds.NvDsMetaType.NVDS_TRACKER_PAST_FRAME_META):
+        if(past_walk and user_meta and user_meta.base_meta.meta_type==pyds.NvDsMetaType.NVDS_TRACKER_PAST_FRAME_META):
             try:
                 # Note that user_meta.user_meta_data needs a cast to pyds.NvDsTargetMiscDataBatch
                 # The casting is done by pyds.NvDsTargetMiscDataBatch.cast()
@@ -139,27 +166,49 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             except StopIteration:
                 break
             for miscDataStream in pyds.NvDsTargetMiscDataBatch.list(pPastDataBatch):
-                print("streamId=",miscDataStream.streamID)
-                print("surfaceStreamID=",miscDataStream.surfaceStreamID)
                 for miscDataObj in pyds.NvDsTargetMiscDataStream.list(miscDataStream):
-                    print("numobj=",miscDataObj.numObj)
-                    print("uniqueId=",miscDataObj.uniqueId)
-                    print("classId=",miscDataObj.classId)
-                    print("objLabel=",miscDataObj.objLabel)
-                    for miscDataFrame in pyds.NvDsTargetMiscDataObject.list(miscDataObj):
-                        print('frameNum:', miscDataFrame.frameNum)
-                        print('tBbox.left:', miscDataFrame.tBbox.left)
-                        print('tBbox.width:', miscDataFrame.tBbox.width)
-                        print('tBbox.top:', miscDataFrame.tBbox.top)
-                        print('tBbox.right:', miscDataFrame.tBbox.height)
-                        print('confidence:', miscDataFrame.confidence)
-                        print('age:', miscDataFrame.age)
+                    # frameNum, left, top, width, height, confidence, age
+                    frames = [(f.frameNum, f.tBbox.left, f.tBbox.top, f.tBbox.width, f.tBbox.height,
+                               f.confidence, f.age) for f in pyds.NvDsTargetMiscDataObject.list(miscDataObj)]
+                    if tracks is not None:
+                        tracks.add_past(miscDataStream.streamID, miscDataObj.uniqueId, frames,
+                                        miscDataObj.classId, miscDataObj.objLabel)
+                    if not past_wanted:
+                        continue
+                    log.debug("past frames streamId=%d surfaceStreamID=%d uniqueId=%d classId=%d objLabel=%s numobj=%d",
+                              miscDataStream.streamID, miscDataStream.surfaceStreamID, miscDataObj.uniqueId,
+                              miscDataObj.classId, miscDataObj.objLabel, miscDataObj.numObj, key="past")
+                    log.record("past_frames", {"stream": miscDataStream.streamID,
+                                               "surface_stream": miscDataStream.surfaceStreamID,
+                                               "id": miscDataObj.uniqueId, "class": miscDataObj.classId,
+                                               "label": miscDataObj.objLabel, "frames": frames})
         try:
             l_user=l_user.next
         except StopIteration:
             break
     return Gst.PadProbeReturn.OK	
 
+def tracks_report(heatmap_dir):
+    # Runs on the main loop every DS_TRACKS_REPORT_S: drops dead tracks and
+    # publishes a summary, so nothing downstream has to parse past-frame lines.
+    tracks.expire()
+    st = tracks.stats()
+    log.info("tracks active=%d added=%d merged=%d expired=%d dropped=%d", st["active"], st["added"],
+             st["merged"], st["expired"], st["dropped"], key="tracks")
+    log.record("tracks", {"stats": st, "motion": tracks.motion(within_s=1.0)})
+    if heatmap_dir:
+        for s in tracks.streams():
+            try:
+                tracks.save_heatmap(s, os.path.join(heatmap_dir, "heatmap_stream%d.npy" % s))
+            except OSError as e:
+                log.error("heatmap: %s", e, key="heatmap")
+    return True
+
+def tracks_expire():
+    # With the report off, idle tracks still have to leave the store.
+    tracks.expire()
+    return True
+
 def bus_call_loop(bus, message, ctx):
     t = message.type
     if t == Gst.MessageType.EOS:
@@ -188,6 +237,15 @@ def main(args):
         sys.exit(1)
 
     platform_info = PlatformInfo()
+    global tracks
+    if os.getenv("DS_TRACKS", "1") != "0":
+        if TrajectoryStore is None:
+            sys.stderr.write("Trajectory store needs numpy; disabled\n")
+        else:
+            tracks = TrajectoryStore(capacity=int(os.getenv("DS_TRACKS_CAPACITY", "1024")),
+                                     history=int(os.getenv("DS_TRACKS_HISTORY", "64")),
+                                     ttl_s=float(os.getenv("DS_TRACKS_TTL_S", "5")),
+                                     width=1920, height=1080)
     # Standard GStreamer initialization
 
     Gst.init(None)
@@ -393,6 +451,16 @@ def main(args):
         sys.stderr.write(" Unable to get sink pad of nvosd \n")
     osdsinkpad.add_probe(Gst.PadProbeType.BUFFER, osd_sink_pad_buffer_probe, 0)
 
+    if tracks is not None:
+        heatmap_dir = os.getenv("DS_TRACKS_HEATMAP_DIR", "")
+        if heatmap_dir:
+            os.makedirs(heatmap_dir, exist_ok=True)
+        report_s = float(os.getenv("DS_TRACKS_REPORT_S", "5"))
+        if report_s > 0:
+            # At least 1 s: a 0 ms timer that keeps returning True spins the loop.
+            GLib.timeout_add(int(max(1.0, report_s) * 1000), tracks_report, heatmap_dir)
+        else:
+            GLib.timeout_add(1000, tracks_expire)
 
     print("Starting pipeline \n")
     
@@ -33,10 +33,13 @@ import math
 import platform
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
+from common.applog import get_logger
 from common.FPS import PERF_DATA
 
 import pyds
 
+log = get_logger("deepstream-test3")
+
 no_display = False
 silent = False
 file_loop = False
@@ -66,7 +69,7 @@ def pgie_src_pad_buffer_probe(pad,info,u_data):
     got_fps = False
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
     # Retrieve batch metadata from the gst_buffer
     # Note that pyds.gst_buffer_get_nvds_batch_meta() expects the
@@ -79,7 +82,7 @@ def pgie_src_pad_buffer_probe(pad,info,u_data):
     if measure_latency:
         num_sources_in_batch = pyds.nvds_measure_buffer_latency(hash(gst_buffer))
         if num_sources_in_batch == 0:
-            print("Unable to get number of sources in GstBuffer for latency measurement")
+            log.warn("Unable to get number of sources in GstBuffer for latency measurement", key="latency")
 
     batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
     l_frame = batch_meta.frame_meta_list
@@ -115,7 +118,12 @@ def pgie_src_pad_buffer_probe(pad,info,u_data):
             except StopIteration:
                 break
         if not silent:
-            print("Frame Number=", frame_number, "Number of Objects=",num_rects,"Vehicle_count=",obj_counter[PGIE_CLASS_ID_VEHICLE],"Person_count=",obj_counter[PGIE_CLASS_ID_PERSON])
+            log.info("Frame Number=%d stream id=%d Number of Objects=%d Vehicle_count=%d Person_count=%d",
+                     frame_number, frame_meta.pad_index, num_rects, obj_counter[PGIE_CLASS_ID_VEHICLE],
+                     obj_counter[PGIE_CLASS_ID_PERSON], key=frame_meta.pad_index)
+            log.record("frame", {"stream": frame_meta.pad_index, "frame": frame_number, "objects": num_rects,
+                                 "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE],
+                                 "person": obj_counter[PGIE_CLASS_ID_PERSON]})
 
         # Update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
@@ -29,8 +29,11 @@ from optparse import OptionParser
 from common.platform_info import PlatformInfo
 from common.bus_call import bus_call
 from common.utils import long_to_uint64
+from common.applog import get_logger
 import pyds
 
+log = get_logger("deepstream-test4")
+
 MAX_DISPLAY_LEN = 64
 MAX_TIME_STAMP_LEN = 32
 PGIE_CLASS_ID_VEHICLE = 0
@@ -124,7 +127,7 @@ def osd_sink_pad_buffer_probe(pad, info, u_data):
     }
     gst_buffer = info.get_buffer()
     if not gst_buffer:
-        print("Unable to get GstBuffer ")
+        log.error("Unable to get GstBuffer", key="nobuf")
         return
 
     # Retrieve batch metadata from the gst_buffer
@@ -211,7 +214,7 @@ def osd_sink_pad_buffer_probe(pad, info, u_data):
                     pyds.nvds_add_user_meta_to_frame(frame_meta,
                                                      user_event_meta)
                 else:
-                    print("Error in attaching event meta to buffer\n")
+                    log.error("Error in attaching event meta to buffer", key="event_meta")
 
                 is_first_object = False
             try:
@@ -223,9 +226,10 @@ def osd_sink_pad_buffer_probe(pad, info, u_data):
         except StopIteration:
             break
 
-    print("Frame Number =", frame_number, "Vehicle Count =",
-          obj_counter[PGIE_CLASS_ID_VEHICLE], "Person Count =",
-          obj_counter[PGIE_CLASS_ID_PERSON])
+    log.info("Frame Number = %d Vehicle Count = %d Person Count = %d", frame_number,
+             obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON], key="frame")
+    log.record("frame", {"frame": frame_number, "vehicle": obj_counter[PGIE_CLASS_ID_VEHICLE],
+                         "person": obj_counter[PGIE_CLASS_ID_PERSON]})
     return Gst.PadProbeReturn.OK
 
 
@@ -76,11 +76,15 @@ app.put("/api/infer", async (req, res) => {
   }
 });
 
+// ROI updates also go to the USB/ROS app's zone engine on /deepstream/roi
+// (data/apps/common/zones.py); either receiver is enough to succeed.
 app.post("/api/roi", async (req, res) => {
+  const ros = await rosbridgePublishOnce("/deepstream/roi", "std_msgs/String", { data: JSON.stringify(req.body || {}) });
   try {
     const r = await axios.post(`${DEEPSTREAM_URL}/roi`, req.body);
     res.status(r.status).json(r.data);
   } catch (e) {
+    if (ros.ok) return res.json({ ok: true, ros: true, deepstream_error: e.message });
     res.status(500).json({ error: e.message });
   }
 });
@@ -194,6 +198,38 @@ app.use("/snapshots", express.static(SNAP_DIR));
 app.use("/media", express.static(MEDIA_DIR));
 app.use("/autocap", express.static(AUTOCAP_DIR));
 
+// Snapshot catalog (data/apps/common/snapshot_catalog.py): when a directory has
+// a complete catalog.sqlite3 and python3 is available, listings are an indexed
+// query instead of readdir + stat. Any failure falls back to walking the
+// directory. Only used for AUTOCAP_DIR, whose writers (the USB apps) all record
+// into it; SNAP_DIR (multifilesink) and the media tree (uploads, containers,
+// copies) get files the catalog never hears about.
+const CATALOG_SCRIPT = process.env.SNAPSHOT_CATALOG_SCRIPT || path.join(__dirname, "..", "data", "apps", "common", "snapshot_catalog.py");
+function catalogList(root, q, kinds) {
+  return new Promise((resolve) => {
+    const db = path.join(root, "catalog.sqlite3");
+    try { if (!fs.existsSync(CATALOG_SCRIPT) || !fs.existsSync(db)) return resolve(null); } catch { return resolve(null); }
+    const args = [CATALOG_SCRIPT, "--db", db, "--root", root, "list", "--limit", String(q.limit)];
+    if (kinds) args.push("--kind", kinds);
+    if (q.since) args.push("--since", String(Number(q.since)));
+    if (q.until) args.push("--until", String(Number(q.until)));
+    if (q.class) args.push("--class", String(q.class));
+    if (q.cam !== undefined && q.cam !== "") args.push("--cam", String(Number(q.cam)));
+    if (q.cursor) args.push("--cursor", String(q.cursor));
+    let out = "";
+    let ch;
+    try { ch = spawn("python3", args, { env: process.env }); } catch { return resolve(null); }
+    const timer = setTimeout(() => { try { ch.kill("SIGKILL"); } catch {} }, 5000);
+    ch.stdout.on("data", (d) => { out += d.toString(); });
+    ch.on("error", () => { clearTimeout(timer); resolve(null); });
+    ch.on("close", (code) => {
+      clearTimeout(timer);
+      if (code !== 0) return resolve(null);
+      try { resolve(JSON.parse(out)); } catch { resolve(null); }
+    });
+  });
+}
+
 const ROS_HOST = process.env.ROS_BRIDGE_HOST || "127.0.0.1";
 const ROS_PORT = Number(process.env.ROS_BRIDGE_PORT || 9090);
 
@@ -611,6 +647,9 @@ app.get("/api/snapshot/list", async (req, res) => {
 app.get("/api/autocap/list", async (req, res) => {
   try {
     const kind = String((req.query && req.query.kind) || "any").toLowerCase();
+    const limit = Math.max(1, Math.min(Number(req.query.limit || 2000), 100000));
+    const cat = await catalogList(AUTOCAP_DIR, { ...req.query, limit }, kind === "clean" || kind === "osd" ? kind : "clean,osd,jpg");
+    if (cat) return res.json({ files: cat.files.map(x => x.path), next_cursor: cat.next_cursor });
     const files = await fs.promises.readdir(AUTOCAP_DIR);
     const jpgs = files.filter(f => {
       const n = f.toLowerCase();
@@ -624,7 +663,6 @@ app.get("/api/autocap/list", async (req, res) => {
       return { f, t: s.mtimeMs };
     }));
     stats.sort((a, b) => b.t - a.t);
-    const limit = Math.max(1, Math.min(Number(req.query.limit || 2000), 100000));
     res.json({ files: stats.slice(0, limit).map(x => x.f) });
   } catch (e) {
     res.json({ files: [] });
@@ -2,17 +2,31 @@ import os
 import time
 import json
 import threading
+import sys
 
 try:
     import paho.mqtt.client as mqtt
 except Exception:
     mqtt = None
 
+sys.path.append(os.getenv('DS_APPS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'apps')))
+try:
+    from common.snapshot_catalog import SnapshotCatalog, default_db
+except Exception:
+    SnapshotCatalog = None
+try:
+    from common.frame_ring import FrameReader
+except Exception:
+    FrameReader = None
+
 SNAP_DIR = os.getenv('DS_SNAPSHOT_DIR', '/data/ds/datasets/autocap')
 HOST = os.getenv('DS_MQTT_HOST', '127.0.0.1')
 PORT = int(os.getenv('DS_MQTT_PORT', '1883'))
 DET_TOPIC = os.getenv('DS_MQTT_TOPIC', 'deepstream/detections')
 SNAP_TOPIC = os.getenv('DS_MQTT_SNAP_TOPIC', 'deepstream/snap')
+# Name of the app's shared-memory frame ring (DS_FRAME_RING in the app). When
+# set, snapshots are taken from the ring instead of re-read from disk.
+FRAME_RING = os.getenv('DS_FRAME_RING', '')
 
 last_det = {"ts_ms": 0, "detections": [], "frame_id": None}
 
@@ -28,6 +42,82 @@ def det_cb(client, userdata, message):
     except Exception:
         pass
 
+def _open_catalog():
+    if SnapshotCatalog is None:
+        return None
+    db = default_db(SNAP_DIR)
+    if not os.path.exists(db):
+        return None
+    try:
+        # The app imports existing files; the sidecar only reads, and lists
+        # the directory until that import is done.
+        cat = SnapshotCatalog(db, SNAP_DIR, scan=False)
+    except Exception:
+        return None
+    if not cat.complete():
+        cat.close()
+        return None
+    return cat
+
+def _cam_info():
+    return {
+        "device": os.getenv('DS_CAM_DEVICE', '/dev/video0'),
+        "width": int(os.getenv('DS_CAM_WIDTH', '640')),
+        "height": int(os.getenv('DS_CAM_HEIGHT', '480')),
+        "fps": os.getenv('DS_CAM_FPS', '30/1'),
+        "caps": os.getenv('DS_CAM_CAPS', 'image/jpeg')
+    }
+
+def run_ring(client):
+    # Frames come with the detections of their own snapshot, so det_cb is
+    # not needed. The JPEG is base64-encoded straight from shared memory;
+    # frames the app overwrote meanwhile are dropped, not published torn.
+    import base64
+    reader = None
+    last_stats = time.monotonic()
+    try:
+        while True:
+            if reader is None:
+                try:
+                    reader = FrameReader(FRAME_RING)
+                except (OSError, ValueError):
+                    time.sleep(1.0)
+                    continue
+            f = reader.next(timeout=1.0)
+            if f is not None:
+                try:
+                    meta = f.meta
+                    cam = _cam_info()
+                    if "cam" in meta:
+                        cam["index"] = meta["cam"]
+                    payload = {
+                        "ts_ms": f.ts_ms,
+                        "image_b64": base64.b64encode(f.data).decode('ascii'),
+                        "detections": meta.get("detections", []),
+                        "frame_id": f.frame,
+                        "cam": cam,
+                        "meta": {"osd": f.kind == "osd", "kind": f.kind, "seq": f.seq}
+                    }
+                    if f.valid():
+                        client.publish(SNAP_TOPIC, json.dumps(payload), qos=0, retain=False)
+                    else:
+                        reader.torn += 1
+                except Exception:
+                    pass
+                finally:
+                    f.release()
+            elif reader.stale():
+                # The app restarted and recreated the ring.
+                reader.close()
+                reader = None
+            now = time.monotonic()
+            if now - last_stats >= 60.0 and reader is not None:
+                print(json.dumps({"frame_ring": reader.stats()}))
+                last_stats = now
+    finally:
+        if reader is not None:
+            reader.close()
+
 def run():
     if mqtt is None:
         return
@@ -37,17 +127,55 @@ def run():
         client.connect(HOST, PORT, 60)
     except Exception:
         return
+    if FRAME_RING and FrameReader is not None:
+        client.loop_start()
+        try:
+            run_ring(client)
+        finally:
+            client.loop_stop()
+        return
     client.subscribe(DET_TOPIC, qos=0)
     client.loop_start()
     seen = set()
+    catalog = _open_catalog()
+    last_id = None
+    rebuilt = None
     try:
         while True:
-            try:
-                files = [f for f in os.listdir(SNAP_DIR) if f.lower().endswith('.jpg')]
-            except Exception:
-                files = []
-            files.sort()
-            for name in files[-10:]:
+            if catalog is None:
+                catalog = _open_catalog()
+            if catalog is not None:
+                # Tail the catalog by row id instead of re-listing the directory.
+                try:
+                    stamp = catalog.rebuilt_ms()
+                    if stamp != rebuilt:
+                        # (Re)built: every row is new by id, so start from
+                        # the newest rows like at startup.
+                        rebuilt, last_id = stamp, None
+                    if last_id is None:
+                        rows, _ = catalog.query(kinds=("clean", "osd", "jpg"), limit=10)
+                        rows.reverse()
+                    else:
+                        rows = catalog.after(last_id, kinds=("clean", "osd", "jpg"))
+                    if rows:
+                        last_id = max(r["id"] for r in rows)
+                    elif last_id is None:
+                        last_id = 0
+                    elif catalog.max_id() < last_id:
+                        # Catalog rebuilt with ids starting over: pick up
+                        # its newest rows again, like at startup.
+                        last_id = None
+                    files = [r["path"] for r in rows]
+                except Exception:
+                    files = []
+            else:
+                try:
+                    files = [f for f in os.listdir(SNAP_DIR) if f.lower().endswith('.jpg')]
+                except Exception:
+                    files = []
+                files.sort()
+                files = files[-10:]
+            for name in files:
                 path = os.path.join(SNAP_DIR, name)
                 if path in seen:
                     continue
@@ -60,13 +188,7 @@ def run():
                         "image_b64": base64.b64encode(data).decode('ascii'),
                         "detections": last_det.get("detections", []),
                         "frame_id": last_det.get("frame_id"),
-                        "cam": {
-                            "device": os.getenv('DS_CAM_DEVICE', '/dev/video0'),
-                            "width": int(os.getenv('DS_CAM_WIDTH', '640')),
-                            "height": int(os.getenv('DS_CAM_HEIGHT', '480')),
-                            "fps": os.getenv('DS_CAM_FPS', '30/1'),
-                            "caps": os.getenv('DS_CAM_CAPS', 'image/jpeg')
-                        },
+                        "cam": _cam_info(),
                         "meta": {"osd": True}
                     }
                     client.publish(SNAP_TOPIC, json.dumps(payload), qos=0, retain=False)